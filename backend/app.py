@@ -1,12 +1,68 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import user_router, family_router, family_member_router, health_router, auth_router, auth_new_router
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from core.config import COMPRESSION_MIN_SIZE, ENABLE_LEGACY_AUTH, PURGE_ENABLED
+from core.database import check_supabase_key, warm_supabase_client
+from core.crypto_pool import warm_crypto_pool, shutdown_crypto_pool
+from core.thumbnails import shutdown_image_pool
+from core.soft_delete import run_purge_worker
+from core.events import event_broker
+from core.rate_limit import login_rate_limiter
+from routers import user_router, family_router, family_member_router, health_router, auth_new_router, photo_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Pre-warm connections and worker threads so the first request doesn't pay for them"""
+    started = time.perf_counter()
+    # Misconfiguration, not a warm-up failure: stop here
+    check_supabase_key()
+    # A selected Redis must answer; there is no per-worker fallback
+    await asyncio.gather(login_rate_limiter.backend.ping(), event_broker.ping())
+    
+    results = await asyncio.gather(
+        asyncio.to_thread(warm_supabase_client),
+        asyncio.to_thread(warm_crypto_pool),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            # The app still starts; the work happens lazily on first use instead
+            print(f"Warning: Startup warm-up step failed: {str(result)}")
+    
+    app.state.startup_seconds = time.perf_counter() - started
+    print(f"Startup warm-up finished in {app.state.startup_seconds * 1000:.0f} ms")
+    
+    # Background purge of soft-deleted families and members
+    purge_task = asyncio.create_task(run_purge_worker()) if PURGE_ENABLED else None
+    # Relay of change events published by other workers (no-op for the in-process broker)
+    relay_task = asyncio.create_task(event_broker.run_relay())
+    
+    yield
+    
+    for task in (purge_task, relay_task):
+        if task is None:
+            continue
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    shutdown_crypto_pool()
+    shutdown_image_pool()
+
 
 # Create FastAPI app
 app = FastAPI(
     title="ApnaParivar Backend",
     description="A secure, multi-tenant family tree platform",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -18,13 +74,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON responses (pre-compressed snapshots pass through untouched)
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
 # Include routers
 app.include_router(health_router.router)
 app.include_router(auth_new_router.router)  # New auth system
-app.include_router(auth_router.router)  # Legacy auth (can be deprecated)
+if ENABLE_LEGACY_AUTH:
+    # Legacy auth (can be deprecated) - only imported when enabled
+    from routers import auth_router
+    app.include_router(auth_router.router)
 app.include_router(user_router.router)
 app.include_router(family_router.router)
 app.include_router(family_member_router.router)
+app.include_router(photo_router.router)
 
 @app.get("/")
 async def root():
@@ -39,7 +102,3 @@ async def root():
             "member_login": "POST /api/auth/member/login"
         }
     }
-
-
-
-
@@ -14,16 +14,91 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 # JWT Configuration
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
+REFRESH_TOKEN_EXPIRATION_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRATION_DAYS", "30"))
+REVOCATION_SYNC_SECONDS = int(os.getenv("REVOCATION_SYNC_SECONDS", "5"))  # how often workers reload revoked access tokens
+REFRESH_SESSION_MAX_DAYS = int(os.getenv("REFRESH_SESSION_MAX_DAYS", "90"))  # absolute limit from login, across rotations
 
 # Application Configuration
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 ENV = os.getenv("ENV", "development")
 
+
+def _available_cpus() -> int:
+    """CPUs this process may run on (respects affinity masks and cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS / Windows
+        return os.cpu_count() or 1
+
+
+# Shared State (login rate limit buckets and live change events)
+# memory keeps them per worker process; redis shares them across workers
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | redis
+EVENT_BROKER_BACKEND = os.getenv("EVENT_BROKER_BACKEND", "memory")  # memory | redis
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SHARED_STATE = RATE_LIMIT_BACKEND == "redis" and EVENT_BROKER_BACKEND == "redis"
+
+# Server (production profile used by main.py when ENV=production)
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# Worker processes, one per available CPU by default; more than one needs SHARED_STATE
+# (main.py refuses to start without it, so memory backends must set WEB_CONCURRENCY=1)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(_available_cpus())))
+KEEP_ALIVE_TIMEOUT = int(os.getenv("KEEP_ALIVE_TIMEOUT", "30"))  # seconds, keep above the proxy's idle timeout
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))  # seconds to drain in-flight requests
+
+# Legacy magic-link auth router (/api/auth/signup etc.), only imported when enabled
+ENABLE_LEGACY_AUTH = os.getenv("ENABLE_LEGACY_AUTH", "True").lower() == "true"
+
+# Response Serialization
+# When enabled, member lists already shaped by the service layer are dumped
+# straight to JSON with orjson instead of being re-validated by pydantic
+TRUST_SERVICE_ROWS = os.getenv("TRUST_SERVICE_ROWS", "False").lower() == "true"
+
+# Lineage closure table (family_member_lineage), rebuilt on relationship changes
+LINEAGE_ENABLED = os.getenv("LINEAGE_ENABLED", "False").lower() == "true"
+
+# Response Compression
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", "256"))  # cached family snapshots per worker
+
+# Member Photos (originals + thumbnails, keyed by content hash)
+PHOTO_STORAGE_BACKEND = os.getenv("PHOTO_STORAGE_BACKEND", "supabase")  # supabase | local
+PHOTO_BUCKET = os.getenv("PHOTO_BUCKET", "member-photos")  # Supabase storage bucket
+PHOTO_LOCAL_DIR = os.getenv("PHOTO_LOCAL_DIR", "media/photos")  # used by the local backend
+PHOTO_MAX_BYTES = int(os.getenv("PHOTO_MAX_BYTES", str(10 * 1024 * 1024)))
+THUMBNAIL_SIZES = [int(size) for size in os.getenv("THUMBNAIL_SIZES", "64,256,512").split(",")]  # longest edge, px
+IMAGE_POOL_WORKERS = int(os.getenv("IMAGE_POOL_WORKERS", "2"))  # processes resizing uploads
+PHOTO_STORAGE_PRIVATE = os.getenv("PHOTO_STORAGE_PRIVATE", "False").lower() == "true"  # photos need signed URLs
+SIGNED_URL_TTL = int(os.getenv("SIGNED_URL_TTL", "3600"))  # seconds a signed photo URL stays valid
+SIGNED_URL_REFRESH_MARGIN = int(os.getenv("SIGNED_URL_REFRESH_MARGIN", "300"))  # re-sign this long before expiry
+SIGNED_URL_CACHE_SIZE = int(os.getenv("SIGNED_URL_CACHE_SIZE", "20000"))  # cached signatures per worker
+
+# Soft Delete (deleted families and members can be restored until they are purged)
+SOFT_DELETE_RETENTION_HOURS = int(os.getenv("SOFT_DELETE_RETENTION_HOURS", "168"))  # undo window
+PURGE_ENABLED = os.getenv("PURGE_ENABLED", "True").lower() == "true"  # run the purge worker in this process
+PURGE_INTERVAL_SECONDS = int(os.getenv("PURGE_INTERVAL_SECONDS", "300"))  # pause between purge runs
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))  # rows removed per transaction
+PURGE_BATCH_PAUSE_SECONDS = float(os.getenv("PURGE_BATCH_PAUSE_SECONDS", "0.5"))  # spacing between batches
+
 # SuperAdmin Configuration (Hardcoded credentials)
 SUPERADMIN_USERNAME = os.getenv("SUPERADMIN_USERNAME", "superadmin")
 SUPERADMIN_PASSWORD = os.getenv("SUPERADMIN_PASSWORD", "SuperAdmin@123")
 SUPERADMIN_EMAIL = os.getenv("SUPERADMIN_EMAIL", "admin@apnaparivar.com")
 
+# Crypto Pool (threads running password KDFs off the event loop)
+# Defaults to an even share of the CPUs per worker process
+CRYPTO_POOL_WORKERS = int(os.getenv("CRYPTO_POOL_WORKERS", str(max(2, _available_cpus() // WEB_CONCURRENCY))))
+# Admission cap on running + queued KDF operations; beyond it requests are shed with 429
+KDF_MAX_CONCURRENCY = int(os.getenv("KDF_MAX_CONCURRENCY", str(CRYPTO_POOL_WORKERS * 2)))
+KDF_ADMISSION_TIMEOUT = float(os.getenv("KDF_ADMISSION_TIMEOUT", "1.0"))  # seconds to wait for a slot
+
+# Login Rate Limiting (token buckets, backend chosen by RATE_LIMIT_BACKEND)
+LOGIN_RATE_LIMIT_PER_IP = int(os.getenv("LOGIN_RATE_LIMIT_PER_IP", "30"))  # attempts per minute
+LOGIN_RATE_LIMIT_PER_ACCOUNT = int(os.getenv("LOGIN_RATE_LIMIT_PER_ACCOUNT", "10"))  # attempts per minute per email / family
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "False").lower() == "true"
+
 # Security
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 
@@ -0,0 +1,104 @@
+"""
+Thread pool for expensive password key derivations
+hashlib's scrypt and PBKDF2 release the GIL, so derivations run in parallel
+on this pool without blocking the event loop
+
+Admission is capped at KDF_MAX_CONCURRENCY operations (running or queued).
+When no slot frees up within KDF_ADMISSION_TIMEOUT the call is rejected with
+CryptoPoolBusyError so bursts are shed instead of queueing behind each other.
+
+The pool and the admission semaphore are created on first use (or by the
+startup warm-up) and dropped again by shutdown_crypto_pool, so nothing is bound
+to an event loop or holds threads at import time.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import CRYPTO_POOL_WORKERS, KDF_MAX_CONCURRENCY, KDF_ADMISSION_TIMEOUT
+
+
+class CryptoPoolBusyError(Exception):
+    """Raised when the crypto pool is saturated and a KDF call is shed"""
+    
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Server is busy, please retry shortly")
+        self.retry_after = retry_after
+
+
+_crypto_executor = None
+_admission = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _crypto_executor
+    if _crypto_executor is None:
+        _crypto_executor = ThreadPoolExecutor(max_workers=CRYPTO_POOL_WORKERS, thread_name_prefix="crypto")
+    return _crypto_executor
+
+
+def _get_admission() -> asyncio.Semaphore:
+    global _admission
+    if _admission is None:
+        # Created from the running loop, so each app lifespan gets its own
+        _admission = asyncio.Semaphore(KDF_MAX_CONCURRENCY)
+    return _admission
+
+
+async def run_crypto(fn, *args, **kwargs):
+    """
+    Run a CPU-bound crypto function on the crypto pool
+    
+    Args:
+        fn: Function to call (e.g. PasswordHashingService.hash_password)
+        args, kwargs: Arguments passed through to fn
+    
+    Returns:
+        The function's return value
+    
+    Raises:
+        CryptoPoolBusyError: If no admission slot is available in time
+    """
+    admission = _get_admission()
+    try:
+        await asyncio.wait_for(admission.acquire(), timeout=KDF_ADMISSION_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise CryptoPoolBusyError(retry_after=max(1, round(KDF_ADMISSION_TIMEOUT)))
+    
+    loop = asyncio.get_running_loop()
+    try:
+        future = _get_executor().submit(functools.partial(fn, *args, **kwargs))
+    except BaseException:
+        admission.release()
+        raise
+    # Release the slot when the thread actually finishes, even if the caller
+    # stopped waiting (e.g. a cancelled onboarding task)
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(admission.release))
+    return await asyncio.wrap_future(future)
+
+
+def warm_crypto_pool() -> None:
+    """Start every pool thread now instead of on the first login"""
+    # Idle threads are reused, so hold each one at a barrier until all have started
+    barrier = threading.Barrier(CRYPTO_POOL_WORKERS)
+    
+    def _wait():
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+    
+    executor = _get_executor()
+    for future in [executor.submit(_wait) for _ in range(CRYPTO_POOL_WORKERS)]:
+        future.result()
+
+
+def shutdown_crypto_pool() -> None:
+    """Stop the pool threads (waits for running derivations) and drop the admission state"""
+    global _crypto_executor, _admission
+    if _crypto_executor is not None:
+        _crypto_executor.shutdown(wait=True, cancel_futures=True)
+        _crypto_executor = None
+    _admission = None
@@ -0,0 +1,177 @@
+"""
+Typed custom fields
+A family can declare a type for each of its custom_fields keys. Declared values
+are coerced on write so they compare correctly in Postgres, and member filters
+(?cf.birthplace=Pune&cf.birth_year>=1950) are pushed down to PostgREST:
+equality uses JSONB containment (served by the GIN index on custom_fields) and
+ranges use the custom_fields -> key / ->> key expressions (served by the
+optional per-field expression indexes)
+"""
+
+import re
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+
+
+FIELD_TYPES = ("text", "number", "date", "boolean")
+
+# Matches the "up to 10 fields per family" limit on family_members.custom_fields
+MAX_CUSTOM_FIELDS = 10
+
+FIELD_KEY_RE = re.compile(r"^[a-z][a-z0-9_]{0,62}$")
+
+FILTER_PREFIX = "cf."
+
+# Suffix left on the query key by "cf.x>=v" / "cf.x<=v" / "cf.x!=v"
+_KEY_SUFFIX_OPERATORS = {">": "gte", "<": "lte", "!": "neq"}
+
+# Operators written inside a value-less key such as "cf.x>5"
+_INLINE_OPERATORS = ((">", "gt"), ("<", "lt"))
+
+_TRUE = {"true", "1", "yes", "y"}
+_FALSE = {"false", "0", "no", "n"}
+
+
+def validate_field_key(field_key: str) -> str:
+    """Check that a field key is a safe identifier"""
+    if not FIELD_KEY_RE.match(field_key or ""):
+        raise ValueError(f"Invalid custom field key '{field_key}': use lowercase letters, digits and underscores")
+    return field_key
+
+
+def coerce_value(field_type: str, value):
+    """
+    Convert a value to the JSON representation of a field type
+
+    Numbers become JSON numbers, dates ISO YYYY-MM-DD strings (which sort
+    correctly as text) and booleans JSON booleans
+
+    Raises:
+        ValueError: If the value does not fit the type
+    """
+    if value is None or value == "":
+        return None
+    if field_type == "number":
+        if isinstance(value, bool):
+            raise ValueError(f"'{value}' is not a number")
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            number = float(str(value).strip())
+        except ValueError:
+            raise ValueError(f"'{value}' is not a number")
+        return int(number) if number.is_integer() else number
+    if field_type == "date":
+        if isinstance(value, datetime):
+            return value.date().isoformat()
+        if isinstance(value, date):
+            return value.isoformat()
+        text = str(value).strip()
+        try:
+            return date.fromisoformat(text[:10]).isoformat()
+        except ValueError:
+            raise ValueError(f"'{value}' is not a date (expected YYYY-MM-DD)")
+    if field_type == "boolean":
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+        raise ValueError(f"'{value}' is not a boolean")
+    return str(value)
+
+
+def coerce_custom_fields(custom_fields: dict, field_types: Dict[str, str]) -> dict:
+    """
+    Coerce the declared fields of a custom_fields object; undeclared keys are kept as is
+
+    Raises:
+        ValueError: If a declared field has a value of the wrong type
+    """
+    if not custom_fields or not field_types:
+        return custom_fields
+    coerced = dict(custom_fields)
+    for key, value in custom_fields.items():
+        field_type = field_types.get(key)
+        if field_type:
+            try:
+                coerced[key] = coerce_value(field_type, value)
+            except ValueError as e:
+                raise ValueError(f"Custom field '{key}': {str(e)}")
+    return coerced
+
+
+def parse_filters(query_items: List[Tuple[str, str]], field_types: Dict[str, str]) -> List[Tuple[str, str, str, object]]:
+    """
+    Parse cf.* query parameters into typed predicates
+
+    Accepts cf.key=v, cf.key!=v, cf.key>=v, cf.key<=v, cf.key>v and cf.key<v.
+    Keys without a declared type are compared as text.
+
+    Args:
+        query_items: Raw (key, value) query parameter pairs
+        field_types: Declared field types of the family
+
+    Returns:
+        List of (field_key, field_type, operator, value) with PostgREST operators
+
+    Raises:
+        ValueError: If a filter is malformed or its value does not fit the field type
+    """
+    filters = []
+    for raw_key, raw_value in query_items:
+        if not raw_key.startswith(FILTER_PREFIX):
+            continue
+        key = raw_key[len(FILTER_PREFIX):]
+        value = raw_value
+        operator = "eq"
+
+        if key and key[-1] in _KEY_SUFFIX_OPERATORS:
+            operator = _KEY_SUFFIX_OPERATORS[key[-1]]
+            key = key[:-1]
+        elif value == "":
+            for symbol, inline_operator in _INLINE_OPERATORS:
+                if symbol in key:
+                    key, _, value = key.partition(symbol)
+                    operator = inline_operator
+                    break
+
+        validate_field_key(key)
+        field_type = field_types.get(key, "text")
+        if operator in ("gt", "gte", "lt", "lte") and field_type == "boolean":
+            raise ValueError(f"Custom field '{key}' is a boolean and cannot be range filtered")
+        try:
+            typed_value = coerce_value(field_type, value)
+        except ValueError as e:
+            raise ValueError(f"Filter on custom field '{key}': {str(e)}")
+        if typed_value is None:
+            raise ValueError(f"Filter on custom field '{key}' needs a value")
+        filters.append((key, field_type, operator, typed_value))
+    return filters
+
+
+def apply_filters(query, filters: List[Tuple[str, str, str, object]]):
+    """
+    Push parsed custom field predicates down into a PostgREST query
+
+    Args:
+        query: supabase-py filter builder for family_members
+        filters: Output of parse_filters
+
+    Returns:
+        The filtered query builder
+    """
+    for key, field_type, operator, value in filters:
+        if operator == "eq":
+            query = query.contains("custom_fields", {key: value})
+        elif operator == "neq":
+            query = query.not_.contains("custom_fields", {key: value})
+        elif field_type in ("number", "boolean"):
+            # JSONB comparison so numbers order numerically
+            query = query.filter(f"custom_fields->{key}", operator, str(value))
+        else:
+            # Text and ISO dates order correctly as text
+            query = query.filter(f"custom_fields->>{key}", operator, str(value))
+    return query
@@ -1,11 +1,43 @@
+import jwt
 from supabase import create_client, Client
 from core.config import SUPABASE_URL, SUPABASE_KEY
 
 _supabase_client: Client = None
 
+def supabase_key_role(key: str) -> str:
+    """Role a Supabase API key acts as (anon, service_role, ...) or 'unknown'"""
+    if not key:
+        return "unknown"
+    if key.startswith("sb_publishable_"):
+        return "anon"
+    if key.startswith("sb_secret_"):
+        return "service_role"
+    try:
+        return jwt.decode(key, options={"verify_signature": False}).get("role", "unknown")
+    except jwt.InvalidTokenError:
+        return "unknown"
+
+def check_supabase_key() -> None:
+    """
+    Refuse an anon key: backend-only tables and functions are closed to it
+    (see README, "Upgrading from an anon-key deployment")
+    
+    Raises:
+        RuntimeError: If SUPABASE_KEY is an anon (or publishable) key
+    """
+    if supabase_key_role(SUPABASE_KEY) in ("anon", "authenticated"):
+        raise RuntimeError("SUPABASE_KEY must be the service_role key, not the anon key")
+
 def get_supabase_client() -> Client:
     """Get or create Supabase client"""
     global _supabase_client
     if _supabase_client is None:
+        check_supabase_key()
         _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
     return _supabase_client
+
+
+def warm_supabase_client() -> None:
+    """Create the client and open its connection (DNS + TLS) with a cheap query"""
+    client = get_supabase_client()
+    client.table("families").select("id").limit(1).execute()
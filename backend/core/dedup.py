@@ -0,0 +1,282 @@
+"""
+Duplicate member detection
+Members are grouped into blocks by email, normalized name, name tokens and a
+phonetic (Soundex) signature; only pairs that share a block are scored, so the cost stays near-linear
+in the family size instead of comparing every pair
+"""
+
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, List, Set, Tuple
+
+
+DEFAULT_MIN_SCORE = 0.8
+
+# Blocks larger than this (e.g. a very common surname token) are not scored pairwise
+MAX_BLOCK_SIZE = 200
+
+# custom_fields keys that hold a birth date
+DATE_KEYS = ("dob", "date_of_birth", "birth_date", "birthdate", "born")
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9 ]+")
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+def normalize_name(name) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize("NFKD", str(name or ""))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(_NON_ALNUM_RE.sub(" ", text).split())
+
+
+def soundex(token: str) -> str:
+    """American Soundex code of a single token (empty for non-alphabetic tokens)"""
+    letters = [c for c in token.lower() if "a" <= c <= "z"]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w do not separate letters with the same code
+        if c not in "hw":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def _email(member: dict) -> str:
+    relationships = member.get("relationships") or {}
+    if not isinstance(relationships, dict):
+        return ""
+    return str(relationships.get("email") or "").strip().lower()
+
+
+def _birth_date(member: dict) -> str:
+    custom_fields = member.get("custom_fields") or {}
+    if not isinstance(custom_fields, dict):
+        return ""
+    for key in DATE_KEYS:
+        value = custom_fields.get(key)
+        if value:
+            return str(value).strip()[:10]
+    return ""
+
+
+class _Entry:
+    """Precomputed comparison features of one member"""
+
+    __slots__ = ("key", "name", "tokens", "phonetic", "email", "birth_date")
+
+    def __init__(self, key, member: dict):
+        self.key = key
+        self.name = normalize_name(member.get("name"))
+        self.tokens = set(self.name.split())
+        self.phonetic = " ".join(sorted(filter(None, (soundex(t) for t in self.tokens))))
+        self.email = _email(member)
+        self.birth_date = _birth_date(member)
+
+    def blocking_keys(self) -> Set[str]:
+        keys = set()
+        if self.email:
+            keys.add("email:" + self.email)
+        if self.name:
+            keys.add("name:" + self.name)
+        if self.phonetic:
+            keys.add("phonetic:" + self.phonetic)
+        # Each token with the initials of the others: tolerates a typo in any one
+        # token without putting everyone who shares a surname in one block
+        tokens = sorted(self.tokens)
+        for i, token in enumerate(tokens):
+            if len(token) > 1:
+                initials = "".join(t[0] for j, t in enumerate(tokens) if j != i)
+                keys.add("token:" + token + "|" + initials)
+        return keys
+
+
+def score_pair(a: _Entry, b: _Entry, min_score: float = 0.0) -> Tuple[float, List[str]]:
+    """
+    Score how likely two members are the same person
+
+    Args:
+        a, b: Members to compare
+        min_score: Pairs that provably cannot reach this score return 0 without
+                   the full string comparison
+
+    Returns:
+        Score between 0 and 1 and the reasons that contributed to it
+    """
+    reasons = []
+    if a.email and a.email == b.email:
+        return 1.0, ["same_email"]
+
+    same_date = bool(a.birth_date) and a.birth_date == b.birth_date
+    date_bonus = 0.1 if same_date else 0.0
+
+    if a.name and a.name == b.name:
+        score = 0.9
+        reasons.append("same_name")
+    else:
+        # Soundex collides on long names, so a phonetic match only adds to the text score
+        phonetic_bonus = 0.1 if a.phonetic and a.phonetic == b.phonetic else 0.0
+        union = a.tokens | b.tokens
+        jaccard = len(a.tokens & b.tokens) / len(union) if union else 0.0
+        matcher = SequenceMatcher(None, a.name, b.name)
+        # quick_ratio() is an upper bound of ratio(); skip hopeless pairs cheaply
+        if max(matcher.quick_ratio(), jaccard) * 0.85 + phonetic_bonus + date_bonus < min_score:
+            return 0.0, []
+        score = min(1.0, max(matcher.ratio(), jaccard) * 0.85 + phonetic_bonus)
+        if phonetic_bonus:
+            reasons.append("similar_sounding_name")
+        if score >= 0.6:
+            reasons.append("similar_name")
+
+    if a.birth_date and b.birth_date:
+        if same_date:
+            score = min(1.0, score + date_bonus)
+            reasons.append("same_birth_date")
+        else:
+            # Different known birth dates make a match unlikely
+            score *= 0.5
+            reasons.append("different_birth_date")
+
+    return round(score, 3), reasons
+
+
+class DedupIndex:
+    """Blocking index over one family's members"""
+
+    def __init__(self):
+        self._entries: Dict[object, _Entry] = {}
+        self._blocks: Dict[str, List[object]] = {}
+
+    def add(self, key, member: dict) -> _Entry:
+        """Index a member under an id (or any hashable key)"""
+        entry = _Entry(key, member)
+        self._entries[key] = entry
+        for block in entry.blocking_keys():
+            self._blocks.setdefault(block, []).append(key)
+        return entry
+
+    def candidates(self, entry: _Entry) -> Set[object]:
+        """Keys sharing at least one usable block with an entry"""
+        found = set()
+        for block in entry.blocking_keys():
+            keys = self._blocks.get(block)
+            if keys and len(keys) <= MAX_BLOCK_SIZE:
+                found.update(keys)
+        found.discard(entry.key)
+        return found
+
+    def match(self, member: dict, min_score: float = DEFAULT_MIN_SCORE, key=None) -> List[dict]:
+        """
+        Find indexed members that look like the given (not yet indexed) member
+
+        Returns:
+            Matches sorted by score, each with key, score and reasons
+        """
+        entry = _Entry(key, member)
+        matches = []
+        for candidate in self.candidates(entry):
+            score, reasons = score_pair(entry, self._entries[candidate], min_score)
+            if score >= min_score:
+                matches.append({"key": candidate, "score": score, "reasons": reasons})
+        matches.sort(key=lambda m: -m["score"])
+        return matches
+
+    def duplicate_pairs(self, min_score: float = DEFAULT_MIN_SCORE) -> List[dict]:
+        """
+        Score every pair of indexed members that shares a block
+
+        Returns:
+            Pairs sorted by score, each with key_a, key_b, score and reasons
+        """
+        seen = set()
+        pairs = []
+        for keys in self._blocks.values():
+            if len(keys) < 2 or len(keys) > MAX_BLOCK_SIZE:
+                continue
+            for i, key_a in enumerate(keys):
+                for key_b in keys[i + 1:]:
+                    pair = (key_a, key_b) if str(key_a) < str(key_b) else (key_b, key_a)
+                    if pair in seen:
+                        continue
+                    seen.add(pair)
+                    score, reasons = score_pair(self._entries[pair[0]], self._entries[pair[1]], min_score)
+                    if score >= min_score:
+                        pairs.append({"key_a": pair[0], "key_b": pair[1], "score": score, "reasons": reasons})
+        pairs.sort(key=lambda p: -p["score"])
+        return pairs
+
+
+def find_import_duplicates(members: List[dict], existing: List[dict],
+                           min_score: float = DEFAULT_MIN_SCORE) -> List[dict]:
+    """
+    Match incoming import rows against the family and against each other
+
+    Args:
+        members: Incoming member dicts, in request order
+        existing: Existing family members (id, name, relationships, custom_fields)
+        min_score: Minimum score to report
+
+    Returns:
+        One entry per match with row, match_id (existing member) or match_row
+        (earlier row of the same import), match_name, score and reasons
+    """
+    index = DedupIndex()
+    names = {}
+    for member in existing:
+        index.add(("member", member.get("id")), member)
+        names[("member", member.get("id"))] = member.get("name")
+
+    results = []
+    for row, member in enumerate(members):
+        for match in index.match(member, min_score, key=("row", row)):
+            kind, value = match["key"]
+            results.append({
+                "row": row,
+                "match_id": value if kind == "member" else None,
+                "match_row": value if kind == "row" else None,
+                "match_name": names.get(match["key"]),
+                "score": match["score"],
+                "reasons": match["reasons"]
+            })
+        # Later rows are also checked against earlier rows of the same import
+        index.add(("row", row), member)
+        names[("row", row)] = member.get("name")
+    return results
+
+
+def find_family_duplicates(members: List[dict], min_score: float = DEFAULT_MIN_SCORE) -> List[dict]:
+    """
+    Find likely duplicate pairs among a family's members
+
+    Returns:
+        Pairs with member_a and member_b ({id, name}), score and reasons
+    """
+    index = DedupIndex()
+    by_id = {}
+    for member in members:
+        index.add(member.get("id"), member)
+        by_id[member.get("id")] = member
+    return [
+        {
+            "member_a": {"id": pair["key_a"], "name": by_id[pair["key_a"]].get("name")},
+            "member_b": {"id": pair["key_b"], "name": by_id[pair["key_b"]].get("name")},
+            "score": pair["score"],
+            "reasons": pair["reasons"]
+        }
+        for pair in index.duplicate_pairs(min_score)
+    ]
@@ -1,18 +1,40 @@
 """
 Encryption utility for securing family passwords
-Uses PBKDF2 for key derivation and AES-256-GCM for encryption
+Uses one KDF run split with HKDF for key derivation and AES-256-GCM envelope encryption
+Login passwords are hashed with scrypt in a versioned, self-describing format
 """
 
 import os
+import hashlib
+import hmac
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
 import secrets
 import base64
 
 
+class InvalidPasswordError(Exception):
+    """Raised when a password does not unlock a family password envelope"""
+
+
 class EncryptionService:
-    """Service for encrypting and decrypting family passwords"""
+    """
+    Service for encrypting and decrypting family passwords
+    
+    Family passwords are stored in an envelope:
+        $env1$<kdf scheme>$<kdf params>$<salt>$<verifier>$<wrapped key>$<ciphertext>
+    
+    A single KDF run over the admin password yields a master secret that HKDF
+    splits into a password verifier and a key-encryption key (KEK). The KEK
+    wraps a random data key, which encrypts the family password. Verifying the
+    admin password and unwrapping therefore cost one derivation.
+    
+    Legacy values are base64(salt + nonce + ciphertext) with a PBKDF2-derived key
+    and are still decrypted; callers should re-wrap them after a successful unwrap.
+    """
     
     # Constants for encryption
     ALGORITHM = "AES-256-GCM"
@@ -22,6 +44,21 @@ class EncryptionService:
     TAG_LENGTH = 16
     ITERATIONS = 480000  # PBKDF2 iterations (NIST recommendation)
     
+    ENVELOPE_PREFIX = "$env1$"
+    HKDF_VERIFY_INFO = b"apnaparivar:password-verify"
+    HKDF_WRAP_INFO = b"apnaparivar:key-wrap"
+    
+    @staticmethod
+    def _derive_raw_key(password: str, salt: bytes) -> bytes:
+        """Derive the legacy PBKDF2 encryption key as raw bytes"""
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=EncryptionService.KEY_LENGTH,
+            salt=salt,
+            iterations=EncryptionService.ITERATIONS,
+        )
+        return kdf.derive(password.encode())
+    
     @staticmethod
     def derive_key(password: str, salt: bytes = None) -> tuple[str, str]:
         """
@@ -32,57 +69,163 @@ class EncryptionService:
             salt: Optional salt (generated if not provided)
         
         Returns:
-            Tuple of (key_hex, salt_hex)
+            Tuple of (key_b64, salt_b64)
         """
         if salt is None:
             salt = secrets.token_bytes(EncryptionService.SALT_LENGTH)
         
-        kdf = PBKDF2HMAC(
+        key = EncryptionService._derive_raw_key(password, salt)
+        
+        return base64.b64encode(key).decode(), base64.b64encode(salt).decode()
+    
+    @staticmethod
+    def _split_master(master: bytes) -> tuple[bytes, bytes]:
+        """Split one KDF output into (verifier, kek) with HKDF"""
+        verifier = HKDF(
             algorithm=hashes.SHA256(),
             length=EncryptionService.KEY_LENGTH,
-            salt=salt,
-            iterations=EncryptionService.ITERATIONS,
-        )
+            salt=None,
+            info=EncryptionService.HKDF_VERIFY_INFO,
+        ).derive(master)
+        kek = HKDF(
+            algorithm=hashes.SHA256(),
+            length=EncryptionService.KEY_LENGTH,
+            salt=None,
+            info=EncryptionService.HKDF_WRAP_INFO,
+        ).derive(master)
+        return verifier, kek
+    
+    @staticmethod
+    def _seal(key: bytes, plaintext: bytes) -> bytes:
+        """AES-GCM encrypt with a random nonce, returning nonce + ciphertext"""
+        nonce = secrets.token_bytes(EncryptionService.NONCE_LENGTH)
+        return nonce + AESGCM(key).encrypt(nonce, plaintext, None)
+    
+    @staticmethod
+    def _open(key: bytes, sealed: bytes) -> bytes:
+        """Reverse of _seal"""
+        nonce = sealed[:EncryptionService.NONCE_LENGTH]
+        return AESGCM(key).decrypt(nonce, sealed[EncryptionService.NONCE_LENGTH:], None)
+    
+    @staticmethod
+    def is_legacy(encrypted_data: str) -> bool:
+        """Check whether a stored family password predates the envelope format"""
+        return not encrypted_data.startswith(EncryptionService.ENVELOPE_PREFIX)
+    
+    @staticmethod
+    def wrap(family_password: str, admin_password: str) -> tuple[str, str]:
+        """
+        Encrypt family password into an envelope keyed by the admin password
         
-        key = kdf.derive(password.encode())
+        Args:
+            family_password: The family password to encrypt
+            admin_password: The admin's password (used as key derivation source)
         
-        return base64.b64encode(key).decode(), base64.b64encode(salt).decode()
+        Returns:
+            Tuple of (envelope, admin_password_hash). The hash comes from the same
+            derivation and is a valid PasswordHashingService hash for the admin password.
+        """
+        try:
+            scheme = PasswordHashingService.SCHEME
+            params = PasswordHashingService._current_params()
+            salt = secrets.token_bytes(EncryptionService.SALT_LENGTH)
+            
+            # The only expensive step
+            master = PasswordHashingService._derive(admin_password, scheme, params, salt)
+            verifier, kek = EncryptionService._split_master(master)
+            
+            data_key = AESGCM.generate_key(bit_length=256)
+            wrapped_key = EncryptionService._seal(kek, data_key)
+            ciphertext = EncryptionService._seal(data_key, family_password.encode())
+            
+            b64 = PasswordHashingService._b64encode
+            param_str = ",".join(f"{key}={value}" for key, value in params.items())
+            envelope = EncryptionService.ENVELOPE_PREFIX + "$".join([
+                scheme,
+                param_str,
+                b64(salt),
+                b64(verifier),
+                b64(wrapped_key),
+                b64(ciphertext),
+            ])
+            admin_password_hash = PasswordHashingService._encode(
+                PasswordHashingService.HKDF_SCHEME, params, salt, verifier
+            )
+            return envelope, admin_password_hash
+        
+        except Exception as e:
+            raise Exception(f"Encryption failed: {str(e)}")
+    
+    @staticmethod
+    def unwrap(encrypted_data: str, admin_password: str) -> str:
+        """
+        Verify the admin password and decrypt the family password in one derivation
+        
+        Args:
+            encrypted_data: Envelope (or legacy base64 ciphertext)
+            admin_password: The admin's password
+        
+        Returns:
+            Decrypted family password
+        
+        Raises:
+            InvalidPasswordError: If the admin password is wrong
+        """
+        if EncryptionService.is_legacy(encrypted_data):
+            raw = base64.b64decode(encrypted_data.encode())
+            salt = raw[:EncryptionService.SALT_LENGTH]
+            key = EncryptionService._derive_raw_key(admin_password, salt)
+            try:
+                # The GCM tag authenticates the password for legacy values
+                return EncryptionService._open(key, raw[EncryptionService.SALT_LENGTH:]).decode()
+            except InvalidTag:
+                raise InvalidPasswordError("Invalid admin password")
+        
+        try:
+            scheme, param_str, salt_b64, verifier_b64, wrapped_b64, ciphertext_b64 = (
+                encrypted_data[len(EncryptionService.ENVELOPE_PREFIX):].split("$")
+            )
+            params = {}
+            for item in param_str.split(","):
+                key, value = item.split("=")
+                params[key] = int(value)
+        except ValueError as e:
+            raise Exception(f"Decryption failed: malformed envelope ({str(e)})")
+        
+        b64 = PasswordHashingService._b64decode
+        master = PasswordHashingService._derive(admin_password, scheme, params, b64(salt_b64))
+        verifier, kek = EncryptionService._split_master(master)
+        
+        if not hmac.compare_digest(verifier, b64(verifier_b64)):
+            raise InvalidPasswordError("Invalid admin password")
+        
+        try:
+            data_key = EncryptionService._open(kek, b64(wrapped_b64))
+            return EncryptionService._open(data_key, b64(ciphertext_b64)).decode()
+        except InvalidTag as e:
+            raise Exception(f"Decryption failed: envelope is corrupted ({str(e)})")
     
     @staticmethod
     def encrypt(family_password: str, admin_password: str) -> str:
         """
-        Encrypt family password using admin password as key
+        Encrypt family password using admin password as key (legacy format)
         
         Args:
             family_password: The family password to encrypt
             admin_password: The admin's password (used as key derivation source)
         
         Returns:
-            Encrypted data as base64 string in format: base64(nonce + ciphertext + tag)
+            Encrypted data as base64 string in format: base64(salt + nonce + ciphertext + tag)
         """
         try:
-            # Generate random nonce
-            nonce = secrets.token_bytes(EncryptionService.NONCE_LENGTH)
-            
             # Generate temporary salt for key derivation
             temp_salt = secrets.token_bytes(EncryptionService.SALT_LENGTH)
             
             # Derive key from admin password
-            key_hex, _ = EncryptionService.derive_key(admin_password, temp_salt)
-            key = base64.b64decode(key_hex.encode())
-            
-            # Create cipher
-            cipher = AESGCM(key)
-            
-            # Encrypt the family password
-            ciphertext = cipher.encrypt(
-                nonce,
-                family_password.encode(),
-                None  # No additional authenticated data
-            )
+            key = EncryptionService._derive_raw_key(admin_password, temp_salt)
             
             # Combine salt + nonce + ciphertext (ciphertext includes the GCM tag)
-            encrypted_data = temp_salt + nonce + ciphertext
+            encrypted_data = temp_salt + EncryptionService._seal(key, family_password.encode())
             
             # Return as base64 string for storage
             return base64.b64encode(encrypted_data).decode()
@@ -96,69 +239,140 @@ class EncryptionService:
         Decrypt family password using admin password
         
         Args:
-            encrypted_data_b64: Encrypted data as base64 string
+            encrypted_data_b64: Envelope or legacy base64 ciphertext
             admin_password: The admin's password (used as key derivation source)
         
         Returns:
             Decrypted family password
         """
         try:
-            # Decode base64
-            encrypted_data = base64.b64decode(encrypted_data_b64.encode())
-            
-            # Extract salt, nonce, and ciphertext
-            salt = encrypted_data[:EncryptionService.SALT_LENGTH]
-            nonce = encrypted_data[
-                EncryptionService.SALT_LENGTH:
-                EncryptionService.SALT_LENGTH + EncryptionService.NONCE_LENGTH
-            ]
-            ciphertext = encrypted_data[EncryptionService.SALT_LENGTH + EncryptionService.NONCE_LENGTH:]
-            
-            # Derive key from admin password using the stored salt
-            key_hex, _ = EncryptionService.derive_key(admin_password, salt)
-            key = base64.b64decode(key_hex.encode())
-            
-            # Create cipher
-            cipher = AESGCM(key)
-            
-            # Decrypt
-            plaintext = cipher.decrypt(nonce, ciphertext, None)
-            
-            return plaintext.decode()
+            return EncryptionService.unwrap(encrypted_data_b64, admin_password)
         
         except Exception as e:
             raise Exception(f"Decryption failed: {str(e)}")
 
 
 class PasswordHashingService:
-    """Service for hashing passwords (for admin and family member login)"""
+    """
+    Service for hashing passwords (for admin and family member login)
+    
+    Hashes are stored in a self-describing format:
+        $<scheme>$<params>$<base64 salt>$<base64 digest>
+    e.g. $scrypt$ln=15,r=8,p=1$...$... or $pbkdf2-sha256$i=480000$...$...
+    
+    Legacy hashes without a scheme marker are base64(salt + hash) produced by
+    PBKDF2-SHA256 with 480000 iterations and are still accepted.
+    """
+    
+    # Current scheme used for new hashes (memory-hard, better cost per CPU-ms than PBKDF2)
+    SCHEME = "scrypt"
+    # Same KDF with the digest passed through HKDF, written by EncryptionService.wrap
+    # so an admin's hash and family password envelope share one derivation
+    HKDF_SCHEME = "scrypt-hkdf"
+    SCRYPT_LOG2_N = 15
+    SCRYPT_R = 8
+    SCRYPT_P = 1
+    
+    # Legacy / fallback PBKDF2 parameters
+    PBKDF2_ITERATIONS = 480000
+    
+    SALT_LENGTH = 16
+    HASH_LENGTH = 32
+    
+    @staticmethod
+    def _b64encode(data: bytes) -> str:
+        return base64.b64encode(data).decode().rstrip("=")
+    
+    @staticmethod
+    def _b64decode(data: str) -> bytes:
+        return base64.b64decode(data + "=" * (-len(data) % 4))
+    
+    @staticmethod
+    def _derive(password: str, scheme: str, params: dict, salt: bytes) -> bytes:
+        """Run the KDF for a scheme with the given parameters"""
+        if scheme == "scrypt":
+            n = 1 << params["ln"]
+            r = params["r"]
+            # hashlib needs an explicit memory budget above 128 * n * r
+            return hashlib.scrypt(
+                password.encode(),
+                salt=salt,
+                n=n,
+                r=r,
+                p=params["p"],
+                maxmem=256 * n * r,
+                dklen=PasswordHashingService.HASH_LENGTH,
+            )
+        if scheme == "pbkdf2-sha256":
+            return hashlib.pbkdf2_hmac(
+                "sha256",
+                password.encode(),
+                salt,
+                params["i"],
+                dklen=PasswordHashingService.HASH_LENGTH,
+            )
+        raise ValueError(f"Unsupported password hash scheme: {scheme}")
+    
+    @staticmethod
+    def _parse(hashed_password: str) -> tuple[str, dict, bytes, bytes]:
+        """Split a stored hash into (scheme, params, salt, digest)"""
+        if not hashed_password.startswith("$"):
+            # Legacy format: base64(salt + hash), PBKDF2-SHA256 at 480000 iterations
+            combined = base64.b64decode(hashed_password.encode())
+            return (
+                "pbkdf2-sha256",
+                {"i": PasswordHashingService.PBKDF2_ITERATIONS},
+                combined[:PasswordHashingService.SALT_LENGTH],
+                combined[PasswordHashingService.SALT_LENGTH:],
+            )
+        
+        _, scheme, param_str, salt_b64, digest_b64 = hashed_password.split("$")
+        params = {}
+        for item in param_str.split(","):
+            key, value = item.split("=")
+            params[key] = int(value)
+        return (
+            scheme,
+            params,
+            PasswordHashingService._b64decode(salt_b64),
+            PasswordHashingService._b64decode(digest_b64),
+        )
+    
+    @staticmethod
+    def _current_params() -> dict:
+        return {
+            "ln": PasswordHashingService.SCRYPT_LOG2_N,
+            "r": PasswordHashingService.SCRYPT_R,
+            "p": PasswordHashingService.SCRYPT_P,
+        }
+    
+    @staticmethod
+    def _encode(scheme: str, params: dict, salt: bytes, digest: bytes) -> str:
+        param_str = ",".join(f"{key}={value}" for key, value in params.items())
+        return "$".join([
+            "",
+            scheme,
+            param_str,
+            PasswordHashingService._b64encode(salt),
+            PasswordHashingService._b64encode(digest),
+        ])
     
     @staticmethod
     def hash_password(password: str) -> str:
         """
-        Hash password using PBKDF2 with random salt
+        Hash password using the current scheme with a random salt
         
         Args:
             password: Plain text password
         
         Returns:
-            Hashed password as base64 string in format: base64(salt + hash)
+            Self-describing hash string: $scheme$params$salt$digest
         """
         try:
-            salt = secrets.token_bytes(16)
-            
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=480000,
-            )
-            
-            hash_value = kdf.derive(password.encode())
-            
-            # Combine salt + hash and encode as base64
-            combined = salt + hash_value
-            return base64.b64encode(combined).decode()
+            salt = secrets.token_bytes(PasswordHashingService.SALT_LENGTH)
+            params = PasswordHashingService._current_params()
+            digest = PasswordHashingService._derive(password, PasswordHashingService.SCHEME, params, salt)
+            return PasswordHashingService._encode(PasswordHashingService.SCHEME, params, salt, digest)
         
         except Exception as e:
             raise Exception(f"Password hashing failed: {str(e)}")
@@ -170,31 +384,39 @@ class PasswordHashingService:
         
         Args:
             password: Plain text password to verify
-            hashed_password: The stored hashed password (base64)
+            hashed_password: The stored hash (versioned or legacy base64 format)
         
         Returns:
             True if password matches, False otherwise
         """
         try:
-            # Decode base64
-            combined = base64.b64decode(hashed_password.encode())
+            scheme, params, salt, stored_hash = PasswordHashingService._parse(hashed_password)
+            if scheme == PasswordHashingService.HKDF_SCHEME:
+                master = PasswordHashingService._derive(password, PasswordHashingService.SCHEME, params, salt)
+                hash_value, _ = EncryptionService._split_master(master)
+            else:
+                hash_value = PasswordHashingService._derive(password, scheme, params, salt)
             
-            # Extract salt and stored hash
-            salt = combined[:16]
-            stored_hash = combined[16:]
-            
-            # Re-derive hash with the same salt
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=480000,
-            )
-            
-            hash_value = kdf.derive(password.encode())
-            
-            # Compare hashes
-            return hash_value == stored_hash
+            # Constant-time comparison
+            return hmac.compare_digest(hash_value, stored_hash)
         
         except Exception as e:
             raise Exception(f"Password verification failed: {str(e)}")
+    
+    @staticmethod
+    def needs_rehash(hashed_password: str) -> bool:
+        """
+        Check whether a stored hash uses an outdated scheme or parameters
+        
+        Args:
+            hashed_password: The stored hash
+        
+        Returns:
+            True if the hash should be replaced after the next successful login
+        """
+        try:
+            scheme, params, _, _ = PasswordHashingService._parse(hashed_password)
+        except Exception:
+            return True
+        current_schemes = (PasswordHashingService.SCHEME, PasswordHashingService.HKDF_SCHEME)
+        return scheme not in current_schemes or params != PasswordHashingService._current_params()
@@ -0,0 +1,81 @@
+"""
+ETag helpers for conditional GET support on family read endpoints
+ETags are derived from cheap per-family version data so a 304 can be
+answered before the member list is fetched or serialized
+"""
+
+import hashlib
+from typing import Optional
+from fastapi.responses import Response
+
+
+# Clients must revalidate on every poll, but may keep the cached body
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """
+    Build a strong ETag from version components
+    
+    Args:
+        parts: Values that change whenever the representation changes
+    
+    Returns:
+        Quoted ETag string
+    """
+    raw = ":".join(str(part) for part in parts)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+# Suffixes of the ETags of content-coded variants, by Content-Encoding
+CODING_SUFFIXES = {"gzip": "-gz", "br": "-br"}
+
+
+def coded_etag(etag: str, coding: Optional[str]) -> str:
+    """
+    ETag of one content-coding of a representation
+    
+    Each coding is a different byte sequence, so a strong ETag must differ
+    per coding ('"abc"' -> '"abc-gz"'); the identity body keeps the plain ETag.
+    """
+    suffix = CODING_SUFFIXES.get(coding or "")
+    if not suffix:
+        return etag
+    return etag[:-1] + suffix + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against the current ETag or any of its coded variants"""
+    if not if_none_match:
+        return False
+    
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        # If-None-Match uses weak comparison
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag or any(candidate == coded_etag(etag, coding) for coding in CODING_SUFFIXES):
+            return True
+    return False
+
+
+def not_modified(etag: str, if_none_match: Optional[str] = None) -> Response:
+    """
+    Empty 304 response carrying the current validators
+    
+    When the client revalidated a coded variant, that variant's ETag is echoed
+    so the stored response keeps the validator it was sent with.
+    """
+    for candidate in (if_none_match or "").split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if any(candidate == coded_etag(etag, coding) for coding in CODING_SUFFIXES):
+            etag = candidate
+            break
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    )
@@ -0,0 +1,159 @@
+"""
+Pub/sub for family member change events
+Feeds the /api/families/{family_id}/events server-sent events stream
+
+Each subscriber gets a bounded queue. Events are encoded once per publish and
+the same bytes are fanned out to every subscriber of the family. A subscriber
+that falls behind has its backlog dropped and receives a single "resync" event,
+after which it should catch up through the delta sync endpoint.
+
+Backends (EVENT_BROKER_BACKEND):
+    memory - subscribers only see writes handled by the same worker process (default)
+    redis  - events are relayed through Redis pub/sub to every worker; startup fails
+             if the redis package is missing or the server does not answer
+"""
+
+import asyncio
+from typing import Dict, Optional, Set
+import orjson
+
+from core.config import EVENT_BROKER_BACKEND, REDIS_URL
+
+
+class FamilyEventBroker:
+    """Fan-out of change events to per-family subscriber queues"""
+    
+    QUEUE_SIZE = 100
+    RESYNC_EVENT = b"event: resync\ndata: {}\n\n"
+    
+    CHANNEL_PREFIX = "family-events:"
+    
+    def __init__(self, queue_size: int = QUEUE_SIZE, redis_url: Optional[str] = None):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._redis = None
+        self._pending: Set[asyncio.Task] = set()
+        if redis_url:
+            import redis.asyncio as redis
+            
+            self._redis = redis.from_url(redis_url)
+    
+    async def ping(self) -> None:
+        """Check the Redis server answers, if events are relayed through one (raises on connection errors)"""
+        if self._redis is not None:
+            await self._redis.ping()
+    
+    def subscribe(self, family_id: str) -> asyncio.Queue:
+        """Register a new subscriber queue for a family"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(family_id, set()).add(queue)
+        return queue
+    
+    def unsubscribe(self, family_id: str, queue: asyncio.Queue) -> None:
+        """Remove a subscriber queue"""
+        queues = self._subscribers.get(family_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[family_id]
+    
+    def subscriber_count(self, family_id: str) -> int:
+        """Number of live subscribers for a family"""
+        return len(self._subscribers.get(family_id, ()))
+    
+    def publish(self, family_id: str, event_type: str, data: dict, event_id: Optional[int] = None) -> None:
+        """
+        Publish an event to every subscriber of a family
+        
+        Args:
+            family_id: The family the event belongs to
+            event_type: SSE event name (member_created, member_updated, member_deleted)
+            data: JSON-serializable payload
+            event_id: Sync cursor sent as the SSE id (the row_version of the change)
+        """
+        message = self.encode(event_type, data, event_id)
+        if self._redis is not None:
+            # Delivered to local subscribers too, by this worker's relay task
+            task = asyncio.get_running_loop().create_task(self._relay_publish(family_id, message))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+            return
+        self._deliver(family_id, message)
+    
+    def _deliver(self, family_id: str, message: bytes) -> None:
+        """Put an encoded event on every local subscriber queue of a family"""
+        queues = self._subscribers.get(family_id)
+        if not queues:
+            return
+        
+        for queue in queues:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow consumer: drop its backlog and ask it to resync
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.RESYNC_EVENT)
+    
+    async def _relay_publish(self, family_id: str, message: bytes) -> None:
+        try:
+            await self._redis.publish(self.CHANNEL_PREFIX + family_id, message)
+        except Exception as e:
+            # Live clients miss this event; the delta sync endpoint still has the change
+            print(f"Warning: Failed to publish event for family {family_id}: {str(e)}")
+    
+    async def run_relay(self) -> None:
+        """Deliver events published by any worker to this worker's subscribers (runs until cancelled)"""
+        if self._redis is None:
+            return
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.psubscribe(self.CHANNEL_PREFIX + "*")
+                try:
+                    async for item in pubsub.listen():
+                        if item.get("type") != "pmessage":
+                            continue
+                        channel = item["channel"].decode() if isinstance(item["channel"], bytes) else item["channel"]
+                        self._deliver(channel[len(self.CHANNEL_PREFIX):], item["data"])
+                finally:
+                    await pubsub.reset()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Warning: Event relay disconnected, reconnecting: {str(e)}")
+            # Events published while disconnected were lost; tell every subscriber to resync
+            for family_id in list(self._subscribers):
+                self._deliver(family_id, self.RESYNC_EVENT)
+            await asyncio.sleep(1)
+    
+    @staticmethod
+    def encode(event_type: str, data: dict, event_id: Optional[int] = None) -> bytes:
+        """Encode one server-sent event"""
+        head = f"event: {event_type}\n"
+        if event_id is not None:
+            head += f"id: {event_id}\n"
+        return head.encode() + b"data: " + orjson.dumps(data) + b"\n\n"
+    
+    @staticmethod
+    def event_id(message: bytes) -> Optional[int]:
+        """The id of an encoded event (None for events without one, e.g. resync)"""
+        for line in message.split(b"\n", 2)[:2]:
+            if line.startswith(b"id: "):
+                return int(line[4:])
+        return None
+
+
+def _create_broker() -> FamilyEventBroker:
+    if EVENT_BROKER_BACKEND == "redis":
+        # No fallback: an in-process broker would silently drop events from other workers
+        try:
+            return FamilyEventBroker(redis_url=REDIS_URL)
+        except ImportError as e:
+            raise RuntimeError("EVENT_BROKER_BACKEND=redis but the redis package is not installed") from e
+    return FamilyEventBroker()
+
+
+# Shared broker for the process
+event_broker = _create_broker()
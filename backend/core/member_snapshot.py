@@ -0,0 +1,219 @@
+"""
+Compact member snapshot encoding for large families
+Instead of one JSON object per member (repeating every key, the family id and
+each relationships dict), members are sent as parallel columns: repeated strings
+go into a string table and referenced by index, and resolved parent links become
+a flat edge array. Clients opt in through the Accept header; the body is encoded
+as JSON or, when msgpack is installed, MessagePack
+"""
+
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+
+from core.relationships import parent_links
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; the columnar JSON form is always available
+    msgpack = None
+
+
+SNAPSHOT_FORMAT_VERSION = 2
+
+# Media types a client can ask for with Accept
+COLUMNAR_JSON_TYPE = "application/vnd.apnaparivar.members+json"
+COLUMNAR_MSGPACK_TYPE = "application/vnd.apnaparivar.members+msgpack"
+MSGPACK_ALIASES = ("application/msgpack", "application/x-msgpack")
+
+# Representation names, also used in ETags and cache keys
+FORMAT_JSON = "json"
+FORMAT_COLUMNAR = "columnar"
+FORMAT_MSGPACK = "msgpack"
+
+MEDIA_TYPES = {
+    FORMAT_JSON: "application/json",
+    FORMAT_COLUMNAR: COLUMNAR_JSON_TYPE,
+    FORMAT_MSGPACK: COLUMNAR_MSGPACK_TYPE,
+}
+
+
+def _accepted_types(accept: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept header into {media type: q}"""
+    types = {}
+    for part in (accept or "").split(","):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            if param.replace(" ", "").startswith("q="):
+                try:
+                    q = float(param.split("=", 1)[1])
+                except ValueError:
+                    q = 0.0
+        types[media_type.lower()] = max(q, types.get(media_type.lower(), 0.0))
+    return types
+
+
+def negotiate_member_format(accept: Optional[str]) -> str:
+    """
+    Pick the member list representation for an Accept header
+
+    Compact formats are only served when asked for by name; anything else
+    (no header, */*, application/json) gets the plain JSON list.
+
+    Returns:
+        One of FORMAT_JSON, FORMAT_COLUMNAR or FORMAT_MSGPACK
+    """
+    types = _accepted_types(accept)
+    if not types:
+        return FORMAT_JSON
+
+    quality = {
+        FORMAT_MSGPACK: max([types.get(t, 0.0) for t in (COLUMNAR_MSGPACK_TYPE, *MSGPACK_ALIASES)]) if msgpack else 0.0,
+        FORMAT_COLUMNAR: types.get(COLUMNAR_JSON_TYPE, 0.0),
+        FORMAT_JSON: max(types.get("application/json", 0.0), types.get("application/*", 0.0), types.get("*/*", 0.0)),
+    }
+    # On equal quality the smaller representation wins
+    best = max(quality, key=lambda name: (quality[name], name != FORMAT_JSON, name == FORMAT_MSGPACK))
+    return best if quality[best] > 0 else FORMAT_JSON
+
+
+class _StringTable:
+    """Interns strings, returning their index in the table"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+def _pack_uuids(ids: List[str]) -> Optional[bytes]:
+    """Concatenate UUID strings as raw bytes, or None if any id is not a UUID"""
+    try:
+        return b"".join(uuid.UUID(value).bytes for value in ids)
+    except ValueError:
+        return None
+
+
+def _sparse_columns(rows: List[Optional[dict]], table: _StringTable) -> Tuple[dict, dict]:
+    """
+    Encode per-member dicts as {key: {rows, values}} columns holding only present entries
+
+    A column holding only strings is replaced by string table indices; a column
+    with any other value (null, numbers, booleans, objects) keeps its raw values
+    and is marked "raw": true. Members whose value is not a dict at all (e.g.
+    null) are returned separately as a raw {rows, values} column so decoding
+    restores them exactly.
+
+    Returns:
+        Tuple of (columns, non-dict values)
+    """
+    columns: Dict[str, dict] = {}
+    other = {"rows": [], "values": []}
+    for row, data in enumerate(rows):
+        if not isinstance(data, dict):
+            other["rows"].append(row)
+            other["values"].append(data)
+            continue
+        for key, value in data.items():
+            column = columns.setdefault(key, {"rows": [], "values": []})
+            column["rows"].append(row)
+            column["values"].append(value)
+
+    for column in columns.values():
+        if all(isinstance(v, str) for v in column["values"]):
+            column["values"] = [table.add(v) for v in column["values"]]
+        else:
+            column["raw"] = True
+    return columns, other
+
+
+def build_member_snapshot(family_id: str, members: List[dict]) -> dict:
+    """
+    Build the columnar snapshot of a member list
+
+    Args:
+        family_id: The family all members belong to
+        members: Rows returned by FamilyMemberService (shaped to MEMBER_COLUMNS)
+
+    Returns:
+        Dictionary with:
+        - strings: string table referenced by index (-1 means null)
+        - id: member ids; every other column is in the same order
+        - name, photo_url, photo_hash, created_at, updated_at: string table
+          indices (timestamps are kept as the exact ISO strings)
+        - edges: flat [parent, child, key, ...] triples; parent and child index
+          the member columns, key is the relationship key's string index
+        - relationships: sparse {key: {rows, values[, raw]}} columns with the
+          entries not already carried by an edge (a link by id is rebuilt from the edge)
+        - custom_fields: sparse {key: {rows, values[, raw]}} columns
+        - relationships_other, custom_fields_other: raw {rows, values} of
+          members whose field is not an object (e.g. null)
+    """
+    table = _StringTable()
+    ids = [str(m.get("id")) for m in members]
+
+    edges: List[int] = []
+    relationships = [dict(m["relationships"]) if isinstance(m.get("relationships"), dict) else m.get("relationships")
+                     for m in members]
+    for child, key, parent in parent_links(members):
+        edges.extend((parent, child, table.add(key)))
+        if isinstance(relationships[child], dict) and relationships[child].get(key) == ids[parent]:
+            del relationships[child][key]
+
+    relationship_columns, relationships_other = _sparse_columns(relationships, table)
+    custom_field_columns, custom_fields_other = _sparse_columns([m.get("custom_fields") for m in members], table)
+
+    return {
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "family_id": family_id,
+        "count": len(members),
+        "id": ids,
+        "name": [table.add(m.get("name")) for m in members],
+        "photo_url": [table.add(m.get("photo_url")) for m in members],
+        "photo_hash": [table.add(m.get("photo_hash")) for m in members],
+        "created_at": [table.add(m.get("created_at")) for m in members],
+        "updated_at": [table.add(m.get("updated_at")) for m in members],
+        "edges": edges,
+        "relationships": relationship_columns,
+        "relationships_other": relationships_other,
+        "custom_fields": custom_field_columns,
+        "custom_fields_other": custom_fields_other,
+        "strings": table.strings,
+    }
+
+
+def encode_member_snapshot(family_id: str, members: List[dict], member_format: str) -> bytes:
+    """
+    Encode a member list in a compact representation
+
+    Args:
+        family_id: The family all members belong to
+        members: Rows returned by FamilyMemberService
+        member_format: FORMAT_COLUMNAR or FORMAT_MSGPACK
+
+    Returns:
+        Encoded body
+    """
+    snapshot = build_member_snapshot(family_id, members)
+    if member_format == FORMAT_MSGPACK:
+        # Random UUIDs dominate the compressed size; as raw bytes they take 16
+        # bytes instead of 37, under "id_bin" (concatenated, 16 bytes per member)
+        id_bin = _pack_uuids(snapshot["id"])
+        if id_bin is not None:
+            del snapshot["id"]
+            snapshot["id_bin"] = id_bin
+        return msgpack.packb(snapshot, use_bin_type=True)
+    return orjson.dumps(snapshot)
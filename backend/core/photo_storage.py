@@ -0,0 +1,125 @@
+"""
+Storage backends for member photos
+Objects are content addressed ({sha256}/original.<ext>, {sha256}/<size>.webp),
+so they never change once written and can be cached by clients forever
+"""
+
+import hashlib
+import hmac
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.config import (
+    PHOTO_STORAGE_BACKEND,
+    PHOTO_BUCKET,
+    PHOTO_LOCAL_DIR,
+    PHOTO_STORAGE_PRIVATE,
+    JWT_SECRET_KEY,
+)
+
+
+# Content-addressed objects are immutable
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def local_signature(key: str, expires: int) -> str:
+    """HMAC over an object key and expiry, used to sign locally served photo URLs"""
+    message = f"{key}:{expires}".encode()
+    return hmac.new(JWT_SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_local_signature(key: str, expires: Optional[int], signature: Optional[str]) -> bool:
+    """Check a locally signed photo URL"""
+    if expires is None or not signature or expires < time.time():
+        return False
+    return hmac.compare_digest(local_signature(key, expires), signature)
+
+
+class LocalPhotoStorage:
+    """Photos on the local filesystem (development and tests)"""
+
+    def __init__(self, base_dir: str = PHOTO_LOCAL_DIR):
+        self.base_dir = Path(base_dir)
+
+    def path(self, key: str) -> Path:
+        return self.base_dir / key
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        """Write an object atomically so readers never see a partial file"""
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=target.parent, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, target)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def public_url(self, key: str) -> Optional[str]:
+        """Local objects are served by the photo router"""
+        return None
+
+    def sign_urls(self, keys: List[str], expires_in: int) -> Dict[str, str]:
+        """Photo router URLs carrying an HMAC signature and expiry"""
+        expires = int(time.time()) + expires_in
+        return {
+            key: f"/api/photos/{key}?expires={expires}&signature={local_signature(key, expires)}"
+            for key in keys
+        }
+
+
+class SupabasePhotoStorage:
+    """Photos in a Supabase storage bucket"""
+
+    def __init__(self, supabase, bucket: str = PHOTO_BUCKET):
+        self.bucket = supabase.storage.from_(bucket)
+
+    def exists(self, key: str) -> bool:
+        try:
+            return self.bucket.exists(key)
+        except Exception:
+            return False
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        self.bucket.upload(key, data, {
+            "content-type": content_type,
+            "cache-control": "31536000",
+            "upsert": "true"
+        })
+
+    def public_url(self, key: str) -> Optional[str]:
+        # Private buckets have no public URLs; clients get signed ones instead
+        if PHOTO_STORAGE_PRIVATE:
+            return None
+        return self.bucket.get_public_url(key)
+
+    def sign_urls(self, keys: List[str], expires_in: int) -> Dict[str, str]:
+        """Sign many object URLs in one storage API call"""
+        if not keys:
+            return {}
+        signed = self.bucket.create_signed_urls(keys, expires_in)
+        return {item["path"]: item["signedURL"] for item in signed if not item.get("error")}
+
+
+_photo_storage = None
+
+
+def get_photo_storage():
+    """Get the configured photo storage backend"""
+    global _photo_storage
+    if _photo_storage is None:
+        if PHOTO_STORAGE_BACKEND == "local":
+            _photo_storage = LocalPhotoStorage()
+        else:
+            from core.database import get_supabase_client
+            _photo_storage = SupabasePhotoStorage(get_supabase_client())
+    return _photo_storage
@@ -0,0 +1,166 @@
+"""
+Token-bucket rate limiting for the login endpoints
+Buckets are keyed by client IP, email and family name so a burst of bad
+attempts is rejected with 429 before any expensive key derivation runs
+
+Backends:
+    memory - per-process buckets (default; single worker only)
+    redis  - shared buckets in a local Redis-compatible server; startup fails if
+             the redis package is missing or the server does not answer
+"""
+
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException, Request, status
+
+from core.config import (
+    RATE_LIMIT_BACKEND,
+    REDIS_URL,
+    LOGIN_RATE_LIMIT_PER_IP,
+    LOGIN_RATE_LIMIT_PER_ACCOUNT,
+    TRUST_FORWARDED_FOR,
+)
+
+
+class InMemoryBucketBackend:
+    """Token buckets held in process memory, bounded to max_keys entries"""
+    
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+    
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        """Take one token; returns 0 if allowed, otherwise seconds until a token is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(capacity), now))
+        tokens = min(float(capacity), tokens + (now - updated) * refill_per_second)
+        
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / refill_per_second
+        
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        # Evict the least recently touched buckets so an attack on many keys stays bounded
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+    
+    async def ping(self) -> None:
+        """Nothing to connect to"""
+
+
+class RedisBucketBackend:
+    """Token buckets stored in Redis, updated atomically with a Lua script"""
+    
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
+    
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+    
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        """Take one token; returns 0 if allowed, otherwise seconds until a token is available"""
+        wait = await self._script(keys=[f"ratelimit:{key}"], args=[capacity, refill_per_second, time.time()])
+        return float(wait)
+    
+    async def ping(self) -> None:
+        """Check the Redis server answers (raises on connection errors)"""
+        await self._client.ping()
+
+
+class LoginRateLimiter:
+    """Per-IP and per-account token buckets for login attempts"""
+    
+    def __init__(self, backend, per_ip: int, per_account: int):
+        self.backend = backend
+        self.per_ip = per_ip
+        self.per_account = per_account
+    
+    @staticmethod
+    def client_ip(request: Request) -> str:
+        """Client address, honouring X-Forwarded-For only when configured to"""
+        if TRUST_FORWARDED_FOR:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+    
+    async def check(
+        self,
+        request: Request,
+        scope: str,
+        email: Optional[str] = None,
+        family_name: Optional[str] = None
+    ) -> None:
+        """
+        Consume one attempt from every bucket that applies to this login
+        
+        Args:
+            request: Incoming request (for the client IP)
+            scope: Login endpoint name, so limits are tracked per flow
+            email: Email or username being logged in
+            family_name: Family name for member logins
+        
+        Raises:
+            HTTPException: 429 with Retry-After when any bucket is empty
+        """
+        buckets = [(f"{scope}:ip:{self.client_ip(request)}", self.per_ip)]
+        if email:
+            buckets.append((f"{scope}:email:{email.strip().lower()}", self.per_account))
+        if family_name:
+            buckets.append((f"{scope}:family:{family_name.strip().lower()}", self.per_account))
+        
+        wait = 0.0
+        for key, per_minute in buckets:
+            wait = max(wait, await self.backend.take(key, per_minute, per_minute / 60.0))
+        
+        if wait > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts. Please try again later.",
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+
+
+def _create_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        # No fallback: per-worker buckets would silently multiply the limits
+        try:
+            return RedisBucketBackend(REDIS_URL)
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis but the redis package is not installed") from e
+    # main.py refuses this; uvicorn --workers and gunicorn read the same variable but don't
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        print(f"Warning: In-memory login rate limits with WEB_CONCURRENCY={workers}; "
+              f"each worker allows the full limit, so set RATE_LIMIT_BACKEND=redis")
+    return InMemoryBucketBackend()
+
+
+# Shared limiter for the auth endpoints
+login_rate_limiter = LoginRateLimiter(_create_backend(), LOGIN_RATE_LIMIT_PER_IP, LOGIN_RATE_LIMIT_PER_ACCOUNT)
@@ -0,0 +1,270 @@
+"""
+Relationship graph checks for family member imports
+Builds the parent graph of an incoming batch together with the family's existing
+members once and reports per-row problems (cycles, dangling or duplicate links,
+too many parents) in O(V+E)
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# Relationship keys that link a member to a parent (same set as family_member_parent_edges)
+PARENT_KEYS = ("father", "mother", "parent", "parent_1", "parent_2")
+
+MAX_PARENTS = 2
+
+_UUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+
+class RelationshipValidationError(ValueError):
+    """Raised when an import contains relationship errors"""
+
+    def __init__(self, diagnostics: List[dict]):
+        self.diagnostics = diagnostics
+        errors = [d for d in diagnostics if d["severity"] == "error"]
+        super().__init__(f"{len(errors)} relationship error(s) in import")
+
+
+def _diagnostic(row: int, field: Optional[str], code: str, severity: str, message: str, value=None) -> dict:
+    return {
+        "row": row,
+        "field": field,
+        "code": code,
+        "severity": severity,
+        "message": message,
+        "value": value
+    }
+
+
+def _normalize_name(name) -> str:
+    return str(name or "").strip().lower()
+
+
+def _strongly_connected(adjacency: List[List[int]]) -> List[int]:
+    """
+    Label the strongly connected components of a graph (iterative Tarjan)
+
+    Args:
+        adjacency: Out-edges per node
+
+    Returns:
+        Component label per node
+    """
+    count = len(adjacency)
+    index = [-1] * count
+    low = [0] * count
+    on_stack = [False] * count
+    component = [-1] * count
+    stack = []
+    next_index = 0
+    next_component = 0
+
+    for start in range(count):
+        if index[start] != -1:
+            continue
+        work = [(start, 0)]
+        index[start] = low[start] = next_index
+        next_index += 1
+        stack.append(start)
+        on_stack[start] = True
+
+        while work:
+            node, edge = work[-1]
+            if edge < len(adjacency[node]):
+                work[-1] = (node, edge + 1)
+                target = adjacency[node][edge]
+                if index[target] == -1:
+                    index[target] = low[target] = next_index
+                    next_index += 1
+                    stack.append(target)
+                    on_stack[target] = True
+                    work.append((target, 0))
+                elif on_stack[target]:
+                    low[node] = min(low[node], index[target])
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = next_component
+                    if member == node:
+                        break
+                next_component += 1
+
+    return component
+
+
+def validate_relationships(members: List[dict], existing: Optional[List[dict]] = None) -> List[dict]:
+    """
+    Check the parent links of an import against itself and the existing family
+
+    Parent values may be a member id or a member name, as in family_member_parent_edges.
+    Names that match nobody are reported as warnings since they often refer to people
+    outside the tree; links that would make the graph inconsistent are errors.
+
+    Args:
+        members: Incoming member dicts (name, relationships), in request order
+        existing: Existing members of the family (id, name, relationships)
+
+    Returns:
+        List of diagnostics with row (0-based index into members), field, code,
+        severity ("error" or "warning"), message and value
+    """
+    existing = existing or []
+    diagnostics = []
+
+    # Node i < len(existing) is an existing member, the rest are incoming rows
+    offset = len(existing)
+    nodes = existing + members
+    ids: Dict[str, int] = {}
+    names: Dict[str, List[int]] = {}
+    for node, member in enumerate(nodes):
+        if node < offset and member.get("id"):
+            ids[str(member["id"]).lower()] = node
+        name = _normalize_name(member.get("name"))
+        if name:
+            names.setdefault(name, []).append(node)
+
+    adjacency: List[List[int]] = [[] for _ in nodes]
+    for node, member in enumerate(nodes):
+        incoming = node >= offset
+        row = node - offset
+        relationships = member.get("relationships") or {}
+        if not isinstance(relationships, dict):
+            if incoming:
+                diagnostics.append(_diagnostic(row, "relationships", "invalid_relationships", "error",
+                                               "Relationships must be an object"))
+            continue
+
+        seen_parents: Dict[int, str] = {}
+        linked_keys = 0
+        for key in PARENT_KEYS:
+            value = relationships.get(key)
+            if value is None or not str(value).strip():
+                continue
+            value = str(value).strip()
+            linked_keys += 1
+
+            if _UUID_RE.match(value):
+                target = ids.get(value.lower())
+                if target is None:
+                    if incoming:
+                        diagnostics.append(_diagnostic(row, key, "dangling_reference", "error",
+                                                       f"No member with id {value} in this family", value))
+                    continue
+                targets = [target]
+            else:
+                targets = names.get(value.lower(), [])
+                if not targets:
+                    if incoming:
+                        diagnostics.append(_diagnostic(row, key, "dangling_reference", "warning",
+                                                       f"No member named '{value}' in this family", value))
+                    continue
+                # A name shared with the member itself is a different person (e.g. father and son)
+                others = [t for t in targets if t != node]
+                if not others:
+                    if incoming:
+                        diagnostics.append(_diagnostic(row, key, "self_reference", "warning",
+                                                       f"'{value}' only matches this member", value))
+                    continue
+                # Ambiguous names are not linked, so they cannot produce false cycles
+                if len(others) > 1:
+                    if incoming:
+                        diagnostics.append(_diagnostic(row, key, "ambiguous_reference", "warning",
+                                                       f"'{value}' matches {len(others)} members", value))
+                    continue
+                targets = others
+
+            for target in targets:
+                if target == node:
+                    if incoming:
+                        diagnostics.append(_diagnostic(row, key, "self_reference", "error",
+                                                       "A member cannot be their own parent", value))
+                    continue
+                if target in seen_parents:
+                    if incoming:
+                        diagnostics.append(_diagnostic(row, key, "duplicate_edge", "error",
+                                                       f"Same parent as '{seen_parents[target]}'", value))
+                    continue
+                seen_parents[target] = key
+                adjacency[target].append(node)
+
+        if incoming and linked_keys > MAX_PARENTS:
+            diagnostics.append(_diagnostic(row, None, "too_many_parents", "error",
+                                           f"{linked_keys} parent links, at most {MAX_PARENTS} allowed"))
+
+    # Any component with more than one member contains a cycle
+    component = _strongly_connected(adjacency)
+    sizes: Dict[int, int] = {}
+    for label in component:
+        sizes[label] = sizes.get(label, 0) + 1
+    for node in range(offset, len(nodes)):
+        if sizes[component[node]] > 1:
+            diagnostics.append(_diagnostic(node - offset, None, "cycle", "error",
+                                           "Member would be their own ancestor"))
+
+    diagnostics.sort(key=lambda d: d["row"])
+    return diagnostics
+
+
+def has_errors(diagnostics: List[dict]) -> bool:
+    """Whether any diagnostic blocks the import"""
+    return any(d["severity"] == "error" for d in diagnostics)
+
+
+def parent_links(members: List[dict]) -> List[Tuple[int, str, int]]:
+    """
+    Resolve parent links of existing members to indices, using the validator's rules
+
+    Links by id or by a name that identifies exactly one other member are kept;
+    dangling, ambiguous, self and repeated links are dropped.
+
+    Args:
+        members: Members with id, name and relationships
+
+    Returns:
+        (child index, relationship key, parent index) per resolved link
+    """
+    ids: Dict[str, int] = {}
+    names: Dict[str, List[int]] = {}
+    for node, member in enumerate(members):
+        if member.get("id"):
+            ids[str(member["id"]).lower()] = node
+        name = _normalize_name(member.get("name"))
+        if name:
+            names.setdefault(name, []).append(node)
+
+    links: List[Tuple[int, str, int]] = []
+    for node, member in enumerate(members):
+        relationships = member.get("relationships") or {}
+        if not isinstance(relationships, dict):
+            continue
+        linked = set()
+        for key in PARENT_KEYS:
+            value = relationships.get(key)
+            if value is None or not str(value).strip():
+                continue
+            value = str(value).strip()
+            if _UUID_RE.match(value):
+                target = ids.get(value.lower())
+            else:
+                others = [t for t in names.get(value.lower(), []) if t != node]
+                target = others[0] if len(others) == 1 else None
+            if target is not None and target != node and target not in linked:
+                linked.add(target)
+                links.append((node, key, target))
+    return links
+
+
+def parent_edges(members: List[dict]) -> List[List[int]]:
+    """Parent indices per member (same order as members), see parent_links"""
+    parents: List[List[int]] = [[] for _ in members]
+    for child, _, parent in parent_links(members):
+        parents[child].append(parent)
+    return parents
@@ -0,0 +1,62 @@
+"""
+Revocation list for access tokens
+Logged-out access tokens are tracked by their jti until they would have
+expired anyway. Revocations are written to the revoked_access_tokens table so
+every worker process sees them; each process keeps the active set in memory and
+reloads it every REVOCATION_SYNC_SECONDS, so the check on every request stays a
+single set lookup
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Dict
+
+from core.config import REVOCATION_SYNC_SECONDS
+
+
+class RevocationList:
+    """Set of revoked token IDs, shared through the database"""
+    
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}
+        self._next_sync = 0.0
+    
+    def revoke(self, jti: str, expires_at: float) -> None:
+        """Revoke a token ID until its expiry (unix timestamp)"""
+        from core.database import get_supabase_client
+        
+        self._revoked[jti] = expires_at
+        supabase = get_supabase_client()
+        supabase.table("revoked_access_tokens").upsert({
+            "jti": jti,
+            "expires_at": datetime.fromtimestamp(expires_at, timezone.utc).isoformat()
+        }).execute()
+        # Expired tokens fail signature checks on their own, forget them
+        supabase.table("revoked_access_tokens").delete().lt("expires_at", datetime.now(timezone.utc).isoformat()).execute()
+    
+    def is_revoked(self, jti: str) -> bool:
+        """Check whether a token ID has been revoked (by any worker)"""
+        self._sync()
+        return jti in self._revoked
+    
+    def _sync(self) -> None:
+        now = time.time()
+        if now < self._next_sync:
+            return
+        from core.database import get_supabase_client
+        
+        try:
+            response = get_supabase_client().table("revoked_access_tokens").select("jti, expires_at").gt("expires_at", datetime.now(timezone.utc).isoformat()).execute()
+            self._revoked = {
+                row.get("jti"): datetime.fromisoformat(row.get("expires_at")).timestamp()
+                for row in response.data or []
+            }
+        except Exception as e:
+            # Keep the last known set (plus local revocations); retry on the next interval
+            print(f"Warning: Failed to load revoked access tokens: {str(e)}")
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        self._next_sync = now + REVOCATION_SYNC_SECONDS
+
+
+# Shared revocation list for the process
+access_token_revocations = RevocationList()
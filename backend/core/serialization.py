@@ -0,0 +1,38 @@
+"""
+Fast JSON serialization for large list responses
+Validates member lists in bulk with a pydantic TypeAdapter (or skips validation
+for trusted service rows) and encodes them without FastAPI's per-item response_model pass
+"""
+
+from typing import List, Optional
+import orjson
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+from core.config import TRUST_SERVICE_ROWS
+from schemas.user import FamilyMemberResponse
+
+
+FamilyMemberListAdapter = TypeAdapter(List[FamilyMemberResponse])
+
+
+def serialize_members(members: List[dict]) -> bytes:
+    """
+    Encode a list of family member rows as JSON bytes
+    
+    Args:
+        members: Rows returned by FamilyMemberService (already shaped to MEMBER_COLUMNS)
+    
+    Returns:
+        JSON encoded body
+    """
+    if TRUST_SERVICE_ROWS:
+        return orjson.dumps(members)
+    
+    # Validate and dump the whole list in one pydantic-core call
+    return FamilyMemberListAdapter.dump_json(FamilyMemberListAdapter.validate_python(members))
+
+
+def members_response(members: List[dict], headers: Optional[dict] = None) -> Response:
+    """Build a JSON response for a member list, bypassing response_model re-validation"""
+    return Response(content=serialize_members(members), media_type="application/json", headers=headers)
@@ -0,0 +1,68 @@
+"""
+Cache of signed photo URLs
+Signing goes to the storage API, so signatures are reused until shortly before
+they expire and every miss of a batch is signed in a single call
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from core.config import SIGNED_URL_TTL, SIGNED_URL_REFRESH_MARGIN, SIGNED_URL_CACHE_SIZE
+
+
+class SignedUrlCache:
+    """Bounded LRU of object key -> (signed URL, expiry)"""
+    
+    def __init__(self, max_entries: int = SIGNED_URL_CACHE_SIZE, ttl: int = SIGNED_URL_TTL,
+                 refresh_margin: int = SIGNED_URL_REFRESH_MARGIN):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl // 2)
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        # Callers sign from worker threads; the lock is never held while signing
+        self._lock = threading.Lock()
+    
+    def get_many(self, storage, keys: List[str]) -> Tuple[Dict[str, str], float]:
+        """
+        Get signed URLs for object keys, signing all misses in one batch
+        
+        Args:
+            storage: Photo storage backend with sign_urls(keys, expires_in)
+            keys: Object keys to sign
+        
+        Returns:
+            Tuple of ({key: signed URL}, earliest expiry as a UNIX timestamp)
+        """
+        now = time.time()
+        urls = {}
+        earliest = now + self.ttl
+        missing = []
+        
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] - self.refresh_margin > now:
+                    self._entries.move_to_end(key)
+                    urls[key] = entry[0]
+                    earliest = min(earliest, entry[1])
+                else:
+                    missing.append(key)
+        
+        if missing:
+            expires_at = now + self.ttl
+            signed = storage.sign_urls(missing, self.ttl)
+            with self._lock:
+                for key, url in signed.items():
+                    self._entries[key] = (url, expires_at)
+                    self._entries.move_to_end(key)
+                    urls[key] = url
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        
+        return urls, earliest
+
+
+# Shared cache for the process
+signed_url_cache = SignedUrlCache()
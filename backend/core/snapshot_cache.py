@@ -0,0 +1,120 @@
+"""
+Cache of encoded family snapshots keyed by ETag
+Stores the JSON body together with its gzip (and brotli, when available)
+compressed forms so repeat hits are served without re-serializing or recompressing
+"""
+
+import gzip
+from collections import OrderedDict
+from typing import Optional
+from fastapi.responses import Response
+
+from core.config import COMPRESSION_MIN_SIZE, SNAPSHOT_CACHE_SIZE
+from core.etag import coded_etag
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+
+class Snapshot:
+    """One encoded representation of a family resource"""
+    
+    __slots__ = ("etag", "body", "gzip_body", "br_body")
+    
+    def __init__(self, etag: str, body: bytes):
+        self.etag = etag
+        self.body = body
+        self.gzip_body = None
+        self.br_body = None
+        
+        # Small payloads are not worth compressing
+        if len(body) >= COMPRESSION_MIN_SIZE:
+            self.gzip_body = gzip.compress(body, compresslevel=9)
+            if brotli is not None:
+                self.br_body = brotli.compress(body, quality=7)
+
+
+class SnapshotCache:
+    """Bounded LRU of snapshots, one entry per cache key"""
+    
+    def __init__(self, max_entries: int = SNAPSHOT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Snapshot]" = OrderedDict()
+    
+    def get(self, key: str, etag: str) -> Optional[Snapshot]:
+        """Return the cached snapshot if it is still at the given ETag"""
+        snapshot = self._entries.get(key)
+        if snapshot is None or snapshot.etag != etag:
+            return None
+        self._entries.move_to_end(key)
+        return snapshot
+    
+    def put(self, key: str, etag: str, body: bytes) -> Snapshot:
+        """Compress and store a snapshot, evicting the least recently used entry"""
+        return self.store(key, Snapshot(etag, body))
+    
+    def store(self, key: str, snapshot: Snapshot) -> Snapshot:
+        """
+        Store an already compressed snapshot, evicting the least recently used entry
+        
+        The cache is not thread-safe: compress large bodies in a worker thread
+        (asyncio.to_thread(Snapshot, etag, body)) and store on the event loop.
+        """
+        self._entries[key] = snapshot
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return snapshot
+    
+    def invalidate(self, key: str) -> None:
+        """Drop a cached snapshot"""
+        self._entries.pop(key, None)
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """Parse an Accept-Encoding header into the set of acceptable codings"""
+    codings = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            codings.add(coding.strip().lower())
+    return codings
+
+
+def snapshot_response(
+    snapshot: Snapshot,
+    accept_encoding: Optional[str],
+    media_type: str = "application/json",
+    headers: Optional[dict] = None
+) -> Response:
+    """
+    Serve a snapshot using the best pre-compressed body the client accepts
+    Each coding is sent with its own ETag variant (see core.etag.coded_etag)
+    """
+    headers = dict(headers or {})
+    headers["Vary"] = ", ".join(filter(None, (headers.get("Vary"), "Accept-Encoding")))
+    codings = accepted_encodings(accept_encoding)
+    
+    if snapshot.br_body is not None and "br" in codings:
+        headers["Content-Encoding"] = "br"
+        headers["ETag"] = coded_etag(snapshot.etag, "br")
+        return Response(content=snapshot.br_body, media_type=media_type, headers=headers)
+    if snapshot.gzip_body is not None and ("gzip" in codings or "*" in codings):
+        headers["Content-Encoding"] = "gzip"
+        headers["ETag"] = coded_etag(snapshot.etag, "gzip")
+        return Response(content=snapshot.gzip_body, media_type=media_type, headers=headers)
+    headers["ETag"] = snapshot.etag
+    return Response(content=snapshot.body, media_type=media_type, headers=headers)
+
+
+# Shared cache for the process
+snapshot_cache = SnapshotCache()
@@ -0,0 +1,68 @@
+"""
+Soft delete and background purge for families and members
+Deletes only stamp deleted_at, so they return immediately; rows stay restorable
+for SOFT_DELETE_RETENTION_HOURS and are then removed by a background worker in
+small batches (purge_deleted_rows in sql/schema.sql), spreading the database
+load of large family deletes over many short transactions
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+from core.config import (
+    SOFT_DELETE_RETENTION_HOURS,
+    PURGE_INTERVAL_SECONDS,
+    PURGE_BATCH_SIZE,
+    PURGE_BATCH_PAUSE_SECONDS,
+)
+
+
+def deleted_now() -> str:
+    """Timestamp stored in deleted_at"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+# Undo window passed to the restore and purge functions, which compare it with the database clock
+RETENTION_SECONDS = SOFT_DELETE_RETENTION_HOURS * 3600
+
+
+def purge_batch(supabase, batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """
+    Hard-delete one batch of rows whose undo window has passed
+
+    Returns:
+        Number of rows removed (less than batch_size when nothing is left)
+    """
+    response = supabase.rpc("purge_deleted_rows", {
+        "p_retention_seconds": RETENTION_SECONDS,
+        "p_batch_size": batch_size
+    }).execute()
+    return response.data or 0
+
+
+async def purge_deleted_rows(supabase) -> int:
+    """Purge batch after batch, pausing in between, until nothing expired is left"""
+    total = 0
+    while True:
+        purged = await asyncio.to_thread(purge_batch, supabase)
+        total += purged
+        if purged < PURGE_BATCH_SIZE:
+            return total
+        await asyncio.sleep(PURGE_BATCH_PAUSE_SECONDS)
+
+
+async def run_purge_worker() -> None:
+    """Purge expired soft-deleted rows every PURGE_INTERVAL_SECONDS (runs until cancelled)"""
+    from core.database import get_supabase_client
+
+    while True:
+        try:
+            purged = await purge_deleted_rows(get_supabase_client())
+            if purged:
+                print(f"Purged {purged} soft-deleted rows")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Expired rows stay hidden; the next run retries
+            print(f"Warning: Purge of soft-deleted rows failed: {str(e)}")
+        await asyncio.sleep(PURGE_INTERVAL_SECONDS)
@@ -0,0 +1,145 @@
+"""
+Photo thumbnail generation
+Decoding and resizing run in a process pool so large uploads never hold the
+event loop or the GIL of the worker serving requests
+"""
+
+import asyncio
+import io
+import multiprocessing
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from core.config import IMAGE_POOL_WORKERS, THUMBNAIL_SIZES
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is needed for photo uploads only
+    Image = None
+
+
+# Formats accepted as originals, with the content type and extension they are stored under
+ORIGINAL_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+}
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+THUMBNAIL_TYPE = "image/webp"
+
+# Refuse images that would decode to more pixels than this (decompression bombs)
+MAX_IMAGE_PIXELS = 40_000_000
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload is not a supported image"""
+
+
+def sniff_image_format(data: bytes) -> str:
+    """
+    Identify a supported image format from its magic bytes (no decoding)
+
+    Raises:
+        InvalidImageError: If the data does not start like a supported image
+    """
+    if data[:3] == b"\xff\xd8\xff":
+        return "JPEG"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "PNG"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "WEBP"
+    raise InvalidImageError("Unsupported image format. Upload a JPEG, PNG, WebP or GIF image")
+
+
+def render_thumbnails(data: bytes, sizes: List[int]) -> Tuple[str, Dict[int, bytes]]:
+    """
+    Decode an image and render WebP thumbnails (runs in a pool process)
+
+    Args:
+        data: Original image bytes
+        sizes: Longest-edge sizes in pixels; images are never upscaled
+
+    Returns:
+        Tuple of (original format name, {size: webp bytes})
+
+    Raises:
+        InvalidImageError: If the data is not a supported image
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    try:
+        with warnings.catch_warnings():
+            # Pillow only warns between MAX_IMAGE_PIXELS and twice that; raise the
+            # warning so oversized headers are rejected before anything is decoded
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            image = Image.open(io.BytesIO(data))
+        with image:
+            image_format = image.format
+            if image_format not in ORIGINAL_TYPES:
+                raise InvalidImageError(f"Unsupported image format: {image_format}")
+            image.load()
+            # Apply camera rotation so thumbnails are upright
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+            thumbnails = {}
+            for size in sorted(set(sizes)):
+                thumbnail = image.copy()
+                thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, format="WEBP", quality=80, method=4)
+                thumbnails[size] = buffer.getvalue()
+            return image_format, thumbnails
+    except InvalidImageError:
+        raise
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise InvalidImageError("Image dimensions are too large")
+    except Exception as e:
+        raise InvalidImageError(f"Could not read image: {str(e)}")
+
+
+_image_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _image_executor
+    if _image_executor is None:
+        # Spawned, not forked: a fork would copy the serving worker's event loop,
+        # threads and open connections into every image process
+        _image_executor = ProcessPoolExecutor(
+            max_workers=IMAGE_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _image_executor
+
+
+def thumbnails_available() -> bool:
+    """Whether Pillow is installed"""
+    return Image is not None
+
+
+async def generate_thumbnails(data: bytes, sizes: List[int] = THUMBNAIL_SIZES) -> Tuple[str, Dict[int, bytes]]:
+    """
+    Render thumbnails on the image process pool
+
+    Raises:
+        InvalidImageError: If the data is not a supported image
+        RuntimeError: If Pillow is not installed
+    """
+    if Image is None:
+        raise RuntimeError("Photo processing is unavailable: install Pillow")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), render_thumbnails, data, list(sizes))
+
+
+def shutdown_image_pool() -> None:
+    """Stop the image processes (started lazily on the first upload)"""
+    global _image_executor
+    if _image_executor is not None:
+        _image_executor.shutdown(wait=True, cancel_futures=True)
+        _image_executor = None
@@ -0,0 +1,197 @@
+"""
+Layered genealogy layout
+Computes node coordinates for the family tree on the server so clients only
+draw: generations become layers (y), siblings are ordered by their parents'
+positions and spaced so nodes never overlap (x). Runs in O((V+E) log V)
+"""
+
+import hashlib
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+import orjson
+
+from core.config import SNAPSHOT_CACHE_SIZE
+from core.relationships import PARENT_KEYS, parent_edges
+
+
+# Number of alternating down/up ordering sweeps (barycenter heuristic)
+ORDERING_SWEEPS = 4
+
+# Minimum horizontal distance between two nodes of a layer, in node slots
+NODE_SPACING = 1.0
+
+
+def graph_fingerprint(members: List[dict]) -> str:
+    """Hash of everything the layout depends on (ids, names, parent links)"""
+    graph = sorted(
+        (
+            str(m.get("id")),
+            m.get("name") or "",
+            [str((m.get("relationships") or {}).get(key) or "") for key in PARENT_KEYS]
+            if isinstance(m.get("relationships"), dict) else [],
+        )
+        for m in members
+    )
+    return hashlib.sha1(orjson.dumps(graph)).hexdigest()
+
+
+def _assign_generations(parents: List[List[int]], children: List[List[int]]) -> List[int]:
+    """
+    Longest-path layering: a member sits one layer below its lowest parent
+
+    A member's generation is final once it is placed; edges back into placed
+    members (only possible on a cycle) are ignored, so every child still sits
+    below the generation its parent was placed at.
+    """
+    count = len(parents)
+    generation = [0] * count
+    pending = [len(p) for p in parents]
+    placed = [False] * count
+    queue = deque(node for node in range(count) if pending[node] == 0)
+    placed_count = 0
+
+    while True:
+        while queue:
+            node = queue.popleft()
+            placed[node] = True
+            placed_count += 1
+            for child in children[node]:
+                if placed[child]:
+                    continue
+                generation[child] = max(generation[child], generation[node] + 1)
+                pending[child] -= 1
+                if pending[child] == 0:
+                    queue.append(child)
+        if placed_count == count:
+            return generation
+        # Members on a cycle never reach zero pending parents; release the first
+        # one so the rest of the graph is still layered
+        node = next(n for n in range(count) if not placed[n])
+        pending[node] = 0
+        queue.append(node)
+
+
+def _barycenter(neighbours: List[int], position: Dict[int, float], fallback: float) -> float:
+    placed = [position[n] for n in neighbours if n in position]
+    return sum(placed) / len(placed) if placed else fallback
+
+
+def _order_layers(layers: List[List[int]], parents: List[List[int]], children: List[List[int]],
+                  names: List[str]) -> None:
+    """Reorder each layer in place to reduce edge crossings"""
+    for sweep in range(ORDERING_SWEEPS):
+        downward = sweep % 2 == 0
+        sequence = range(1, len(layers)) if downward else range(len(layers) - 2, -1, -1)
+        for depth in sequence:
+            reference = layers[depth - 1] if downward else layers[depth + 1]
+            position = {node: float(i) for i, node in enumerate(reference)}
+            current = {node: float(i) for i, node in enumerate(layers[depth])}
+            neighbours = parents if downward else children
+            layers[depth].sort(key=lambda n: (_barycenter(neighbours[n], position, current[n]), names[n]))
+
+
+def _place(layers: List[List[int]], parents: List[List[int]], children: List[List[int]]) -> Dict[int, float]:
+    """Assign x so children sit under their parents and parents over their children"""
+    x: Dict[int, float] = {}
+
+    # Downward: each node as close to its parents' centre as its left neighbour allows
+    for layer in layers:
+        previous = None
+        for node in layer:
+            target = _barycenter(parents[node], x, previous + NODE_SPACING if previous is not None else 0.0)
+            if previous is not None:
+                target = max(target, previous + NODE_SPACING)
+            x[node] = target
+            previous = target
+
+    # Upward: pull parents over their children where that keeps the spacing
+    for layer in reversed(layers[:-1]):
+        for i in range(len(layer) - 1, -1, -1):
+            node = layer[i]
+            if not children[node]:
+                continue
+            target = _barycenter(children[node], x, x[node])
+            lower = x[layer[i - 1]] + NODE_SPACING if i > 0 else float("-inf")
+            upper = x[layer[i + 1]] - NODE_SPACING if i + 1 < len(layer) else float("inf")
+            x[node] = min(max(target, lower), upper)
+
+    # Shift so the leftmost node is at 0
+    offset = min(x.values()) if x else 0.0
+    return {node: value - offset for node, value in x.items()}
+
+
+def compute_layout(members: List[dict]) -> dict:
+    """
+    Lay out a family tree
+
+    Args:
+        members: Members with id, name and relationships
+
+    Returns:
+        Compact layout: ids (node order), coords (flat [x0, y0, x1, y1, ...] with x in
+        node slots and y the generation), edges (flat [parent, child, ...] node
+        indices) and width/height in slots
+    """
+    parents = parent_edges(members)
+    children: List[List[int]] = [[] for _ in members]
+    for child, node_parents in enumerate(parents):
+        for parent in node_parents:
+            children[parent].append(child)
+    names = [(m.get("name") or "").lower() for m in members]
+
+    generation = _assign_generations(parents, children)
+    layers: List[List[int]] = [[] for _ in range(max(generation, default=-1) + 1)]
+    for node in sorted(range(len(members)), key=lambda n: names[n]):
+        layers[generation[node]].append(node)
+
+    _order_layers(layers, parents, children, names)
+    x = _place(layers, parents, children)
+
+    coords = []
+    for node in range(len(members)):
+        coords.append(round(x[node], 2))
+        coords.append(generation[node])
+    edges = []
+    for child, node_parents in enumerate(parents):
+        for parent in node_parents:
+            edges.append(parent)
+            edges.append(child)
+
+    return {
+        "ids": [str(m.get("id")) for m in members],
+        "coords": coords,
+        "edges": edges,
+        "width": round(max(x.values(), default=0.0) + NODE_SPACING, 2),
+        "height": len(layers)
+    }
+
+
+class LayoutCache:
+    """Bounded LRU of serialized layouts, one per family, validated by graph fingerprint"""
+
+    def __init__(self, max_entries: int = SNAPSHOT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[str, bytes]]" = OrderedDict()
+
+    def get(self, family_id: str, fingerprint: str) -> Optional[bytes]:
+        """Return the cached layout if the graph still has the given fingerprint"""
+        entry = self._entries.get(family_id)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        self._entries.move_to_end(family_id)
+        return entry[1]
+
+    def put(self, family_id: str, fingerprint: str, body: bytes) -> bytes:
+        """Store a serialized layout, evicting the least recently used family"""
+        self._entries[family_id] = (fingerprint, body)
+        self._entries.move_to_end(family_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return body
+
+
+# Serialized layouts keyed by family, so edits that don't touch the graph
+# (photos, custom fields) reuse the computed layout. Raw bytes only: the
+# compressed forms live in the response snapshot cache
+layout_cache = LayoutCache()
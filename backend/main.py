@@ -1,9 +1,51 @@
 import uvicorn
+from core.config import (
+    ENV,
+    HOST,
+    PORT,
+    WEB_CONCURRENCY,
+    KEEP_ALIVE_TIMEOUT,
+    BACKLOG,
+    GRACEFUL_SHUTDOWN_TIMEOUT,
+    SHARED_STATE,
+)
 
-if __name__ == "__main__":
+
+def run_production():
+    """Multi-worker server with uvloop and httptools"""
+    if WEB_CONCURRENCY > 1 and not SHARED_STATE:
+        # Rate limit buckets and live events would be split per worker
+        raise SystemExit(
+            f"WEB_CONCURRENCY={WEB_CONCURRENCY} needs RATE_LIMIT_BACKEND=redis and EVENT_BROKER_BACKEND=redis; "
+            "set both, or WEB_CONCURRENCY=1 for a single worker"
+        )
+    uvicorn.run(
+        "app:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        loop="uvloop",
+        http="httptools",
+        backlog=BACKLOG,
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        proxy_headers=True,
+        access_log=False,
+    )
+
+
+def run_development():
+    """Single process with auto-reload"""
     uvicorn.run(
         "app:app",
-        host="0.0.0.0",
-        port=8000,
+        host=HOST,
+        port=PORT,
         reload=True
     )
+
+
+if __name__ == "__main__":
+    if ENV == "production":
+        run_production()
+    else:
+        run_development()
@@ -1,16 +1,17 @@
 # Routers package
-from . import auth_router
+# auth_router (legacy) is imported by app.py only when ENABLE_LEGACY_AUTH is set
 from . import auth_new_router
 from . import user_router
 from . import family_router
 from . import family_member_router
 from . import health_router
+from . import photo_router
 
 __all__ = [
-    'auth_router',
     'auth_new_router',
     'user_router',
     'family_router',
     'family_member_router',
-    'health_router'
+    'health_router',
+    'photo_router'
 ]
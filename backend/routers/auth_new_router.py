@@ -6,23 +6,30 @@ New Authentication Router for the redesigned auth system:
 - Family Member login with family credentials
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends, Header
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Request
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 import jwt
+import uuid
 from datetime import datetime, timedelta
 from supabase import Client
 
 from core.database import get_supabase_client
-from core.config import SUPERADMIN_USERNAME, SUPERADMIN_PASSWORD, JWT_SECRET_KEY, JWT_ALGORITHM, JWT_EXPIRATION_HOURS
+from core.config import SUPERADMIN_USERNAME, SUPERADMIN_PASSWORD, SUPERADMIN_EMAIL, JWT_SECRET_KEY, JWT_ALGORITHM, JWT_EXPIRATION_HOURS
 from core.encryption import EncryptionService, PasswordHashingService
-from services.admin_onboarding_service import AdminOnboardingService
+from core.crypto_pool import run_crypto, CryptoPoolBusyError
+from core.rate_limit import login_rate_limiter
+from core.revocation import access_token_revocations
+from services.admin_onboarding_service import AdminOnboardingService, OnboardingConflictError
+from services.refresh_token_service import RefreshTokenService
 from schemas.user import (
     SuperAdminLoginRequest,
     AdminOnboardingRequest,
     AdminApprovalRequest,
     FamilyMemberLoginRequest,
     LoginRequest,
+    RefreshTokenRequest,
+    LogoutRequest,
     UserResponse,
 )
 
@@ -37,6 +44,7 @@ def create_access_token(user_id: str, email: str, role: str, family_id: Optional
         "email": email,
         "role": role,
         "family_id": family_id,
+        "jti": uuid.uuid4().hex,
         "exp": datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
     }
     token = jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
@@ -47,11 +55,23 @@ def verify_token(token: str) -> dict:
     """Verify and decode JWT token"""
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    
+    if payload.get("jti") and access_token_revocations.is_revoked(payload["jti"]):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
+
+
+def busy_response(error: CryptoPoolBusyError) -> HTTPException:
+    """429 for requests shed because the KDF pool is saturated"""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
 
 
 def get_auth_user(authorization: Optional[str] = Header(None)) -> dict:
@@ -72,7 +92,7 @@ def get_auth_user(authorization: Optional[str] = Header(None)) -> dict:
 # ==================== SUPERADMIN LOGIN ====================
 
 @router.post("/superadmin/login")
-async def superadmin_login(request: SuperAdminLoginRequest):
+async def superadmin_login(request: SuperAdminLoginRequest, http_request: Request):
     """
     SuperAdmin login with hardcoded credentials
     
@@ -91,6 +111,8 @@ async def superadmin_login(request: SuperAdminLoginRequest):
         }
     """
     try:
+        await login_rate_limiter.check(http_request, "superadmin", email=request.username)
+        
         # Verify hardcoded credentials
         if request.username != SUPERADMIN_USERNAME or request.password != SUPERADMIN_PASSWORD:
             raise HTTPException(
@@ -101,7 +123,7 @@ async def superadmin_login(request: SuperAdminLoginRequest):
         # Create SuperAdmin user data
         superadmin_data = {
             "user_id": "superadmin",
-            "email": "admin@apnaparivar.com",
+            "email": SUPERADMIN_EMAIL,
             "role": "super_admin",
             "family_id": None
         }
@@ -109,12 +131,18 @@ async def superadmin_login(request: SuperAdminLoginRequest):
         # Generate JWT token
         access_token = create_access_token(
             user_id="superadmin",
-            email="admin@apnaparivar.com",
+            email=SUPERADMIN_EMAIL,
+            role="super_admin"
+        )
+        refresh_token = RefreshTokenService(get_supabase_client()).issue(
+            subject_id="superadmin",
+            email=SUPERADMIN_EMAIL,
             role="super_admin"
         )
         
         return {
             "access_token": access_token,
+            "refresh_token": refresh_token,
             "token_type": "bearer",
             "user": superadmin_data,
             "message": "SuperAdmin login successful"
@@ -198,6 +226,13 @@ async def admin_register(request: AdminOnboardingRequest):
     
     except HTTPException:
         raise
+    except CryptoPoolBusyError as e:
+        raise busy_response(e)
+    except OnboardingConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -247,7 +282,7 @@ async def check_admin_status(request_id: str):
 # ==================== FAMILY ADMIN LOGIN ====================
 
 @router.post("/admin/login")
-async def admin_login(request: LoginRequest):
+async def admin_login(request: LoginRequest, http_request: Request):
     """
     Family admin login with email and password
     Only works if admin is approved
@@ -266,6 +301,8 @@ async def admin_login(request: LoginRequest):
         }
     """
     try:
+        await login_rate_limiter.check(http_request, "admin", email=request.email)
+        
         supabase = get_supabase_client()
         
         # Get user by email
@@ -294,12 +331,30 @@ async def admin_login(request: LoginRequest):
         
         # Verify password
         password_hash = user_data.get("password_hash")
-        if not PasswordHashingService.verify_password(request.password, password_hash):
+        if not await run_crypto(PasswordHashingService.verify_password, request.password, password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials"
             )
         
+        # A soft-deleted family stays deleted for its admin until the SuperAdmin restores it
+        family_id = user_data.get("family_id")
+        family_response = supabase.table("families").select("id").eq("id", family_id).is_("deleted_at", "null").execute() if family_id else None
+        if not family_response or not family_response.data:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="This family has been deleted"
+            )
+        
+        # Transparently upgrade hashes made with an older scheme or cost
+        if PasswordHashingService.needs_rehash(password_hash):
+            try:
+                new_hash = await run_crypto(PasswordHashingService.hash_password, request.password)
+                supabase.table("users").update({"password_hash": new_hash}).eq("id", user_data.get("id")).execute()
+            except Exception as rehash_error:
+                # Login still succeeds with the old hash
+                print(f"Warning: Failed to upgrade password hash for {request.email}: {str(rehash_error)}")
+        
         # Generate JWT token
         access_token = create_access_token(
             user_id=user_data.get("id"),
@@ -307,9 +362,16 @@ async def admin_login(request: LoginRequest):
             role=user_data.get("role"),
             family_id=user_data.get("family_id")
         )
+        refresh_token = RefreshTokenService(supabase).issue(
+            subject_id=user_data.get("id"),
+            email=user_data.get("email"),
+            role=user_data.get("role"),
+            family_id=user_data.get("family_id")
+        )
         
         return {
             "access_token": access_token,
+            "refresh_token": refresh_token,
             "token_type": "bearer",
             "user": user_data,
             "message": "Login successful"
@@ -317,6 +379,8 @@ async def admin_login(request: LoginRequest):
     
     except HTTPException:
         raise
+    except CryptoPoolBusyError as e:
+        raise busy_response(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -327,7 +391,7 @@ async def admin_login(request: LoginRequest):
 # ==================== FAMILY MEMBER LOGIN ====================
 
 @router.post("/member/login")
-async def family_member_login(request: FamilyMemberLoginRequest):
+async def family_member_login(request: FamilyMemberLoginRequest, http_request: Request):
     """
     Family member login with email + family name + family password
     
@@ -346,10 +410,12 @@ async def family_member_login(request: FamilyMemberLoginRequest):
         }
     """
     try:
+        await login_rate_limiter.check(http_request, "member", email=request.email, family_name=request.family_name)
+        
         supabase = get_supabase_client()
         
         # Get family by name
-        family_response = supabase.table("families").select("*").eq("family_name", request.family_name).execute()
+        family_response = supabase.table("families").select("*").eq("family_name", request.family_name).is_("deleted_at", "null").execute()
         
         if not family_response.data:
             raise HTTPException(
@@ -363,7 +429,7 @@ async def family_member_login(request: FamilyMemberLoginRequest):
         # Verify family password using hash
         family_password_hash = family_data.get("family_password_hash")
         if family_password_hash:
-            if not PasswordHashingService.verify_password(request.family_password, family_password_hash):
+            if not await run_crypto(PasswordHashingService.verify_password, request.family_password, family_password_hash):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid credentials or not a member of this family"
@@ -374,7 +440,7 @@ async def family_member_login(request: FamilyMemberLoginRequest):
             pass
         
         # Check if member exists in family_members table with this email
-        members_response = supabase.table("family_members").select("*").eq("family_id", family_id).execute()
+        members_response = supabase.table("family_members").select("*").eq("family_id", family_id).is_("deleted_at", "null").execute()
         
         if not members_response.data:
             raise HTTPException(
@@ -414,9 +480,16 @@ async def family_member_login(request: FamilyMemberLoginRequest):
             role="family_user",
             family_id=family_id
         )
+        refresh_token = RefreshTokenService(supabase).issue(
+            subject_id=member_data.get("id"),
+            email=member_email,
+            role="family_user",
+            family_id=family_id
+        )
         
         return {
             "access_token": access_token,
+            "refresh_token": refresh_token,
             "token_type": "bearer",
             "user": user_data,
             "message": "Login successful"
@@ -424,6 +497,8 @@ async def family_member_login(request: FamilyMemberLoginRequest):
     
     except HTTPException:
         raise
+    except CryptoPoolBusyError as e:
+        raise busy_response(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -697,10 +772,65 @@ async def verify_auth_token(authorization: Optional[str] = Header(None)):
         )
 
 
+@router.post("/refresh")
+async def refresh_session(request: RefreshTokenRequest):
+    """
+    Exchange a refresh token for a new access token and a new refresh token
+    The presented refresh token is revoked; presenting it again revokes the whole session
+    
+    Request:
+        {
+            "refresh_token": "opaque_token"
+        }
+    
+    Response:
+        {
+            "access_token": "jwt_token",
+            "refresh_token": "new_opaque_token",
+            "token_type": "bearer"
+        }
+    """
+    try:
+        service = RefreshTokenService(get_supabase_client())
+        claims, refresh_token = service.rotate(request.refresh_token)
+        
+        access_token = create_access_token(
+            user_id=claims.get("user_id"),
+            email=claims.get("email"),
+            role=claims.get("role"),
+            family_id=claims.get("family_id")
+        )
+        
+        return {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "token_type": "bearer"
+        }
+    
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Token refresh failed: {str(e)}"
+        )
+
+
 @router.post("/logout")
-async def logout(current_user: dict = Depends(get_auth_user)):
+async def logout(
+    request: Optional[LogoutRequest] = None,
+    current_user: dict = Depends(get_auth_user)
+):
     """
-    Logout user (client-side token deletion is also recommended)
+    Logout user: revokes the current access token and the given refresh token
+    
+    Request (optional):
+        {
+            "refresh_token": "opaque_token"
+        }
     
     Response:
         {
@@ -708,7 +838,20 @@ async def logout(current_user: dict = Depends(get_auth_user)):
             "status": "success"
         }
     """
-    return {
-        "message": "Logout successful",
-        "status": "success"
-    }
+    try:
+        if current_user.get("jti"):
+            access_token_revocations.revoke(current_user["jti"], current_user.get("exp", 0))
+        
+        if request and request.refresh_token:
+            RefreshTokenService(get_supabase_client()).revoke(request.refresh_token)
+        
+        return {
+            "message": "Logout successful",
+            "status": "success"
+        }
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Logout failed: {str(e)}"
+        )
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from typing import List, Optional
 from core.database import get_supabase_client
+from core.serialization import members_response
+from core.relationships import RelationshipValidationError
 from schemas.user import (
     FamilyMemberCreate, 
     FamilyMemberResponse, 
@@ -21,12 +23,16 @@ async def get_family_member_service():
 async def bulk_create_family_members(
     family_id: str,
     request: BulkFamilyMemberCreate,
+    response: Response,
+    dry_run: bool = Query(False),
     service: FamilyMemberService = Depends(get_family_member_service)
 ):
     """Create multiple family members in bulk (optimized for batch operations)
     
     This endpoint allows creating 20-30+ family members quickly with custom fields.
     All members can be added in a single request for maximum efficiency.
+    With dry_run=true nothing is inserted; the response lists relationship
+    problems and likely duplicates of existing members.
     """
     try:
         if not request.members:
@@ -38,14 +44,33 @@ async def bulk_create_family_members(
         # Convert to dict for service
         members_data = [m.model_dump() for m in request.members]
         
-        result = await service.create_bulk_family_members(family_id, members_data)
+        result = await service.create_bulk_family_members(family_id, members_data, dry_run=dry_run)
+        
+        if dry_run:
+            response.status_code = status.HTTP_200_OK
+            return BulkFamilyMemberResponse(
+                success=result.get("success", True),
+                created_count=0,
+                failed_count=0,
+                member_ids=[],
+                message=f"Dry run: {len(members_data)} members checked, nothing created",
+                diagnostics=result.get("diagnostics", []),
+                duplicates=result.get("duplicates", [])
+            )
         
         return BulkFamilyMemberResponse(
             success=result.get("success", True),
             created_count=result.get("created_count", 0),
             failed_count=result.get("failed_count", 0),
             member_ids=result.get("member_ids", []),
-            message=f"Successfully created {result.get('created_count', 0)} family members"
+            message=f"Successfully created {result.get('created_count', 0)} family members",
+            diagnostics=result.get("diagnostics", []),
+            duplicates=result.get("duplicates", [])
+        )
+    except RelationshipValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": str(e), "diagnostics": e.diagnostics}
         )
     except ValueError as e:
         raise HTTPException(
@@ -76,6 +101,8 @@ async def create_family_member(
         if not new_member:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create family member")
         return new_member
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -100,7 +127,7 @@ async def get_family_members(
     """Get all members in a family"""
     try:
         members = await service.get_family_members(family_id)
-        return members
+        return members_response(members)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -113,7 +140,7 @@ async def search_family_members(
     """Search family members by name"""
     try:
         members = await service.search_family_members(family_id, query)
-        return members
+        return members_response(members)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -133,6 +160,8 @@ async def update_family_member(
         return updated_member
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
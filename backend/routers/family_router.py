@@ -1,11 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Response, Query, Request, BackgroundTasks, UploadFile, File
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import asyncio
 from pydantic import BaseModel
 from core.database import get_supabase_client
-from core.encryption import EncryptionService, PasswordHashingService
-from schemas.user import FamilyCreate, FamilyResponse, FamilyMemberCreate, FamilyMemberResponse, FamilyMemberUpdate
+from core.encryption import EncryptionService, InvalidPasswordError
+from core.crypto_pool import run_crypto, CryptoPoolBusyError
+from core.rate_limit import login_rate_limiter
+from core.serialization import serialize_members, members_response
+from core.member_snapshot import FORMAT_JSON, MEDIA_TYPES, SNAPSHOT_FORMAT_VERSION, encode_member_snapshot, negotiate_member_format
+from core.etag import make_etag, etag_matches, not_modified, CACHE_CONTROL
+from core.events import FamilyEventBroker, event_broker
+from core.snapshot_cache import Snapshot, snapshot_cache, snapshot_response
+from schemas.user import (
+    FamilyCreate,
+    FamilyResponse,
+    FamilyMemberCreate,
+    FamilyMemberResponse,
+    FamilyMemberUpdate,
+    FamilyMemberChangesResponse,
+    LineageMemberResponse,
+    CommonAncestorResponse,
+    SubtreeMemberResponse,
+    DuplicatePairResponse,
+    CustomFieldDefinition,
+    CustomFieldResponse,
+    FamilyStatsResponse,
+    MemberPhotoResponse,
+    SignedPhotoUrlsResponse,
+    FamilyReportResponse,
+)
+from core.dedup import DEFAULT_MIN_SCORE
+from core.custom_fields import FILTER_PREFIX, parse_filters
 from services.family_service import FamilyService
-from services.family_member_service import FamilyMemberService
+from services.family_member_service import FamilyMemberService, LineageUnavailableError
+from services.custom_field_service import CustomFieldService
+from services.photo_service import PhotoService
+from core.thumbnails import InvalidImageError
+from core.config import PHOTO_MAX_BYTES
+from core.tree_layout import compute_layout, graph_fingerprint, layout_cache
+import orjson
 # Import get_auth_user directly - it's in a different router so no circular import
 from routers.auth_new_router import get_auth_user
 
@@ -21,6 +55,30 @@ async def get_family_member_service():
     supabase = get_supabase_client()
     return FamilyMemberService(supabase)
 
+async def get_custom_field_service():
+    """Dependency to get custom field service"""
+    supabase = get_supabase_client()
+    return CustomFieldService(supabase)
+
+def ensure_family_access(current_user: dict, family_id: str) -> None:
+    """Raise 403 unless the user may read this family's members (SuperAdmin never can)"""
+    user_role = current_user.get("role")
+    
+    # SuperAdmin cannot access family members
+    if user_role == "super_admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access Denied. SuperAdmin cannot access family details. Use the admin dashboard to manage admins."
+        )
+    
+    # Family Admin and Family User can only access their own family's members
+    if user_role in ["family_admin", "family_user"]:
+        if current_user.get("family_id") != family_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access Denied. You can only access your own family."
+            )
+
 @router.post("/", response_model=FamilyResponse, status_code=status.HTTP_201_CREATED)
 async def create_family(family: FamilyCreate, service: FamilyService = Depends(get_family_service)):
     """Create a new family (SuperAdmin only)"""
@@ -32,9 +90,36 @@ async def create_family(family: FamilyCreate, service: FamilyService = Depends(g
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+@router.get("/admin/report", response_model=FamilyReportResponse)
+async def get_family_report(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    search: Optional[str] = Query(None, max_length=100, description="Filter by family name"),
+    current_user: dict = Depends(get_auth_user),
+    service: FamilyService = Depends(get_family_service)
+):
+    """Paginated family report with admin email and member counts (SuperAdmin only)
+    
+    Reads only counts and admin details, never member data, so it stays within
+    what the SuperAdmin may see.
+    """
+    try:
+        if current_user.get("role") != "super_admin":
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only SuperAdmin can access this endpoint")
+        
+        return await service.get_family_report(limit=limit, cursor=cursor, search=search)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
 @router.get("/{family_id}", response_model=FamilyResponse)
 async def get_family(
     family_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_auth_user),
     service: FamilyService = Depends(get_family_service)
 ):
@@ -61,6 +146,13 @@ async def get_family(
         family = await service.get_family_by_id(family_id)
         if not family:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Family not found")
+        
+        etag = make_etag("family", family_id, family.get("updated_at"))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL
         return family
     except HTTPException:
         raise
@@ -124,12 +216,36 @@ async def update_family(family_id: str, update_data: dict, service: FamilyServic
 
 @router.delete("/{family_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_family(family_id: str, service: FamilyService = Depends(get_family_service)):
-    """Delete a family (SuperAdmin only)"""
+    """Delete a family (SuperAdmin only)
+    
+    The family is hidden immediately and can be restored until the background
+    purge removes it and its members (SOFT_DELETE_RETENTION_HOURS).
+    """
     try:
         await service.delete_family(family_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+@router.post("/{family_id}/restore", response_model=FamilyResponse)
+async def restore_family(
+    family_id: str,
+    current_user: dict = Depends(get_auth_user),
+    service: FamilyService = Depends(get_family_service)
+):
+    """Undo a family delete within the retention window (SuperAdmin only)"""
+    try:
+        if current_user.get("role") != "super_admin":
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the SuperAdmin can restore a family.")
+        
+        family = await service.restore_family(family_id)
+        if not family:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No deleted family to restore. It may already have been purged.")
+        return family
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
 # Nested member routes under families
 @router.post("/{family_id}/members", response_model=FamilyMemberResponse, status_code=status.HTTP_201_CREATED)
 async def create_family_member(
@@ -149,16 +265,31 @@ async def create_family_member(
         if not new_member:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create family member")
         return new_member
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.get("/{family_id}/members", response_model=List[FamilyMemberResponse])
 async def get_family_members(
     family_id: str,
+    request: Request,
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
     current_user: dict = Depends(get_auth_user),
-    member_service: FamilyMemberService = Depends(get_family_member_service)
+    service: FamilyService = Depends(get_family_service),
+    member_service: FamilyMemberService = Depends(get_family_member_service),
+    custom_field_service: CustomFieldService = Depends(get_custom_field_service)
 ):
-    """Get all members in a family - SuperAdmin cannot access this"""
+    """Get all members in a family - SuperAdmin cannot access this
+    
+    Custom field filters are evaluated by the database, e.g.
+    ?cf.birthplace=Pune&cf.birth_year>=1950 (also !=, <=, > and <)
+    
+    Large families can ask for the compact columnar snapshot with
+    Accept: application/vnd.apnaparivar.members+json (or +msgpack)
+    """
     try:
         user_role = current_user.get("role")
         
@@ -178,10 +309,67 @@ async def get_family_members(
                     detail="Access Denied. You can only access your own family."
                 )
         
-        members = await member_service.get_family_members(family_id)
-        return members
+        # Read the version before the members so a concurrent write can only
+        # make the ETag older than the body, never newer
+        version = await service.get_family_version(family_id)
+        if not version:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Family not found")
+        
+        member_format = negotiate_member_format(accept)
+        # Each representation has its own ETag; the plain JSON one is unchanged
+        representation = [] if member_format == FORMAT_JSON else [member_format, SNAPSHOT_FORMAT_VERSION]
+        headers = {"Cache-Control": CACHE_CONTROL, "Vary": "Accept"}
+        
+        def encode(members: List[dict]) -> bytes:
+            if member_format == FORMAT_JSON:
+                return serialize_members(members)
+            return encode_member_snapshot(family_id, members, member_format)
+        
+        filter_items = [(k, v) for k, v in request.query_params.multi_items() if k.startswith(FILTER_PREFIX)]
+        if filter_items:
+            field_types = await custom_field_service.get_field_types(family_id)
+            filters = parse_filters(filter_items, field_types)
+            etag = make_etag("members", family_id, version.get("member_version"), sorted(filters, key=str), *representation)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag, if_none_match)
+            members = await member_service.get_filtered_family_members(family_id, filters)
+            # Not cached, but compressed the same way so each coding gets its own ETag
+            snapshot = await asyncio.to_thread(Snapshot, etag, encode(members))
+            return snapshot_response(snapshot, accept_encoding, media_type=MEDIA_TYPES[member_format], headers=headers)
+        
+        etag = make_etag("members", family_id, version.get("member_version"), *representation)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, if_none_match)
+        
+        cache_key = f"members:{family_id}:{member_format}"
+        snapshot = snapshot_cache.get(cache_key, etag)
+        if snapshot is None:
+            members = await member_service.get_family_members(family_id)
+            snapshot = snapshot_cache.store(cache_key, await asyncio.to_thread(Snapshot, etag, encode(members)))
+        return snapshot_response(snapshot, accept_encoding, media_type=MEDIA_TYPES[member_format], headers=headers)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/{family_id}/members/changes", response_model=FamilyMemberChangesResponse)
+async def get_family_member_changes(
+    family_id: str,
+    since: int = Query(0, ge=0, description="Cursor from the previous sync (0 for a full sync)"),
+    current_user: dict = Depends(get_auth_user),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Get members changed or deleted since a sync cursor - SuperAdmin cannot access this"""
+    try:
+        ensure_family_access(current_user, family_id)
+        
+        return await member_service.get_family_member_changes(family_id, since)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -240,12 +428,14 @@ async def update_family_member(
         
         # Filter out None values
         data_dict = update_data.model_dump(exclude_unset=True)
-        updated_member = await member_service.update_family_member(member_id, data_dict)
+        updated_member = await member_service.update_family_member(member_id, data_dict, family_id=family_id)
         if not updated_member:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Family member not found")
         return updated_member
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -255,7 +445,10 @@ async def delete_family_member(
     member_id: str,
     member_service: FamilyMemberService = Depends(get_family_member_service)
 ):
-    """Delete a family member (Family Admin/Co-Admin only)"""
+    """Delete a family member (Family Admin/Co-Admin only)
+    
+    The member can be restored until the background purge removes it.
+    """
     try:
         # Verify the member belongs to the family
         member = await member_service.get_family_member_by_id(member_id)
@@ -268,6 +461,395 @@ async def delete_family_member(
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+@router.post("/{family_id}/members/{member_id}/restore", response_model=FamilyMemberResponse)
+async def restore_family_member(
+    family_id: str,
+    member_id: str,
+    current_user: dict = Depends(get_auth_user),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Undo a member delete within the retention window (Family Admin/Co-Admin only)"""
+    try:
+        ensure_family_admin(current_user, family_id)
+        
+        member = await member_service.restore_family_member(family_id, member_id)
+        if not member:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No deleted member to restore. It may already have been purged.")
+        return member
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+# Member photo upload (original + thumbnails, content addressed)
+@router.post("/{family_id}/members/{member_id}/photo", response_model=MemberPhotoResponse)
+async def upload_member_photo(
+    family_id: str,
+    member_id: str,
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_auth_user),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Upload a member photo; thumbnails are generated and served with long-lived cache headers (Family Admin only)"""
+    try:
+        ensure_family_admin(current_user, family_id)
+        
+        # Verify the member belongs to the family
+        member = await member_service.get_family_member_by_id(member_id)
+        if not member or member.get('family_id') != family_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Family member not found")
+        
+        # Read one byte past the limit so oversized uploads are rejected without buffering them whole
+        data = await file.read(PHOTO_MAX_BYTES + 1)
+        return await PhotoService(member_service).set_member_photo(family_id, member_id, data)
+    except HTTPException:
+        raise
+    except InvalidImageError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+# Batch photo URL signing (one call per tree render)
+@router.get("/{family_id}/photos/signed", response_model=SignedPhotoUrlsResponse)
+async def get_signed_photo_urls(
+    family_id: str,
+    size: int = Query(256),
+    member_ids: Optional[str] = Query(None, description="Comma-separated member ids; all members by default"),
+    current_user: dict = Depends(get_auth_user),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Get signed thumbnail URLs for the family's members in one request - SuperAdmin cannot access this"""
+    try:
+        ensure_family_access(current_user, family_id)
+        
+        ids = [m.strip() for m in member_ids.split(",") if m.strip()] if member_ids else None
+        return await PhotoService(member_service).sign_member_photos(family_id, size, ids)
+    except HTTPException:
+        raise
+    except InvalidImageError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+# Dashboard statistics (constant-time reads of trigger-maintained counters)
+@router.get("/{family_id}/stats", response_model=FamilyStatsResponse)
+async def get_family_stats(
+    family_id: str,
+    top: int = Query(20, ge=1, le=100),
+    recent: int = Query(5, ge=0, le=50),
+    current_user: dict = Depends(get_auth_user),
+    service: FamilyService = Depends(get_family_service)
+):
+    """Get member counts by generation and custom field value plus recent additions - SuperAdmin cannot access this"""
+    try:
+        ensure_family_access(current_user, family_id)
+        
+        return await service.get_family_stats(family_id, top=top, recent=recent)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+def ensure_family_admin(current_user: dict, family_id: str) -> None:
+    """Raise 403 unless the user administers this family"""
+    if current_user.get("role") not in ["family_admin", "family_co_admin"] or current_user.get("family_id") != family_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access Denied. Only the family admin can make this change."
+        )
+
+# Custom field schema
+@router.get("/{family_id}/custom-fields", response_model=List[CustomFieldResponse])
+async def get_custom_fields(
+    family_id: str,
+    current_user: dict = Depends(get_auth_user),
+    custom_field_service: CustomFieldService = Depends(get_custom_field_service)
+):
+    """Get the declared custom fields of a family - SuperAdmin cannot access this"""
+    try:
+        ensure_family_access(current_user, family_id)
+        
+        return await custom_field_service.get_fields(family_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.put("/{family_id}/custom-fields/{field_key}", response_model=CustomFieldResponse)
+async def put_custom_field(
+    family_id: str,
+    field_key: str,
+    definition: CustomFieldDefinition,
+    current_user: dict = Depends(get_auth_user),
+    custom_field_service: CustomFieldService = Depends(get_custom_field_service)
+):
+    """Declare or change a typed custom field (Family Admin only)
+    
+    Existing values are converted to the type. indexed marks the field for the
+    operator-built range-filter index (sql/custom_field_indexes.sql).
+    """
+    try:
+        ensure_family_admin(current_user, family_id)
+        
+        return await custom_field_service.upsert_field(
+            family_id,
+            field_key,
+            definition.field_type,
+            label=definition.label,
+            indexed=definition.indexed
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.delete("/{family_id}/custom-fields/{field_key}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_custom_field(
+    family_id: str,
+    field_key: str,
+    current_user: dict = Depends(get_auth_user),
+    custom_field_service: CustomFieldService = Depends(get_custom_field_service)
+):
+    """Remove a custom field declaration (Family Admin only); member values are kept"""
+    try:
+        ensure_family_admin(current_user, family_id)
+        
+        await custom_field_service.delete_field(family_id, field_key)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+# Likely duplicate members (blocked pairwise scoring)
+@router.get("/{family_id}/duplicates", response_model=List[DuplicatePairResponse])
+async def get_duplicate_members(
+    family_id: str,
+    min_score: float = Query(DEFAULT_MIN_SCORE, ge=0, le=1),
+    current_user: dict = Depends(get_auth_user),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Get pairs of members that are likely the same person - SuperAdmin cannot access this"""
+    try:
+        ensure_family_access(current_user, family_id)
+        
+        return await member_service.find_duplicates(family_id, min_score)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+# Lineage queries (served from the family_member_lineage closure table)
+def lineage_unavailable(error: LineageUnavailableError) -> HTTPException:
+    """404 while lineage is disabled, 409 while the closure is stale"""
+    if error.disabled:
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(error))
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(error))
+
+@router.get("/{family_id}/lineage/descendants/{member_id}", response_model=List[LineageMemberResponse])
+async def get_member_descendants(
+    family_id: str,
+    member_id: str,
+    max_depth: Optional[int] = Query(None, ge=1),
+    current_user: dict = Depends(get_auth_user),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Get all descendants of a member - SuperAdmin cannot access this"""
+    try:
+        ensure_family_access(current_user, family_id)
+        
+        # Verify the member belongs to the family
+        member = await member_service.get_family_member_by_id(member_id)
+        if not member or member.get('family_id') != family_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Family member not found")
+        
+        return await member_service.get_descendants(family_id, member_id, max_depth)
+    except HTTPException:
+        raise
+    except LineageUnavailableError as e:
+        raise lineage_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/{family_id}/lineage/common-ancestors", response_model=List[CommonAncestorResponse])
+async def get_common_ancestors(
+    family_id: str,
+    member_a: str = Query(...),
+    member_b: str = Query(...),
+    current_user: dict = Depends(get_auth_user),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Get the common ancestors of two members, closest first - SuperAdmin cannot access this"""
+    try:
+        ensure_family_access(current_user, family_id)
+        
+        # Verify both members belong to the family
+        for member_id in (member_a, member_b):
+            member = await member_service.get_family_member_by_id(member_id)
+            if not member or member.get('family_id') != family_id:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Family member not found")
+        
+        return await member_service.get_common_ancestors(family_id, member_a, member_b)
+    except HTTPException:
+        raise
+    except LineageUnavailableError as e:
+        raise lineage_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/{family_id}/lineage/generation/{generation}", response_model=List[FamilyMemberResponse])
+async def get_generation_members(
+    family_id: str,
+    generation: int,
+    current_user: dict = Depends(get_auth_user),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Get all members at a generation (0 = earliest known ancestors) - SuperAdmin cannot access this"""
+    try:
+        ensure_family_access(current_user, family_id)
+        
+        members = await member_service.get_members_at_generation(family_id, generation)
+        return members_response(members)
+    except HTTPException:
+        raise
+    except LineageUnavailableError as e:
+        raise lineage_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+# Tree branch fetch (one round-trip regardless of depth)
+@router.get("/{family_id}/members/{member_id}/subtree", response_model=List[SubtreeMemberResponse])
+async def get_member_subtree(
+    family_id: str,
+    member_id: str,
+    direction: str = Query("down", pattern="^(up|down)$"),
+    max_depth: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_auth_user),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Get the ancestors ("up") or descendants ("down") of a member - SuperAdmin cannot access this"""
+    try:
+        ensure_family_access(current_user, family_id)
+        
+        subtree = await member_service.get_subtree(family_id, member_id, direction, max_depth)
+        
+        # The root comes back at depth 0 unless it is not a member of this family
+        if not subtree:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Family member not found")
+        
+        return subtree
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+# Server-side tree layout (node coordinates cached per family version)
+@router.get("/{family_id}/tree/layout")
+async def get_tree_layout(
+    family_id: str,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    current_user: dict = Depends(get_auth_user),
+    service: FamilyService = Depends(get_family_service),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Get precomputed tree coordinates - SuperAdmin cannot access this
+    
+    Returns ids, coords (flat [x, y, ...] with x in node slots and y the
+    generation), edges (flat [parent, child, ...] indices into ids), width and height.
+    """
+    try:
+        ensure_family_access(current_user, family_id)
+        
+        version = await service.get_family_version(family_id)
+        if not version:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Family not found")
+        
+        etag = make_etag("layout", family_id, version.get("member_version"))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, if_none_match)
+        
+        cache_key = f"layout:{family_id}"
+        snapshot = snapshot_cache.get(cache_key, etag)
+        if snapshot is None:
+            # The version moved; only lay out again if the graph itself changed
+            graph = await member_service.get_tree_graph(family_id)
+            fingerprint = graph_fingerprint(graph)
+            body = layout_cache.get(family_id, fingerprint)
+            if body is None:
+                layout = await asyncio.to_thread(compute_layout, graph)
+                body = layout_cache.put(family_id, fingerprint, orjson.dumps(layout))
+            # Compression of a large layout would otherwise stall the event loop
+            snapshot = snapshot_cache.store(cache_key, await asyncio.to_thread(Snapshot, etag, body))
+        return snapshot_response(snapshot, accept_encoding, headers={"Cache-Control": CACHE_CONTROL})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+# Server-sent events stream of member changes
+EVENT_HEARTBEAT_SECONDS = 15
+
+@router.get("/{family_id}/events")
+async def stream_family_events(
+    family_id: str,
+    request: Request,
+    current_user: dict = Depends(get_auth_user),
+    member_service: FamilyMemberService = Depends(get_family_member_service)
+):
+    """Stream member_created / member_updated / member_deleted events for a family - SuperAdmin cannot access this
+    
+    A reconnecting client sends the last event id it saw (Last-Event-ID), and
+    the changes it missed are replayed before live events.
+    """
+    ensure_family_access(current_user, family_id)
+    
+    last_event_id = request.headers.get("last-event-id", "").strip()
+    # Subscribe before reading the replay so nothing committed in between is lost
+    queue = event_broker.subscribe(family_id)
+    replay = []
+    replayed_to = 0
+    if last_event_id.isdigit():
+        try:
+            missed = await member_service.get_family_member_events(family_id, int(last_event_id))
+        except ValueError as e:
+            event_broker.unsubscribe(family_id, queue)
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        except Exception as e:
+            event_broker.unsubscribe(family_id, queue)
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+        replay = [FamilyEventBroker.encode(*event) for event in missed["events"]]
+        replayed_to = missed["cursor"]
+    
+    async def event_stream():
+        try:
+            yield b"retry: 5000\n\n"
+            for message in replay:
+                yield message
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield b": keepalive\n\n"
+                    continue
+                # Queued while the replay was read and already covered by it
+                event_id = FamilyEventBroker.event_id(message)
+                if event_id is not None and event_id <= replayed_to:
+                    continue
+                yield message
+        finally:
+            event_broker.unsubscribe(family_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Endpoint for admin to retrieve family password
 class PasswordRequest(BaseModel):
     admin_password: str
@@ -276,6 +858,8 @@ class PasswordRequest(BaseModel):
 async def get_family_password(
     family_id: str,
     request: PasswordRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_auth_user),
     service: FamilyService = Depends(get_family_service)
 ):
@@ -288,28 +872,14 @@ async def get_family_password(
                 detail="Only family admin can retrieve family password"
             )
         
+        # Each attempt costs a key derivation and guesses the admin password, so limit it like a login
+        await login_rate_limiter.check(http_request, "family-password", email=current_user.get("email"), family_name=family_id)
+        
         # Get family data
         family = await service.get_family_by_id(family_id)
         if not family:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Family not found")
         
-        # Get admin user to verify password
-        supabase = get_supabase_client()
-        user_response = supabase.table("users").select("*").eq("id", current_user.get("user_id")).execute()
-        
-        if not user_response.data:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        
-        user_data = user_response.data[0]
-        
-        # Verify admin password
-        password_hash = user_data.get("password_hash")
-        if not PasswordHashingService.verify_password(request.admin_password, password_hash):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid admin password"
-            )
-        
         # Decrypt family password
         encrypted_family_password = family.get("family_password_encrypted")
         if not encrypted_family_password:
@@ -318,19 +888,40 @@ async def get_family_password(
                 detail="Family password not found"
             )
         
+        # The envelope verifies the admin password and unwraps in one key derivation
         try:
-            family_password = EncryptionService.decrypt(encrypted_family_password, request.admin_password)
-            return {
-                "family_password": family_password,
-                "message": "Family password retrieved successfully"
-            }
+            family_password = await run_crypto(EncryptionService.unwrap, encrypted_family_password, request.admin_password)
+        except CryptoPoolBusyError:
+            raise
+        except InvalidPasswordError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid admin password"
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to decrypt family password: {str(e)}"
             )
+        
+        # Migrate legacy ciphertexts to the envelope format after responding
+        if EncryptionService.is_legacy(encrypted_family_password):
+            background_tasks.add_task(
+                service.rewrap_family_password, family_id, family_password, request.admin_password
+            )
+        
+        return {
+            "family_password": family_password,
+            "message": "Family password retrieved successfully"
+        }
     
     except HTTPException:
         raise
+    except CryptoPoolBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -0,0 +1,52 @@
+import re
+import time
+from typing import Optional
+from fastapi import APIRouter, HTTPException, status, Query
+from fastapi.responses import FileResponse, RedirectResponse
+from core.config import PHOTO_STORAGE_PRIVATE
+from core.photo_storage import LocalPhotoStorage, get_photo_storage, verify_local_signature, IMMUTABLE_CACHE_CONTROL
+from core.thumbnails import ORIGINAL_TYPES, EXTENSIONS, THUMBNAIL_TYPE
+
+router = APIRouter(prefix="/api/photos", tags=["photos"])
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_FILE_RE = re.compile(r"^(original\.(jpg|png|webp|gif)|[0-9]{1,4}\.webp)$")
+
+_CONTENT_TYPES = {ext: ORIGINAL_TYPES[image_format] for image_format, ext in EXTENSIONS.items()}
+
+@router.get("/{content_hash}/{file_name}")
+async def get_photo(
+    content_hash: str,
+    file_name: str,
+    expires: Optional[int] = Query(None),
+    signature: Optional[str] = Query(None)
+):
+    """Serve a stored photo or thumbnail; objects are content addressed and cached forever
+    
+    With private photo storage the URL must carry a valid signature from the
+    batch signing endpoint, and caching is limited to the signature's lifetime.
+    Private Supabase objects are never served here: the endpoint hands out
+    the bucket's own signed URLs for them.
+    """
+    if not _HASH_RE.match(content_hash) or not _FILE_RE.match(file_name):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
+    
+    key = f"{content_hash}/{file_name}"
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{content_hash}-{file_name}"'}
+    if PHOTO_STORAGE_PRIVATE:
+        if not verify_local_signature(key, expires, signature):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired photo signature")
+        headers["Cache-Control"] = f"private, max-age={max(0, int(expires - time.time()))}, immutable"
+    storage = get_photo_storage()
+    
+    public_url = storage.public_url(key)
+    if public_url:
+        return RedirectResponse(public_url, status_code=status.HTTP_301_MOVED_PERMANENTLY, headers=headers)
+    
+    # Only local storage has files to send
+    if not isinstance(storage, LocalPhotoStorage) or not storage.exists(key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
+    
+    extension = file_name.rsplit(".", 1)[1]
+    media_type = THUMBNAIL_TYPE if not file_name.startswith("original") else _CONTENT_TYPES[extension]
+    return FileResponse(storage.path(key), media_type=media_type, headers=headers)
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, EmailStr
 
 # User Schemas
@@ -54,17 +54,143 @@ class FamilyMemberUpdate(BaseModel):
 class FamilyMemberResponse(FamilyMemberBase):
     id: str
     family_id: str
+    photo_hash: Optional[str] = None
     created_at: str
     updated_at: str
 
     class Config:
         from_attributes = True
 
+class FamilyMemberChangesResponse(BaseModel):
+    """Delta sync payload: members written and deleted since a cursor"""
+    cursor: int
+    changed: List[FamilyMemberResponse]
+    deleted: List[str]
+
+# Lineage Queries
+class LineageMemberResponse(BaseModel):
+    """Member returned by a lineage query with its distance from the queried member"""
+    id: str
+    name: str
+    photo_url: Optional[str] = None
+    depth: int
+
+class CommonAncestorResponse(BaseModel):
+    """Shared ancestor of two members with its distance from each"""
+    id: str
+    name: str
+    photo_url: Optional[str] = None
+    depth_from_a: int
+    depth_from_b: int
+
+class SubtreeMemberResponse(BaseModel):
+    """Member of a tree branch with its distance from the root and the member it was reached from"""
+    id: str
+    name: str
+    photo_url: Optional[str] = None
+    relationships: Optional[dict] = None
+    depth: int
+    linked_from: Optional[str] = None
+
+class MemberRef(BaseModel):
+    """Minimal member reference"""
+    id: str
+    name: str
+
+class DuplicatePairResponse(BaseModel):
+    """Two members that are likely the same person"""
+    member_a: MemberRef
+    member_b: MemberRef
+    score: float
+    reasons: List[str] = []
+
+class RecentMemberResponse(BaseModel):
+    """Recently added member"""
+    id: str
+    name: str
+    photo_url: Optional[str] = None
+    created_at: str
+
+class FamilyStatsResponse(BaseModel):
+    """Member statistics of a family"""
+    member_count: int
+    generations: Dict[str, int] = {}
+    custom_fields: Dict[str, Dict[str, int]] = {}
+    recent_members: List[RecentMemberResponse] = []
+
+class FamilyReportRow(BaseModel):
+    """One family in the SuperAdmin report"""
+    id: str
+    family_name: str
+    admin_user_id: Optional[str] = None
+    admin_email: Optional[str] = None
+    admin_name: Optional[str] = None
+    member_count: int = 0
+    created_at: Optional[str] = None
+
+class FamilyReportTotals(BaseModel):
+    """Platform-wide totals"""
+    family_count: int
+    member_count: int
+
+class FamilyReportResponse(BaseModel):
+    """Page of the SuperAdmin family report"""
+    families: List[FamilyReportRow]
+    next_cursor: Optional[str] = None
+    totals: Optional[FamilyReportTotals] = None
+
+class MemberPhotoResponse(BaseModel):
+    """Stored member photo with its thumbnail URLs keyed by size (signed for private storage)"""
+    member: FamilyMemberResponse
+    content_hash: str
+    photo_url: Optional[str] = None
+    thumbnails: Dict[str, Optional[str]]
+
+class SignedPhotoUrlsResponse(BaseModel):
+    """Signed thumbnail URLs keyed by member id"""
+    size: int
+    urls: Dict[str, str]
+    expires_at: int
+
+# Custom Field Schemas
+class CustomFieldDefinition(BaseModel):
+    """Type declaration for one custom_fields key"""
+    field_type: str = "text"
+    label: Optional[str] = None
+    indexed: bool = False
+
+class CustomFieldResponse(BaseModel):
+    """Declared custom field of a family"""
+    family_id: str
+    field_key: str
+    field_type: str
+    label: Optional[str] = None
+    indexed: bool = False
+    created_at: Optional[str] = None
+
 # Bulk Family Member Operations
 class BulkFamilyMemberCreate(BaseModel):
     """Schema for creating multiple family members at once"""
     members: List[FamilyMemberCreate]
 
+class RelationshipDiagnostic(BaseModel):
+    """Problem found in the relationships of one import row"""
+    row: int
+    field: Optional[str] = None
+    code: str
+    severity: str
+    message: str
+    value: Optional[str] = None
+
+class ImportDuplicate(BaseModel):
+    """Existing member or earlier import row that an import row likely duplicates"""
+    row: int
+    match_id: Optional[str] = None
+    match_row: Optional[int] = None
+    match_name: Optional[str] = None
+    score: float
+    reasons: List[str] = []
+
 class BulkFamilyMemberResponse(BaseModel):
     """Response for bulk family member creation"""
     success: bool
@@ -72,6 +198,8 @@ class BulkFamilyMemberResponse(BaseModel):
     failed_count: int
     member_ids: List[str]
     message: Optional[str] = None
+    diagnostics: List[RelationshipDiagnostic] = []
+    duplicates: List[ImportDuplicate] = []
     
 # Auth Schemas
 class LoginRequest(BaseModel):
@@ -84,6 +212,14 @@ class AuthResponse(BaseModel):
     token_type: str
     user: UserResponse
 
+class RefreshTokenRequest(BaseModel):
+    """Exchange a refresh token for a new access/refresh token pair"""
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    """Optional refresh token to revoke on logout"""
+    refresh_token: Optional[str] = None
+
 # SuperAdmin Login
 class SuperAdminLoginRequest(BaseModel):
     """SuperAdmin login with hardcoded credentials"""
@@ -3,10 +3,14 @@ from . import user_service
 from . import family_service
 from . import family_member_service
 from . import admin_onboarding_service
+from . import refresh_token_service
+from . import custom_field_service
 
 __all__ = [
     'user_service',
     'family_service',
     'family_member_service',
-    'admin_onboarding_service'
+    'admin_onboarding_service',
+    'refresh_token_service',
+    'custom_field_service'
 ]
@@ -5,17 +5,124 @@ Handles creation, approval, and rejection of family admin requests
 
 from typing import Optional, List
 from supabase import Client
+from postgrest.exceptions import APIError
 from datetime import datetime
 from core.encryption import EncryptionService, PasswordHashingService
+from core.crypto_pool import run_crypto, CryptoPoolBusyError
+import asyncio
 import uuid
 
 
+# Unique indexes behind the onboarding pre-check, and what a violation means
+_UNIQUE_CONFLICTS = {
+    "uq_admin_requests_pending_family_name": "A request for this family name is already pending approval",
+    "uq_admin_requests_pending_email": "Request already exists for this email",
+    "users_email_key": "User already exists. Please check your approval status or contact support.",
+}
+
+
+class OnboardingConflictError(Exception):
+    """Raised when a registration collides with an existing family, user or pending request"""
+
+
+def unique_conflict(error: Exception) -> Optional[OnboardingConflictError]:
+    """Map a unique violation (SQLSTATE 23505) from a concurrent registration to a conflict"""
+    if not isinstance(error, APIError) or error.code != "23505":
+        return None
+    text = f"{error.message} {error.details}"
+    for index, message in _UNIQUE_CONFLICTS.items():
+        if index in text:
+            return OnboardingConflictError(message)
+    return OnboardingConflictError("Conflicts with an existing family, user or pending request")
+
+
 class AdminOnboardingService:
     """Service for managing admin onboarding workflow"""
     
     def __init__(self, supabase: Client):
         self.supabase = supabase
     
+    def _create_auth_user(self, email: str, admin_password: str) -> tuple[str, bool]:
+        """
+        Create the Supabase Auth user for a new admin, or find the existing one
+        
+        Args:
+            email: Admin's email
+            admin_password: Admin's password
+        
+        Returns:
+            Tuple of (auth user ID, whether the user was created by this call)
+        """
+        try:
+            created = self.supabase.auth.admin.create_user({
+                "email": email,
+                "password": admin_password,
+                "email_confirm": True,
+            })
+            return created.user.id, True
+        except Exception as create_error:
+            error_str = str(create_error).lower()
+            # If email already exists in auth, try to find the user ID
+            if "already" in error_str and ("registered" in error_str or "exists" in error_str):
+                # Try to get the auth user by listing and searching
+                try:
+                    list_response = self.supabase.auth.admin.list_users()
+                    auth_user = None
+                    
+                    # Handle different response structures
+                    users_list = []
+                    if hasattr(list_response, "users"):
+                        users_list = list_response.users
+                    elif hasattr(list_response, "data"):
+                        if hasattr(list_response.data, "users"):
+                            users_list = list_response.data.users
+                        elif isinstance(list_response.data, list):
+                            users_list = list_response.data
+                    
+                    # Search for user by email
+                    for u in users_list:
+                        user_email = getattr(u, "email", None) or u.get("email") if isinstance(u, dict) else None
+                        if user_email == email:
+                            auth_user = u
+                            break
+                    
+                    if auth_user:
+                        # Extract user ID
+                        if hasattr(auth_user, "id"):
+                            user_id = auth_user.id
+                        elif isinstance(auth_user, dict):
+                            user_id = auth_user.get("id")
+                        else:
+                            raise ValueError(f"Could not extract user ID from auth user object")
+                    else:
+                        raise ValueError(
+                            f"Email {email} is already registered in authentication system, "
+                            "but we cannot retrieve the user ID. Please contact support."
+                        )
+                except Exception as list_error:
+                    raise ValueError(
+                        f"Email {email} is already registered. Cannot retrieve user ID: {str(list_error)}"
+                    )
+            else:
+                raise ValueError(f"Failed to create auth user: {str(create_error)}")
+        
+        return user_id, False
+    
+    def _delete_auth_user(self, user_id: str) -> None:
+        """Remove an auth user created for a registration that then failed"""
+        try:
+            self.supabase.auth.admin.delete_user(user_id)
+        except Exception as e:
+            # The email stays registered in auth; a retry reuses the existing user
+            print(f"Warning: Failed to remove auth user {user_id} after a failed registration: {str(e)}")
+    
+    def _delete_pending_user(self, user_id: str) -> None:
+        """Remove the pending users row of a registration that then failed"""
+        try:
+            self.supabase.table("users").delete().eq("id", user_id).eq("approval_status", "pending").execute()
+        except Exception as e:
+            print(f"Warning: Failed to remove pending user {user_id} after a failed registration: {str(e)}")
+    
     async def create_onboarding_request(
         self,
         email: str,
@@ -36,90 +143,61 @@ class AdminOnboardingService:
         
         Returns:
             Created request data
+        
+        Raises:
+            OnboardingConflictError: If the family name or email is taken or already pending
         """
+        # Validate family password (minimum requirements) before doing any work
+        if len(family_password) < 4:
+            raise Exception("Error creating onboarding request: Family password must be at least 4 characters long")
+        
+        # Start the independent key derivations on the crypto pool right away so
+        # they overlap with the database checks and the auth call below
+        # The admin password hash comes out of the same derivation as the envelope
+        wrap_task = asyncio.ensure_future(run_crypto(EncryptionService.wrap, family_password, admin_password))
+        
+        # Also hash the family password for verification during member login
+        # This allows us to verify without needing the admin password
+        family_hash_task = asyncio.ensure_future(run_crypto(PasswordHashingService.hash_password, family_password))
+        
+        auth_user_created = False
+        user_inserted = False
         try:
+            # Check family name, pending requests and existing users in one round-trip
+            conflicts = await asyncio.to_thread(
+                lambda: self.supabase.rpc(
+                    "check_onboarding_conflicts",
+                    {"p_family_name": family_name, "p_email": email}
+                ).execute()
+            )
+            conflict = conflicts.data[0] if conflicts.data else {}
+            
             # Check if family_name already exists
-            family_check = self.supabase.table("families").select("*").eq("family_name", family_name).execute()
-            if family_check.data:
-                raise ValueError("Family name already exists")
+            if conflict.get("family_name_taken"):
+                raise OnboardingConflictError("Family name already exists or is pending approval")
             
             # Check if email is already requested or registered
-            email_check = self.supabase.table("admin_onboarding_requests").select("*").eq("email", email).eq("status", "pending").execute()
-            if email_check.data:
-                raise ValueError("Request already exists for this email")
-            
-            # Note: We don't check if email exists in auth or users table here
-            # because the user might be trying to register with an existing auth email
-            # This will be handled during approval
-            
-            # Validate family password (minimum requirements)
-            if len(family_password) < 4:
-                raise ValueError("Family password must be at least 4 characters long")
+            if conflict.get("pending_request_exists"):
+                raise OnboardingConflictError("Request already exists for this email")
             
-            # Encrypt family password using admin password as key
-            encrypted_family_password = EncryptionService.encrypt(family_password, admin_password)
+            # Check if user already exists (in case of duplicate registration attempt)
+            # users.id mirrors auth.users.id, so a users row for this email means
+            # the auth user below would resolve to it
+            if conflict.get("existing_user_id"):
+                raise OnboardingConflictError("User already exists. Please check your approval status or contact support.")
             
-            # Also hash the family password for verification during member login
-            # This allows us to verify without needing the admin password
-            family_password_hash = PasswordHashingService.hash_password(family_password)
+            # Note: An email that exists in auth but not in the users table is allowed;
+            # the existing auth user is reused below
             
-            # Hash the admin password for storage
-            password_hash = PasswordHashingService.hash_password(admin_password)
+            # Wait for the derivations before creating anything, so a shed (busy)
+            # or failed derivation cannot leave an orphaned auth user behind
+            (encrypted_family_password, password_hash), family_password_hash = await asyncio.gather(
+                wrap_task, family_hash_task
+            )
             
             # Create the Supabase Auth user immediately (not waiting for approval)
             # This way the user exists in auth.users and we can create them in users table
-            try:
-                created = self.supabase.auth.admin.create_user({
-                    "email": email,
-                    "password": admin_password,
-                    "email_confirm": True,
-                })
-                user_id = created.user.id
-            except Exception as create_error:
-                error_str = str(create_error).lower()
-                # If email already exists in auth, try to find the user ID
-                if "already" in error_str and ("registered" in error_str or "exists" in error_str):
-                    # Try to get the auth user by listing and searching
-                    try:
-                        list_response = self.supabase.auth.admin.list_users()
-                        auth_user = None
-                        
-                        # Handle different response structures
-                        users_list = []
-                        if hasattr(list_response, "users"):
-                            users_list = list_response.users
-                        elif hasattr(list_response, "data"):
-                            if hasattr(list_response.data, "users"):
-                                users_list = list_response.data.users
-                            elif isinstance(list_response.data, list):
-                                users_list = list_response.data
-                        
-                        # Search for user by email
-                        for u in users_list:
-                            user_email = getattr(u, "email", None) or u.get("email") if isinstance(u, dict) else None
-                            if user_email == email:
-                                auth_user = u
-                                break
-                        
-                        if auth_user:
-                            # Extract user ID
-                            if hasattr(auth_user, "id"):
-                                user_id = auth_user.id
-                            elif isinstance(auth_user, dict):
-                                user_id = auth_user.get("id")
-                            else:
-                                raise ValueError(f"Could not extract user ID from auth user object")
-                        else:
-                            raise ValueError(
-                                f"Email {email} is already registered in authentication system, "
-                                "but we cannot retrieve the user ID. Please contact support."
-                            )
-                    except Exception as list_error:
-                        raise ValueError(
-                            f"Email {email} is already registered. Cannot retrieve user ID: {str(list_error)}"
-                        )
-                else:
-                    raise ValueError(f"Failed to create auth user: {str(create_error)}")
+            user_id, auth_user_created = await asyncio.to_thread(self._create_auth_user, email, admin_password)
             
             # Create user record in users table with pending status
             # This way the user exists from registration, not just after approval
@@ -133,15 +211,11 @@ class AdminOnboardingService:
                 "family_id": None  # Will be set after approval
             }
             
-            # Check if user already exists (in case of duplicate registration attempt)
-            existing_user = self.supabase.table("users").select("*").eq("id", user_id).execute()
-            if existing_user.data:
-                raise ValueError("User already exists. Please check your approval status or contact support.")
-            
             user_response = self.supabase.table("users").insert(user_data).execute()
             
             if not user_response.data:
                 raise Exception("Failed to create user record")
+            user_inserted = True
             
             # Create the onboarding request
             request_data = {
@@ -166,6 +240,21 @@ class AdminOnboardingService:
                 raise Exception("Failed to create request")
         
         except Exception as e:
+            # Results of in-flight derivations are no longer needed
+            wrap_task.cancel()
+            family_hash_task.cancel()
+            if auth_user_created:
+                # Cascades to the users row
+                await asyncio.to_thread(self._delete_auth_user, user_id)
+            elif user_inserted:
+                # The auth user was reused, so only the users row is ours to remove
+                await asyncio.to_thread(self._delete_pending_user, user_id)
+            if isinstance(e, (CryptoPoolBusyError, OnboardingConflictError)):
+                raise
+            # A concurrent registration won the race past the pre-check
+            conflict_error = unique_conflict(e)
+            if conflict_error is not None:
+                raise conflict_error
             raise Exception(f"Error creating onboarding request: {str(e)}")
     
     async def get_pending_requests(self) -> List[dict]:
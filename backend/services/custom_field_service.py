@@ -0,0 +1,89 @@
+"""
+Service for the per-family custom field schema
+"""
+
+from typing import Dict, List, Optional
+from supabase import Client
+
+from core.custom_fields import FIELD_TYPES, MAX_CUSTOM_FIELDS, validate_field_key
+
+
+class CustomFieldService:
+    """Service for declaring typed custom fields"""
+
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    async def get_fields(self, family_id: str) -> List[dict]:
+        """Get the declared custom fields of a family"""
+        try:
+            response = self.supabase.table("family_custom_fields").select("*").eq("family_id", family_id).order("field_key").execute()
+            return response.data if response.data else []
+        except Exception as e:
+            raise Exception(f"Error fetching custom fields: {str(e)}")
+
+    async def get_field_types(self, family_id: str) -> Dict[str, str]:
+        """Get a field_key -> field_type map for coercion and filtering"""
+        try:
+            response = self.supabase.table("family_custom_fields").select("field_key, field_type").eq("family_id", family_id).execute()
+            return {f["field_key"]: f["field_type"] for f in (response.data or [])}
+        except Exception as e:
+            raise Exception(f"Error fetching custom field types: {str(e)}")
+
+    async def upsert_field(self, family_id: str, field_key: str, field_type: str,
+                           label: Optional[str] = None, indexed: bool = False) -> dict:
+        """
+        Declare or change a custom field
+
+        Existing string values of the family are converted to the declared type.
+        indexed only records the request for a range-filter index; the index itself
+        is built by an operator (sql/custom_field_indexes.sql), never per request.
+
+        Args:
+            family_id: Family the field belongs to
+            field_key: Key in family_members.custom_fields
+            field_type: One of text, number, date, boolean
+            label: Display label
+            indexed: Ask for an expression index for range filters
+
+        Returns:
+            The stored field declaration
+        """
+        try:
+            validate_field_key(field_key)
+            if field_type not in FIELD_TYPES:
+                raise ValueError(f"Invalid field type '{field_type}'. Use one of: {', '.join(FIELD_TYPES)}")
+
+            existing = await self.get_fields(family_id)
+            if field_key not in {f["field_key"] for f in existing} and len(existing) >= MAX_CUSTOM_FIELDS:
+                raise ValueError(f"A family can declare at most {MAX_CUSTOM_FIELDS} custom fields")
+
+            response = self.supabase.table("family_custom_fields").upsert({
+                "family_id": family_id,
+                "field_key": field_key,
+                "field_type": field_type,
+                "label": label,
+                "indexed": indexed
+            }).execute()
+            if not response.data:
+                raise Exception("Failed to save custom field")
+
+            self.supabase.rpc("apply_custom_field", {
+                "p_family_id": family_id,
+                "p_field_key": field_key,
+                "p_field_type": field_type
+            }).execute()
+
+            return response.data[0]
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error saving custom field: {str(e)}")
+
+    async def delete_field(self, family_id: str, field_key: str) -> bool:
+        """Remove a field declaration (member values are kept as free-form data)"""
+        try:
+            self.supabase.table("family_custom_fields").delete().eq("family_id", family_id).eq("field_key", field_key).execute()
+            return True
+        except Exception as e:
+            raise Exception(f"Error deleting custom field: {str(e)}")
@@ -1,5 +1,26 @@
 from typing import Optional, List
 from supabase import Client
+from core.events import event_broker
+from core.config import LINEAGE_ENABLED
+from core.relationships import validate_relationships, has_errors, RelationshipValidationError
+from core.dedup import find_import_duplicates, find_family_duplicates, DEFAULT_MIN_SCORE
+from core.custom_fields import coerce_custom_fields, apply_filters
+from core.soft_delete import deleted_now, RETENTION_SECONDS
+from schemas.user import FamilyMemberResponse
+
+# Columns returned to API clients (matches FamilyMemberResponse)
+MEMBER_COLUMNS = "id, family_id, name, photo_url, photo_hash, relationships, custom_fields, created_at, updated_at"
+
+def member_event_data(member: dict) -> dict:
+    """Change event payload of a member row: the API fields only, never internal columns"""
+    return FamilyMemberResponse.model_validate(member).model_dump()
+
+class LineageUnavailableError(Exception):
+    """Raised when lineage queries cannot be answered (disabled, or the closure is stale)"""
+    
+    def __init__(self, message: str, disabled: bool = False):
+        super().__init__(message)
+        self.disabled = disabled
 
 class FamilyMemberService:
     """Service for family member management"""
@@ -7,16 +28,64 @@ class FamilyMemberService:
     def __init__(self, supabase: Client):
         self.supabase = supabase
     
-    async def create_bulk_family_members(self, family_id: str, members_data: List[dict]) -> dict:
+    def _refresh_lineage(self, family_id: str) -> None:
+        """
+        Rebuild the lineage closure of a family after its relationship graph changed
+        
+        The member write is already committed, so a failed rebuild does not fail
+        the request: the family is marked stale and lineage queries rebuild it
+        (or answer 409) until a rebuild succeeds.
+        """
+        if not LINEAGE_ENABLED or not family_id:
+            return
+        try:
+            self.supabase.rpc("rebuild_family_lineage", {"p_family_id": family_id}).execute()
+        except Exception as e:
+            print(f"Warning: Failed to rebuild lineage for family {family_id}: {str(e)}")
+            try:
+                self.supabase.table("families").update({"lineage_stale_at": deleted_now()}).eq("id", family_id).execute()
+            except Exception as mark_error:
+                print(f"Warning: Failed to mark lineage stale for family {family_id}: {str(mark_error)}")
+    
+    def _ensure_lineage(self, family_id: str) -> None:
+        """
+        Make sure lineage queries for a family can be answered
+        
+        Raises:
+            LineageUnavailableError: If lineage is disabled, or the closure is stale
+                and rebuilding it failed again
+        """
+        if not LINEAGE_ENABLED:
+            raise LineageUnavailableError("Lineage queries are disabled", disabled=True)
+        family = self.supabase.table("families").select("lineage_stale_at").eq("id", family_id).execute()
+        if family.data and family.data[0].get("lineage_stale_at"):
+            try:
+                # Clears lineage_stale_at on success
+                self.supabase.rpc("rebuild_family_lineage", {"p_family_id": family_id}).execute()
+            except Exception as e:
+                print(f"Warning: Failed to rebuild stale lineage for family {family_id}: {str(e)}")
+                raise LineageUnavailableError("Lineage is being rebuilt, please retry shortly")
+    
+    def _custom_field_types(self, family_id: str) -> dict:
+        """Declared custom field types of a family (field_key -> field_type)"""
+        response = self.supabase.table("family_custom_fields").select("field_key, field_type").eq("family_id", family_id).execute()
+        return {f["field_key"]: f["field_type"] for f in (response.data or [])}
+    
+    async def create_bulk_family_members(self, family_id: str, members_data: List[dict], dry_run: bool = False) -> dict:
         """Create multiple family members in bulk (optimized for batch operations)
         
         Args:
             family_id: The family ID to add members to
             members_data: List of member dictionaries with keys: name, photo_url (optional),
                          relationships (optional), custom_fields (optional)
+            dry_run: Only validate and look for duplicates; nothing is inserted
         
         Returns:
-            Dictionary with success count, failed count, and created member IDs
+            Dictionary with success count, failed count, created member IDs,
+            relationship diagnostics and likely duplicates
+        
+        Raises:
+            RelationshipValidationError: If any row has relationship errors (nothing is inserted)
         """
         try:
             if not members_data:
@@ -26,19 +95,45 @@ class FamilyMemberService:
                 raise ValueError("Cannot create more than 100 members in a single request. Please split into multiple requests.")
             
             # Validate and prepare data
+            field_types = self._custom_field_types(family_id)
             prepared_members = []
             for idx, member in enumerate(members_data):
                 if not member.get('name') or not str(member.get('name')).strip():
                     raise ValueError(f"Member {idx + 1}: Name is required")
                 
+                try:
+                    custom_fields = coerce_custom_fields(member.get('custom_fields', {}), field_types)
+                except ValueError as e:
+                    raise ValueError(f"Member {idx + 1}: {str(e)}")
+                
                 prepared_members.append({
                     "family_id": family_id,
                     "name": str(member.get('name', '')).strip(),
                     "photo_url": member.get('photo_url') or None,
                     "relationships": member.get('relationships', {}),
-                    "custom_fields": member.get('custom_fields', {})
+                    "custom_fields": custom_fields
                 })
             
+            # Check the relationship graph and duplicates of the batch plus the existing family in one pass
+            existing = self.supabase.table("family_members").select("id, name, relationships, custom_fields").eq("family_id", family_id).is_("deleted_at", "null").execute()
+            existing_members = existing.data or []
+            diagnostics = validate_relationships(prepared_members, existing_members)
+            duplicates = find_import_duplicates(prepared_members, existing_members)
+            
+            if dry_run:
+                return {
+                    "success": not has_errors(diagnostics),
+                    "created_count": 0,
+                    "failed_count": 0,
+                    "member_ids": [],
+                    "members": [],
+                    "diagnostics": diagnostics,
+                    "duplicates": duplicates
+                }
+            
+            if has_errors(diagnostics):
+                raise RelationshipValidationError(diagnostics)
+            
             # Insert all members in bulk
             response = self.supabase.table("family_members").insert(prepared_members).execute()
             
@@ -46,13 +141,21 @@ class FamilyMemberService:
                 raise Exception("Failed to create family members")
             
             created_members = response.data
+            for created in created_members:
+                event_broker.publish(family_id, "member_created", member_event_data(created), created.get("row_version"))
+            self._refresh_lineage(family_id)
+            
             return {
                 "success": True,
                 "created_count": len(created_members),
                 "failed_count": 0,
                 "member_ids": [m.get("id") for m in created_members],
-                "members": created_members
+                "members": created_members,
+                "diagnostics": diagnostics,
+                "duplicates": duplicates
             }
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error creating bulk family members: {str(e)}")
     
@@ -60,6 +163,9 @@ class FamilyMemberService:
                                    relationships: dict = {}, custom_fields: dict = {}) -> dict:
         """Create a new family member"""
         try:
+            if custom_fields:
+                custom_fields = coerce_custom_fields(custom_fields, self._custom_field_types(family_id))
+            
             # Create family member record
             data = {
                 "family_id": family_id,
@@ -74,14 +180,19 @@ class FamilyMemberService:
             if not member:
                 raise Exception("Failed to create family member")
             
+            event_broker.publish(family_id, "member_created", member_event_data(member), member.get("row_version"))
+            # New members can be referenced by name from existing relationships
+            self._refresh_lineage(family_id)
             return member
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error creating family member: {str(e)}")
     
     async def get_family_member_by_id(self, member_id: str) -> dict:
         """Get family member by ID"""
         try:
-            response = self.supabase.table("family_members").select("*").eq("id", member_id).execute()
+            response = self.supabase.table("family_members").select("*").eq("id", member_id).is_("deleted_at", "null").execute()
             return response.data[0] if response.data else None
         except Exception as e:
             raise Exception(f"Error fetching family member: {str(e)}")
@@ -89,31 +200,247 @@ class FamilyMemberService:
     async def get_family_members(self, family_id: str) -> List[dict]:
         """Get all members in a family"""
         try:
-            response = self.supabase.table("family_members").select("*").eq("family_id", family_id).execute()
+            response = self.supabase.table("family_members").select(MEMBER_COLUMNS).eq("family_id", family_id).is_("deleted_at", "null").execute()
             return response.data if response.data else []
         except Exception as e:
             raise Exception(f"Error fetching family members: {str(e)}")
     
+    async def get_filtered_family_members(self, family_id: str, filters: list) -> List[dict]:
+        """Get family members matching custom field filters (evaluated by the database)
+        
+        Args:
+            family_id: The family ID
+            filters: Parsed predicates from core.custom_fields.parse_filters
+        """
+        try:
+            query = self.supabase.table("family_members").select(MEMBER_COLUMNS).eq("family_id", family_id).is_("deleted_at", "null")
+            response = apply_filters(query, filters).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            raise Exception(f"Error fetching family members: {str(e)}")
+    
+    async def get_tree_graph(self, family_id: str) -> List[dict]:
+        """Get the columns the tree layout depends on, in a stable order"""
+        try:
+            response = self.supabase.table("family_members").select("id, name, relationships").eq("family_id", family_id).is_("deleted_at", "null").order("id").execute()
+            return response.data if response.data else []
+        except Exception as e:
+            raise Exception(f"Error fetching family tree: {str(e)}")
+    
+    async def get_member_photo_hashes(self, family_id: str, member_ids: Optional[List[str]] = None) -> List[dict]:
+        """Get id and photo_hash of the family's members that have an uploaded photo"""
+        try:
+            query = self.supabase.table("family_members").select("id, photo_hash").eq("family_id", family_id).is_("deleted_at", "null").not_.is_("photo_hash", "null")
+            if member_ids:
+                query = query.in_("id", member_ids)
+            response = query.execute()
+            return response.data if response.data else []
+        except Exception as e:
+            raise Exception(f"Error fetching member photos: {str(e)}")
+    
+    def _changes_since(self, family_id: str, since: int) -> tuple:
+        """Sync cursor, changed member rows and tombstones after the given cursor
+        
+        Raises:
+            ValueError: If the family does not exist
+        """
+        version = self.supabase.table("families").select("member_version").eq("id", family_id).is_("deleted_at", "null").execute()
+        if not version.data:
+            raise ValueError("Family not found")
+        # Versions are assigned in commit order under the families row lock, so every
+        # write up to this version is already committed. Writes above it are left for
+        # the next call: advancing past them could skip a write that commits between
+        # the two queries below.
+        cursor = version.data[0].get("member_version", 0)
+        
+        changed = self.supabase.table("family_members").select(f"{MEMBER_COLUMNS}, row_version").eq("family_id", family_id).is_("deleted_at", "null").gt("row_version", since).lte("row_version", cursor).order("row_version").execute()
+        
+        # A full sync has nothing to delete on the client
+        tombstones = []
+        if since > 0:
+            deleted = self.supabase.table("family_member_tombstones").select("member_id, row_version").eq("family_id", family_id).gt("row_version", since).lte("row_version", cursor).execute()
+            tombstones = deleted.data or []
+        
+        return cursor, changed.data or [], tombstones
+    
+    async def get_family_member_changes(self, family_id: str, since: int) -> dict:
+        """Get members written and deleted after the given sync cursor
+        
+        Args:
+            family_id: The family ID
+            since: Cursor returned by a previous call (0 for a full sync)
+        
+        Returns:
+            Dictionary with the new cursor, changed members and deleted member IDs
+            (soft deletes are tombstoned like hard deletes)
+        """
+        try:
+            cursor, changed, tombstones = self._changes_since(family_id, since)
+            return {
+                "cursor": cursor,
+                "changed": changed,
+                "deleted": [t.get("member_id") for t in tombstones]
+            }
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error fetching family member changes: {str(e)}")
+    
+    async def get_family_member_events(self, family_id: str, since: int) -> dict:
+        """Get the change events after a sync cursor, for a reconnecting event stream
+        
+        Args:
+            family_id: The family ID
+            since: Last event id the client received (a row_version)
+        
+        Returns:
+            Dictionary with the new cursor and (event_type, data, row_version)
+            tuples in commit order; writes are replayed as member_updated
+        """
+        try:
+            cursor, changed, tombstones = self._changes_since(family_id, since)
+            events = [("member_updated", member_event_data(m), m.get("row_version")) for m in changed]
+            events += [
+                ("member_deleted", {"id": t.get("member_id"), "row_version": t.get("row_version")}, t.get("row_version"))
+                for t in tombstones
+            ]
+            events.sort(key=lambda event: event[2])
+            return {"cursor": cursor, "events": events}
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error fetching family member events: {str(e)}")
+    
+    async def find_duplicates(self, family_id: str, min_score: float = DEFAULT_MIN_SCORE) -> List[dict]:
+        """Find pairs of members that are likely the same person"""
+        try:
+            response = self.supabase.table("family_members").select("id, name, relationships, custom_fields").eq("family_id", family_id).is_("deleted_at", "null").execute()
+            return find_family_duplicates(response.data or [], min_score)
+        except Exception as e:
+            raise Exception(f"Error finding duplicate members: {str(e)}")
+    
+    async def get_descendants(self, family_id: str, member_id: str, max_depth: Optional[int] = None) -> List[dict]:
+        """Get all descendants of a member from the lineage closure
+        
+        Raises:
+            LineageUnavailableError: If lineage is disabled or stale
+        """
+        self._ensure_lineage(family_id)
+        try:
+            response = self.supabase.rpc("lineage_descendants", {"p_member_id": member_id, "p_max_depth": max_depth}).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            raise Exception(f"Error fetching descendants: {str(e)}")
+    
+    async def get_common_ancestors(self, family_id: str, member_a: str, member_b: str) -> List[dict]:
+        """Get the ancestors shared by two members, closest first
+        
+        Raises:
+            LineageUnavailableError: If lineage is disabled or stale
+        """
+        self._ensure_lineage(family_id)
+        try:
+            response = self.supabase.rpc("lineage_common_ancestors", {"p_member_a": member_a, "p_member_b": member_b}).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            raise Exception(f"Error fetching common ancestors: {str(e)}")
+    
+    async def get_subtree(self, family_id: str, member_id: str, direction: str = "down", max_depth: int = 10) -> List[dict]:
+        """Get the branch rooted at a member (ancestors for "up", descendants for "down") in one call"""
+        try:
+            response = self.supabase.rpc(
+                "family_member_subtree",
+                {"p_family_id": family_id, "p_root_id": member_id, "p_direction": direction, "p_max_depth": max_depth}
+            ).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            raise Exception(f"Error fetching subtree: {str(e)}")
+    
+    async def get_members_at_generation(self, family_id: str, generation: int) -> List[dict]:
+        """Get all members of a family at a generation (0 = roots)
+        
+        Raises:
+            LineageUnavailableError: If lineage is disabled or stale
+        """
+        self._ensure_lineage(family_id)
+        try:
+            response = self.supabase.table("family_members").select(MEMBER_COLUMNS).eq("family_id", family_id).eq("generation", generation).is_("deleted_at", "null").execute()
+            return response.data if response.data else []
+        except Exception as e:
+            raise Exception(f"Error fetching generation members: {str(e)}")
+    
     async def search_family_members(self, family_id: str, search_query: str) -> List[dict]:
         """Search family members by name"""
         try:
-            response = self.supabase.table("family_members").select("*").eq("family_id", family_id).ilike("name", f"%{search_query}%").execute()
+            response = self.supabase.table("family_members").select(MEMBER_COLUMNS).eq("family_id", family_id).is_("deleted_at", "null").ilike("name", f"%{search_query}%").execute()
             return response.data if response.data else []
         except Exception as e:
             raise Exception(f"Error searching family members: {str(e)}")
     
-    async def update_family_member(self, member_id: str, update_data: dict) -> dict:
-        """Update family member information"""
+    async def update_family_member(self, member_id: str, update_data: dict, family_id: Optional[str] = None) -> dict:
+        """Update family member information
+        
+        Args:
+            member_id: Member to update
+            update_data: Columns to change
+            family_id: The member's family, if already known (saves a lookup when
+                       custom_fields need coercing)
+        """
         try:
-            response = self.supabase.table("family_members").update(update_data).eq("id", member_id).execute()
-            return response.data[0] if response.data else None
+            if update_data.get("custom_fields"):
+                if family_id is None:
+                    current = await self.get_family_member_by_id(member_id)
+                    family_id = current.get("family_id") if current else None
+                if family_id:
+                    update_data = {
+                        **update_data,
+                        "custom_fields": coerce_custom_fields(update_data["custom_fields"], self._custom_field_types(family_id))
+                    }
+            
+            response = self.supabase.table("family_members").update(update_data).eq("id", member_id).is_("deleted_at", "null").execute()
+            member = response.data[0] if response.data else None
+            if member:
+                event_broker.publish(member.get("family_id"), "member_updated", member_event_data(member), member.get("row_version"))
+                if "relationships" in update_data or "name" in update_data:
+                    self._refresh_lineage(member.get("family_id"))
+            return member
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error updating family member: {str(e)}")
     
     async def delete_family_member(self, member_id: str) -> bool:
-        """Delete a family member"""
+        """Soft-delete a family member (restorable until purged in the background)"""
         try:
-            self.supabase.table("family_members").delete().eq("id", member_id).execute()
+            response = self.supabase.table("family_members").update({"deleted_at": deleted_now()}).eq("id", member_id).is_("deleted_at", "null").execute()
+            for deleted in response.data or []:
+                # Carries the version like the other events, so clients can advance their sync cursor
+                event_broker.publish(
+                    deleted.get("family_id"), "member_deleted",
+                    {"id": deleted.get("id"), "row_version": deleted.get("row_version")},
+                    deleted.get("row_version")
+                )
+                self._refresh_lineage(deleted.get("family_id"))
             return True
         except Exception as e:
             raise Exception(f"Error deleting family member: {str(e)}")
+    
+    async def restore_family_member(self, family_id: str, member_id: str) -> Optional[dict]:
+        """Undo a member delete
+        
+        Returns:
+            The restored member, or None if it is not deleted or was already purged
+        """
+        try:
+            response = self.supabase.rpc("restore_family_member", {
+                "p_family_id": family_id,
+                "p_member_id": member_id,
+                "p_retention_seconds": RETENTION_SECONDS
+            }).execute()
+            member = response.data[0] if response.data else None
+            if member:
+                event_broker.publish(family_id, "member_created", member_event_data(member), member.get("row_version"))
+                self._refresh_lineage(family_id)
+            return member
+        except Exception as e:
+            raise Exception(f"Error restoring family member: {str(e)}")
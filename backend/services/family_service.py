@@ -1,5 +1,38 @@
+import base64
+import uuid
+from datetime import datetime
 from typing import Optional
+import orjson
 from supabase import Client
+from core.crypto_pool import run_crypto
+from core.encryption import EncryptionService
+from core.soft_delete import deleted_now, RETENTION_SECONDS
+
+# Family columns safe to return to any client (no password material)
+FAMILY_COLUMNS = "id, family_name, admin_user_id, member_version, created_at, updated_at"
+
+# Key under which a custom field's stats group the values beyond its bucket cap
+OTHER_VALUES_BUCKET = "(other)"
+
+def encode_report_cursor(row: dict) -> str:
+    """Opaque keyset cursor pointing after a report row"""
+    return base64.urlsafe_b64encode(orjson.dumps([row["created_at"], row["id"]])).decode().rstrip("=")
+
+def decode_report_cursor(cursor: str) -> tuple:
+    """Inverse of encode_report_cursor
+    
+    Returns:
+        Tuple of (created_at ISO timestamp, family id)
+    
+    Raises:
+        ValueError: If the cursor is not a (timestamp, UUID) pair this endpoint issued
+    """
+    try:
+        created_at, family_id = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        # Both go to the database as typed parameters; reject anything that would not cast
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(family_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
 
 class FamilyService:
     """Service for family management"""
@@ -19,31 +52,136 @@ class FamilyService:
     async def get_family_by_id(self, family_id: str) -> dict:
         """Get family by ID"""
         try:
-            response = self.supabase.table("families").select("*").eq("id", family_id).execute()
+            response = self.supabase.table("families").select("*").eq("id", family_id).is_("deleted_at", "null").execute()
             return response.data[0] if response.data else None
         except Exception as e:
             raise Exception(f"Error fetching family: {str(e)}")
     
+    async def get_family_version(self, family_id: str) -> dict:
+        """Get the cheap version columns used to build ETags for a family"""
+        try:
+            response = self.supabase.table("families").select("id, updated_at, member_version").eq("id", family_id).is_("deleted_at", "null").execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            raise Exception(f"Error fetching family version: {str(e)}")
+    
+    async def get_family_stats(self, family_id: str, top: int = 20, recent: int = 5) -> dict:
+        """Get member statistics from the trigger-maintained family_stats counters
+        
+        Args:
+            family_id: The family ID
+            top: Most frequent values returned per custom field
+            recent: Number of recently added members returned
+        
+        Returns:
+            Dictionary with member_count, generations, custom_fields and recent_members
+        """
+        try:
+            counters = self.supabase.rpc("family_stats_summary", {"p_family_id": family_id, "p_top": top}).execute()
+            recent_members = self.supabase.table("family_members").select("id, name, photo_url, created_at").eq("family_id", family_id).is_("deleted_at", "null").order("created_at", desc=True).limit(recent).execute()
+            
+            stats = {"member_count": 0, "generations": {}, "custom_fields": {}}
+            for row in counters.data or []:
+                dimension, bucket, count = row["dimension"], row["bucket"], row["count"]
+                if dimension == "members":
+                    stats["member_count"] = count
+                elif dimension == "generation":
+                    stats["generations"][bucket] = count
+                elif dimension.startswith("cf:"):
+                    # The '' bucket counts values beyond the per-field bucket cap
+                    stats["custom_fields"].setdefault(dimension[3:], {})[bucket or OTHER_VALUES_BUCKET] = count
+            stats["recent_members"] = recent_members.data or []
+            return stats
+        except Exception as e:
+            raise Exception(f"Error fetching family stats: {str(e)}")
+    
+    async def rewrap_family_password(self, family_id: str, family_password: str, admin_password: str) -> None:
+        """Re-encrypt a legacy family password into the envelope format (runs as a background task)
+        
+        The key derivation goes through the crypto pool like every other one, so
+        it counts against KDF admission and never runs on the event loop.
+        """
+        try:
+            envelope, _ = await run_crypto(EncryptionService.wrap, family_password, admin_password)
+            self.supabase.table("families").update({"family_password_encrypted": envelope}).eq("id", family_id).execute()
+        except Exception as e:
+            # Retrieval already succeeded; the next retrieval retries the migration
+            print(f"Warning: Failed to migrate family password for {family_id}: {str(e)}")
+    
     async def get_all_families(self) -> list:
-        """Get all families (SuperAdmin only)"""
+        """Get all families (SuperAdmin only); prefer get_family_report for large installs"""
         try:
-            response = self.supabase.table("families").select("*").execute()
+            response = self.supabase.table("families").select(FAMILY_COLUMNS).is_("deleted_at", "null").execute()
             return response.data if response.data else []
         except Exception as e:
             raise Exception(f"Error fetching families: {str(e)}")
     
+    async def get_family_report(self, limit: int = 50, cursor: Optional[str] = None, search: Optional[str] = None) -> dict:
+        """Get one page of the SuperAdmin family report
+        
+        Each row carries the family, its admin's email and name and its member count,
+        all from a single database query; totals are added to the first page only.
+        
+        Args:
+            limit: Families per page
+            cursor: next_cursor of the previous page (None for the first page)
+            search: Only families whose name contains this text
+        
+        Returns:
+            Dictionary with families, next_cursor (None on the last page) and totals
+        """
+        try:
+            after_created, after_id = decode_report_cursor(cursor) if cursor else (None, None)
+            response = self.supabase.rpc("family_report_page", {
+                "p_limit": limit,
+                "p_after_created": after_created,
+                "p_after_id": after_id,
+                "p_search": search or None
+            }).execute()
+            families = response.data or []
+            
+            totals = None
+            if not cursor:
+                totals_response = self.supabase.rpc("family_report_totals", {}).execute()
+                totals = totals_response.data[0] if totals_response.data else {"family_count": 0, "member_count": 0}
+            
+            return {
+                "families": families,
+                "next_cursor": encode_report_cursor(families[-1]) if len(families) == limit else None,
+                "totals": totals
+            }
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error fetching family report: {str(e)}")
+    
     async def update_family(self, family_id: str, update_data: dict) -> dict:
         """Update family information"""
         try:
-            response = self.supabase.table("families").update(update_data).eq("id", family_id).execute()
+            response = self.supabase.table("families").update(update_data).eq("id", family_id).is_("deleted_at", "null").execute()
             return response.data[0] if response.data else None
         except Exception as e:
             raise Exception(f"Error updating family: {str(e)}")
     
     async def delete_family(self, family_id: str) -> bool:
-        """Delete a family"""
+        """Soft-delete a family; its members are purged in the background once the undo window passes"""
         try:
-            self.supabase.table("families").delete().eq("id", family_id).execute()
+            self.supabase.table("families").update({"deleted_at": deleted_now()}).eq("id", family_id).is_("deleted_at", "null").execute()
             return True
         except Exception as e:
             raise Exception(f"Error deleting family: {str(e)}")
+    
+    async def restore_family(self, family_id: str) -> Optional[dict]:
+        """Undo a family delete
+        
+        Returns:
+            The restored family, or None if it is not deleted or was already purged
+        """
+        try:
+            response = self.supabase.rpc("restore_family", {
+                "p_family_id": family_id,
+                "p_retention_seconds": RETENTION_SECONDS
+            }).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            raise Exception(f"Error restoring family: {str(e)}")
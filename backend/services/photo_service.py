@@ -0,0 +1,149 @@
+"""
+Service for member photo uploads
+Originals and their thumbnails are stored under the SHA-256 of the upload, so
+re-uploading the same picture (for any member) reuses the stored objects
+"""
+
+import asyncio
+import hashlib
+from typing import List, Optional
+
+from core.config import PHOTO_MAX_BYTES, PHOTO_STORAGE_PRIVATE, THUMBNAIL_SIZES
+from core.photo_storage import get_photo_storage
+from core.signed_urls import signed_url_cache
+from core.thumbnails import (
+    EXTENSIONS,
+    ORIGINAL_TYPES,
+    THUMBNAIL_TYPE,
+    InvalidImageError,
+    generate_thumbnails,
+    sniff_image_format,
+)
+from services.family_member_service import FamilyMemberService
+
+
+def original_key(content_hash: str, image_format: str) -> str:
+    return f"{content_hash}/original.{EXTENSIONS[image_format]}"
+
+
+def thumbnail_key(content_hash: str, size: int) -> str:
+    return f"{content_hash}/{size}.webp"
+
+
+class PhotoService:
+    """Service for storing member photos with pre-rendered thumbnails"""
+
+    def __init__(self, member_service: FamilyMemberService, storage=None):
+        self.member_service = member_service
+        self.storage = storage or get_photo_storage()
+
+    def photo_url(self, key: str) -> Optional[str]:
+        """
+        Public URL of a stored object (storage CDN, or the photo router for local storage)
+        
+        Private objects have none: their URLs expire, so clients sign photo_hash
+        thumbnails through the batch signing endpoint instead
+        """
+        if PHOTO_STORAGE_PRIVATE:
+            return None
+        return self.storage.public_url(key) or f"/api/photos/{key}"
+
+    async def photo_urls(self, photo: dict) -> dict:
+        """
+        URLs of a stored photo and its thumbnails for the upload response
+
+        Args:
+            photo: Result of store_photo
+
+        Returns:
+            Dictionary with photo_url and thumbnail URLs by size, signed for private storage
+        """
+        content_hash = photo["content_hash"]
+        keys = {"original": photo["key"], **{str(size): thumbnail_key(content_hash, size) for size in THUMBNAIL_SIZES}}
+        if PHOTO_STORAGE_PRIVATE:
+            signed, _ = await asyncio.to_thread(signed_url_cache.get_many, self.storage, list(keys.values()))
+            urls = {name: signed.get(key) for name, key in keys.items()}
+        else:
+            urls = {name: self.photo_url(key) for name, key in keys.items()}
+        original = urls.pop("original")
+        return {"photo_url": original, "thumbnails": urls}
+
+    async def store_photo(self, data: bytes) -> dict:
+        """
+        Store an image and its thumbnails, skipping work already done for the same content
+
+        Args:
+            data: Uploaded image bytes
+
+        Returns:
+            Dictionary with content_hash and the storage key of the original
+
+        Raises:
+            InvalidImageError: If the upload is empty, too large or not a supported image
+        """
+        if not data:
+            raise InvalidImageError("Uploaded file is empty")
+        if len(data) > PHOTO_MAX_BYTES:
+            raise InvalidImageError(f"Photo exceeds the {PHOTO_MAX_BYTES // (1024 * 1024)} MB limit")
+
+        image_format = sniff_image_format(data)
+        content_hash = hashlib.sha256(data).hexdigest()
+        key = original_key(content_hash, image_format)
+
+        # The largest thumbnail is written last, so its presence means the set is complete
+        complete = await asyncio.to_thread(self.storage.exists, thumbnail_key(content_hash, max(THUMBNAIL_SIZES)))
+        if not complete:
+            decoded_format, thumbnails = await generate_thumbnails(data, THUMBNAIL_SIZES)
+            if decoded_format != image_format:
+                raise InvalidImageError("File contents do not match the image type")
+            await asyncio.to_thread(self.storage.put, key, data, ORIGINAL_TYPES[image_format])
+            for size in sorted(thumbnails):
+                await asyncio.to_thread(self.storage.put, thumbnail_key(content_hash, size), thumbnails[size], THUMBNAIL_TYPE)
+
+        return {"content_hash": content_hash, "key": key}
+
+    async def sign_member_photos(self, family_id: str, size: int, member_ids: Optional[List[str]] = None) -> dict:
+        """
+        Signed thumbnail URLs for every member with a photo, in one storage call at most
+
+        Args:
+            family_id: The family ID
+            size: Thumbnail size (one of THUMBNAIL_SIZES)
+            member_ids: Restrict to these members (e.g. the visible part of the tree)
+
+        Returns:
+            Dictionary with size, urls keyed by member id and expires_at (UNIX time)
+        """
+        if size not in THUMBNAIL_SIZES:
+            raise InvalidImageError(f"Unknown thumbnail size {size}. Use one of: {', '.join(map(str, THUMBNAIL_SIZES))}")
+        try:
+            members = await self.member_service.get_member_photo_hashes(family_id, member_ids)
+            keys = {m["id"]: thumbnail_key(m["photo_hash"], size) for m in members}
+            signed, expires_at = await asyncio.to_thread(signed_url_cache.get_many, self.storage, list(keys.values()))
+            return {
+                "size": size,
+                "urls": {member_id: signed[key] for member_id, key in keys.items() if key in signed},
+                "expires_at": int(expires_at)
+            }
+        except Exception as e:
+            raise Exception(f"Error signing member photos: {str(e)}")
+    
+    async def set_member_photo(self, family_id: str, member_id: str, data: bytes) -> dict:
+        """
+        Store an uploaded photo and point the member at it
+
+        Returns:
+            Dictionary with the updated member and the stored photo details
+        """
+        try:
+            photo = await self.store_photo(data)
+            member = await self.member_service.update_family_member(
+                member_id,
+                {"photo_url": self.photo_url(photo["key"]), "photo_hash": photo["content_hash"]},
+                family_id=family_id
+            )
+            return {"member": member, "content_hash": photo["content_hash"], **await self.photo_urls(photo)}
+        except (InvalidImageError, RuntimeError):
+            raise
+        except Exception as e:
+            raise Exception(f"Error storing member photo: {str(e)}")
@@ -0,0 +1,176 @@
+"""
+Service for rotating refresh tokens
+Refresh tokens are 256-bit random values, so they are stored as a plain
+SHA-256 hash (no KDF needed) and renewing a session costs one indexed update
+
+Every row also carries session_mac, an HMAC of the session claims keyed by the
+JWT secret, set by the login that started the session and carried over by each
+rotation; a row written to the table by anything else cannot be refreshed
+"""
+
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from supabase import Client
+
+from core.config import REFRESH_TOKEN_EXPIRATION_DAYS, REFRESH_SESSION_MAX_DAYS, JWT_SECRET_KEY, SUPERADMIN_EMAIL
+
+
+class RefreshTokenService:
+    """Service for issuing, rotating and revoking refresh tokens"""
+    
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+    
+    @staticmethod
+    def _hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+    
+    @staticmethod
+    def _session_mac(subject_id: str, email: str, role: str, family_id: Optional[str],
+                     session_expires_at: datetime) -> str:
+        """HMAC binding the session claims to a login issued by this backend"""
+        message = "|".join([subject_id, email, role, family_id or "", str(int(session_expires_at.timestamp()))])
+        return hmac.new(JWT_SECRET_KEY.encode(), message.encode(), hashlib.sha256).hexdigest()
+    
+    def issue(self, subject_id: str, email: str, role: str, family_id: Optional[str] = None) -> str:
+        """
+        Issue a new refresh token
+        
+        Args:
+            subject_id: User ID (or member ID / 'superadmin')
+            email: Email the session belongs to
+            role: Role carried into renewed access tokens
+            family_id: Family the session is scoped to
+        
+        Returns:
+            The refresh token (only ever returned to the client, never stored)
+        """
+        try:
+            session_expires_at = datetime.now(timezone.utc) + timedelta(days=REFRESH_SESSION_MAX_DAYS)
+            token, _ = self._insert(subject_id, email, role, family_id, session_expires_at)
+            return token
+        except Exception as e:
+            raise Exception(f"Error issuing refresh token: {str(e)}")
+    
+    def _insert(self, subject_id: str, email: str, role: str, family_id: Optional[str],
+                session_expires_at: datetime) -> tuple[str, str]:
+        token = secrets.token_urlsafe(32)
+        # Rotated tokens never outlive the session started at login
+        expires_at = min(datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRATION_DAYS), session_expires_at)
+        response = self.supabase.table("refresh_tokens").insert({
+            "token_hash": self._hash(token),
+            "subject_id": subject_id,
+            "email": email,
+            "role": role,
+            "family_id": family_id,
+            "expires_at": expires_at.isoformat(),
+            "session_expires_at": session_expires_at.isoformat(),
+            "session_mac": self._session_mac(subject_id, email, role, family_id, session_expires_at)
+        }).execute()
+        if not response.data:
+            raise Exception("Failed to store refresh token")
+        return token, response.data[0].get("id")
+    
+    def rotate(self, token: str) -> tuple[dict, str]:
+        """
+        Exchange a refresh token for a new one
+        
+        Args:
+            token: The presented refresh token
+        
+        Returns:
+            Tuple of (session claims, new refresh token)
+        
+        Raises:
+            ValueError: If the token is unknown, expired or was already used, or
+                the account no longer allows the session
+        """
+        token_hash = self._hash(token)
+        now = datetime.now(timezone.utc)
+        
+        # Revoke atomically: only one concurrent caller can win the rotation
+        response = self.supabase.table("refresh_tokens").update({"revoked_at": now.isoformat()}).eq("token_hash", token_hash).is_("revoked_at", "null").execute()
+        
+        if not response.data:
+            existing = self.supabase.table("refresh_tokens").select("subject_id").eq("token_hash", token_hash).execute()
+            if existing.data:
+                # A used token was presented again: assume theft and end every session of the subject
+                self.revoke_all(existing.data[0].get("subject_id"))
+            raise ValueError("Invalid refresh token")
+        
+        session = response.data[0]
+        session_expires_at = datetime.fromisoformat(session.get("session_expires_at"))
+        if datetime.fromisoformat(session.get("expires_at")) <= now or session_expires_at <= now:
+            raise ValueError("Refresh token expired")
+        
+        claims = {
+            "user_id": session.get("subject_id"),
+            "email": session.get("email"),
+            "role": session.get("role"),
+            "family_id": session.get("family_id")
+        }
+        expected_mac = self._session_mac(claims["user_id"], claims["email"], claims["role"], claims["family_id"],
+                                         session_expires_at)
+        if not hmac.compare_digest(session.get("session_mac") or "", expected_mac):
+            # Not started by a login of this backend (e.g. a row inserted directly)
+            raise ValueError("Invalid refresh token")
+        self._check_subject(claims)
+        new_token, new_id = self._insert(claims["user_id"], claims["email"], claims["role"], claims["family_id"],
+                                         session_expires_at)
+        self.supabase.table("refresh_tokens").update({"replaced_by": new_id}).eq("id", session.get("id")).execute()
+        return claims, new_token
+    
+    def _check_subject(self, claims: dict) -> None:
+        """
+        Re-check that the account behind a session may still sign in
+        
+        Args:
+            claims: Session claims stored with the refresh token
+        
+        Raises:
+            ValueError: If the user or member is gone, no longer approved, or
+                its role or family changed since login
+        """
+        if claims["user_id"] == "superadmin":
+            # Only the SuperAdmin login issues this subject, always with these claims
+            if claims["role"] != "super_admin" or claims["email"] != SUPERADMIN_EMAIL or claims["family_id"]:
+                raise ValueError("Invalid refresh token")
+            return
+        
+        user = self.supabase.table("users").select("role, family_id, approval_status").eq("id", claims["user_id"]).execute()
+        if user.data:
+            current = user.data[0]
+            if current.get("approval_status") != "approved":
+                raise ValueError("Account is not approved")
+            if current.get("role") != claims["role"] or current.get("family_id") != claims["family_id"]:
+                raise ValueError("Account changed, please log in again")
+        elif claims["role"] == "family_user":
+            # Member logins use the family_members id as subject
+            member = self.supabase.table("family_members").select("relationships").eq("id", claims["user_id"]).eq("family_id", claims["family_id"]).is_("deleted_at", "null").execute()
+            relationships = member.data[0].get("relationships") if member.data else None
+            if not isinstance(relationships, dict) or relationships.get("email") != claims["email"]:
+                raise ValueError("Account no longer exists")
+        else:
+            raise ValueError("Account no longer exists")
+        
+        if claims["family_id"]:
+            family = self.supabase.table("families").select("id").eq("id", claims["family_id"]).is_("deleted_at", "null").execute()
+            if not family.data:
+                raise ValueError("Family no longer exists")
+    
+    def revoke(self, token: str) -> None:
+        """Revoke a single refresh token"""
+        try:
+            self.supabase.table("refresh_tokens").update({"revoked_at": datetime.now(timezone.utc).isoformat()}).eq("token_hash", self._hash(token)).is_("revoked_at", "null").execute()
+        except Exception as e:
+            raise Exception(f"Error revoking refresh token: {str(e)}")
+    
+    def revoke_all(self, subject_id: str) -> None:
+        """Revoke every active refresh token of a subject"""
+        try:
+            self.supabase.table("refresh_tokens").update({"revoked_at": datetime.now(timezone.utc).isoformat()}).eq("subject_id", subject_id).is_("revoked_at", "null").execute()
+        except Exception as e:
+            raise Exception(f"Error revoking refresh tokens: {str(e)}")
@@ -0,0 +1,39 @@
+-- Range-filter indexes for custom fields marked "indexed"
+-- Run by an operator with psql (not the SQL editor): CREATE INDEX CONCURRENTLY
+-- cannot run inside a transaction block, and building concurrently keeps
+-- family_members writable for every family while the index is built.
+--
+--   psql "$DATABASE_URL" -v max_indexes=20 -f sql/custom_field_indexes.sql
+--
+-- The index expressions match what PostgREST generates for custom_fields->key
+-- (number, boolean) and custom_fields->>key (text, date) filters. One index per
+-- key and kind is shared by all families that declare it, so only the
+-- :max_indexes keys declared indexed by the most families get one; other
+-- filters use the GIN index idx_family_members_custom_fields.
+-- Safe to re-run: existing indexes are skipped. A build that failed leaves an
+-- INVALID index behind; drop it before running again.
+
+\if :{?max_indexes}
+\else
+\set max_indexes 20
+\endif
+
+SELECT format(
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS %I ON family_members (family_id, (custom_fields %s %L))',
+    'idx_cf_' || field_key || CASE WHEN kind = 'json' THEN '_json' ELSE '_text' END,
+    CASE WHEN kind = 'json' THEN '->' ELSE '->>' END,
+    field_key
+)
+FROM (
+    SELECT
+        field_key,
+        CASE WHEN field_type IN ('number', 'boolean') THEN 'json' ELSE 'text' END AS kind,
+        COUNT(*) AS families
+    FROM family_custom_fields
+    WHERE indexed
+        AND field_key ~ '^[a-z][a-z0-9_]{0,62}$'
+    GROUP BY 1, 2
+    ORDER BY families DESC, field_key
+    LIMIT :max_indexes
+) wanted
+\gexec
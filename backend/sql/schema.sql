@@ -3,6 +3,12 @@
 -- Execute this on Supabase PostgreSQL Database
 
 -- Drop tables if they exist (for fresh setup)
+DROP TABLE IF EXISTS revoked_access_tokens CASCADE;
+DROP TABLE IF EXISTS refresh_tokens CASCADE;
+DROP TABLE IF EXISTS family_custom_fields CASCADE;
+DROP TABLE IF EXISTS family_stats CASCADE;
+DROP TABLE IF EXISTS family_member_lineage CASCADE;
+DROP TABLE IF EXISTS family_member_tombstones CASCADE;
 DROP TABLE IF EXISTS family_members CASCADE;
 DROP TABLE IF EXISTS admin_onboarding_requests CASCADE;
 DROP TABLE IF EXISTS users CASCADE;
@@ -14,6 +20,9 @@ CREATE TABLE families (
     family_name TEXT NOT NULL UNIQUE,
     admin_user_id UUID NOT NULL,
     family_password_encrypted TEXT NOT NULL,
+    member_version BIGINT NOT NULL DEFAULT 0,
+    lineage_stale_at TIMESTAMP WITH TIME ZONE,
+    deleted_at TIMESTAMP WITH TIME ZONE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -54,32 +63,743 @@ CREATE TABLE family_members (
     family_id UUID NOT NULL REFERENCES families(id) ON DELETE CASCADE,
     name TEXT NOT NULL,
     photo_url TEXT,
+    photo_hash TEXT,
     relationships JSONB DEFAULT '{}',
     custom_fields JSONB DEFAULT '{}',
+    row_version BIGINT NOT NULL DEFAULT 0,
+    generation INTEGER,
+    deleted_at TIMESTAMP WITH TIME ZONE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create family_member_tombstones table (deletion log for delta sync)
+-- No foreign key to families so tombstones survive until purged
+CREATE TABLE family_member_tombstones (
+    member_id UUID PRIMARY KEY,
+    family_id UUID NOT NULL,
+    row_version BIGINT NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create family_member_lineage table (optional ancestor/descendant closure)
+-- One row per (ancestor, descendant) pair with the shortest distance; every member
+-- is its own ancestor at depth 0. Rebuilt per family by rebuild_family_lineage().
+CREATE TABLE family_member_lineage (
+    family_id UUID NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    ancestor_id UUID NOT NULL REFERENCES family_members(id) ON DELETE CASCADE,
+    descendant_id UUID NOT NULL REFERENCES family_members(id) ON DELETE CASCADE,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+-- Create family_custom_fields table (typed custom field schema per family)
+-- Declared values are coerced on write; "indexed" marks fields for which an operator
+-- may build a range-filter expression index (sql/custom_field_indexes.sql)
+CREATE TABLE family_custom_fields (
+    family_id UUID NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    field_key TEXT NOT NULL CHECK (field_key ~ '^[a-z][a-z0-9_]{0,62}$'),
+    field_type TEXT NOT NULL CHECK (field_type IN ('text', 'number', 'date', 'boolean')),
+    label TEXT,
+    indexed BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (family_id, field_key)
+);
+
+-- Create family_stats table (incrementally maintained member aggregates)
+-- One counter per (dimension, bucket): members/all, generation/<n|unknown> and
+-- cf:<key>/<value> (at most 100 values per key, the rest under ''); kept
+-- current by trg_family_members_stats
+CREATE TABLE family_stats (
+    family_id UUID NOT NULL REFERENCES families(id) ON DELETE CASCADE,
+    dimension TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (family_id, dimension, bucket)
+);
+
+-- Create refresh_tokens table (rotating refresh tokens for the auth system)
+-- subject_id is a users.id, a family_members.id (member logins) or 'superadmin'
+-- session_expires_at is fixed at login and carried over by every rotation;
+-- session_mac is an HMAC of the session claims only the backend can compute
+CREATE TABLE refresh_tokens (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    token_hash TEXT NOT NULL UNIQUE,
+    subject_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    role TEXT NOT NULL,
+    family_id UUID,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    session_expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    session_mac TEXT NOT NULL,
+    revoked_at TIMESTAMP WITH TIME ZONE,
+    replaced_by UUID,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create revoked_access_tokens table (logged-out access token jtis, kept until the token expires)
+CREATE TABLE revoked_access_tokens (
+    jti TEXT PRIMARY KEY,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
 -- Create indexes for better query performance
 CREATE INDEX idx_users_family_id ON users(family_id);
 CREATE INDEX idx_users_role ON users(role);
 CREATE INDEX idx_users_approval_status ON users(approval_status);
 CREATE INDEX idx_family_members_family_id ON family_members(family_id);
 CREATE INDEX idx_family_members_name ON family_members(name);
+CREATE INDEX idx_family_members_family_version ON family_members(family_id, row_version);
+CREATE INDEX idx_family_members_family_lower_name ON family_members(family_id, lower(name));
+CREATE INDEX idx_family_members_family_generation ON family_members(family_id, generation);
+CREATE INDEX idx_family_members_family_created ON family_members(family_id, created_at DESC);
+-- Serves custom field equality filters (custom_fields @> '{"key": value}')
+CREATE INDEX idx_family_members_custom_fields ON family_members USING GIN (custom_fields jsonb_path_ops);
+CREATE INDEX idx_lineage_descendant ON family_member_lineage(descendant_id, depth);
+CREATE INDEX idx_lineage_family ON family_member_lineage(family_id);
+-- Keyset pagination of the SuperAdmin family report (newest first)
+CREATE INDEX idx_families_report ON families(created_at DESC, id DESC) WHERE deleted_at IS NULL;
+-- Soft-deleted rows waiting for the purge worker
+CREATE INDEX idx_families_deleted_at ON families(deleted_at) WHERE deleted_at IS NOT NULL;
+CREATE INDEX idx_family_members_deleted_at ON family_members(deleted_at) WHERE deleted_at IS NOT NULL;
+CREATE INDEX idx_member_tombstones_family_version ON family_member_tombstones(family_id, row_version);
+CREATE INDEX idx_refresh_tokens_subject ON refresh_tokens(subject_id);
+CREATE INDEX idx_revoked_access_tokens_expires ON revoked_access_tokens(expires_at);
 CREATE INDEX idx_admin_requests_status ON admin_onboarding_requests(status);
 CREATE INDEX idx_admin_requests_email ON admin_onboarding_requests(email);
 
+-- Only one pending onboarding request per email and per family name, case-insensitively
+-- (guards the pre-check below against races; the backend answers violations with 409)
+CREATE UNIQUE INDEX uq_admin_requests_pending_email ON admin_onboarding_requests(email) WHERE status = 'pending';
+CREATE UNIQUE INDEX uq_admin_requests_pending_family_name ON admin_onboarding_requests(lower(family_name)) WHERE status = 'pending';
+
+-- Keep updated_at current on every row update
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_families_updated_at
+    BEFORE UPDATE OF family_name, admin_user_id, family_password_encrypted ON families
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- Bump the per-family change counter whenever a member changes and stamp the
+-- new value on the row. The counter backs the ETags served by the family and
+-- member read endpoints and is the cursor used by delta sync. Writers to one
+-- family serialize on the families row, so versions are assigned in commit order.
+-- Soft deletes and restores (deleted_at) count as changes.
+CREATE OR REPLACE FUNCTION stamp_family_member_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE families
+    SET member_version = member_version + 1
+    WHERE id = NEW.family_id
+    RETURNING member_version INTO NEW.row_version;
+    
+    IF TG_OP = 'UPDATE' THEN
+        NEW.updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_family_members_version
+    BEFORE INSERT OR UPDATE OF family_id, name, photo_url, photo_hash, relationships, custom_fields, deleted_at ON family_members
+    FOR EACH ROW EXECUTE FUNCTION stamp_family_member_version();
+
+-- Record a tombstone for every deleted member so clients can sync deletions
+-- The tombstone triggers run as the table owner (SECURITY DEFINER) because
+-- family_member_tombstones is closed to every key but the service role
+-- A soft-deleted member got its tombstone when it was soft-deleted; purging it
+-- keeps that tombstone and adds nothing
+CREATE OR REPLACE FUNCTION log_family_member_deletion()
+RETURNS TRIGGER AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    IF OLD.deleted_at IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+    
+    UPDATE families
+    SET member_version = member_version + 1
+    WHERE id = OLD.family_id AND deleted_at IS NULL
+    RETURNING member_version INTO new_version;
+    
+    -- Family itself is being deleted (cascade or purge): nothing left to sync
+    IF new_version IS NOT NULL THEN
+        INSERT INTO family_member_tombstones (member_id, family_id, row_version)
+        VALUES (OLD.id, OLD.family_id, new_version)
+        ON CONFLICT (member_id) DO UPDATE SET row_version = EXCLUDED.row_version, deleted_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE TRIGGER trg_family_members_deletion_log
+    AFTER DELETE ON family_members
+    FOR EACH ROW EXECUTE FUNCTION log_family_member_deletion();
+
+-- Soft deletes are tombstoned right away, at the version trg_family_members_version
+-- stamped on the row, so a client that syncs only after the purge still learns
+-- of the deletion. A restore withdraws the tombstone; the restored row carries a
+-- newer version and syncs as a change.
+CREATE OR REPLACE FUNCTION log_family_member_soft_deletion()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.deleted_at IS NOT NULL AND OLD.deleted_at IS NULL THEN
+        INSERT INTO family_member_tombstones (member_id, family_id, row_version)
+        VALUES (NEW.id, NEW.family_id, NEW.row_version)
+        ON CONFLICT (member_id) DO UPDATE SET row_version = EXCLUDED.row_version, deleted_at = CURRENT_TIMESTAMP;
+    ELSIF NEW.deleted_at IS NULL AND OLD.deleted_at IS NOT NULL THEN
+        DELETE FROM family_member_tombstones WHERE member_id = NEW.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE TRIGGER trg_family_members_soft_deletion_log
+    AFTER UPDATE OF deleted_at ON family_members
+    FOR EACH ROW EXECUTE FUNCTION log_family_member_soft_deletion();
+
+-- Stats buckets a member counts towards; scalar custom field values only,
+-- truncated so one long value cannot bloat the counter table
+CREATE OR REPLACE FUNCTION family_member_stat_buckets(p_generation INTEGER, p_custom_fields JSONB)
+RETURNS TABLE (dimension TEXT, bucket TEXT)
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT 'members', 'all'
+    UNION ALL
+    SELECT 'generation', COALESCE(p_generation::text, 'unknown')
+    UNION ALL
+    SELECT 'cf:' || cf.key, left(cf.value #>> '{}', 100)
+    FROM jsonb_each(COALESCE(p_custom_fields, '{}'::jsonb)) AS cf(key, value)
+    WHERE jsonb_typeof(cf.value) IN ('string', 'number', 'boolean')
+        AND cf.value #>> '{}' <> '';
+$$;
+
+-- Add p_delta (+1 or -1) to every stats bucket of one member
+-- A custom field dimension keeps at most 100 value buckets; once it is full,
+-- further values are counted in the '' (other values) bucket, and no new value
+-- bucket is created while that bucket exists. A value with its own bucket is
+-- therefore always counted there, so decrements hit the bucket the member was
+-- counted in. Buckets that drop to zero are removed individually.
+CREATE OR REPLACE FUNCTION apply_family_stats_delta(p_family_id UUID, p_generation INTEGER, p_custom_fields JSONB, p_delta INTEGER)
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+    b RECORD;
+    target TEXT;
+BEGIN
+    FOR b IN SELECT * FROM family_member_stat_buckets(p_generation, p_custom_fields) LOOP
+        target := b.bucket;
+        IF b.dimension LIKE 'cf:%' AND NOT EXISTS (
+            SELECT 1 FROM family_stats
+            WHERE family_id = p_family_id AND dimension = b.dimension AND bucket = b.bucket
+        ) AND (
+            p_delta < 0
+            OR EXISTS (
+                SELECT 1 FROM family_stats
+                WHERE family_id = p_family_id AND dimension = b.dimension AND bucket = ''
+            )
+            OR (
+                SELECT COUNT(*) FROM family_stats
+                WHERE family_id = p_family_id AND dimension = b.dimension
+            ) >= 100
+        ) THEN
+            target := '';
+        END IF;
+        
+        INSERT INTO family_stats (family_id, dimension, bucket, count)
+        VALUES (p_family_id, b.dimension, target, p_delta)
+        ON CONFLICT (family_id, dimension, bucket)
+        DO UPDATE SET count = family_stats.count + EXCLUDED.count;
+        
+        IF p_delta < 0 THEN
+            DELETE FROM family_stats
+            WHERE family_id = p_family_id AND dimension = b.dimension AND bucket = target AND count <= 0;
+        END IF;
+    END LOOP;
+END;
+$$;
+
+-- Move a member's contribution between stats buckets on every write
+-- Soft-deleted members do not count
+-- Runs as the table owner: family_stats is closed to every key but the service role
+CREATE OR REPLACE FUNCTION maintain_family_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.deleted_at IS NULL THEN
+        PERFORM apply_family_stats_delta(OLD.family_id, OLD.generation, OLD.custom_fields, -1);
+    END IF;
+    
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.deleted_at IS NULL THEN
+        PERFORM apply_family_stats_delta(NEW.family_id, NEW.generation, NEW.custom_fields, 1);
+    END IF;
+    
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE TRIGGER trg_family_members_stats
+    AFTER INSERT OR DELETE OR UPDATE OF family_id, generation, custom_fields, deleted_at ON family_members
+    FOR EACH ROW EXECUTE FUNCTION maintain_family_stats();
+
+-- Recompute a family's counters from scratch (backfill or repair)
+-- Applies the same 100-bucket cap: the most frequent values keep their bucket
+CREATE OR REPLACE FUNCTION rebuild_family_stats(p_family_id UUID)
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM family_stats WHERE family_id = p_family_id;
+    
+    INSERT INTO family_stats (family_id, dimension, bucket, count)
+    SELECT p_family_id, ranked.dimension,
+        CASE WHEN ranked.dimension LIKE 'cf:%' AND ranked.rank > 100 THEN '' ELSE ranked.bucket END,
+        SUM(ranked.count)
+    FROM (
+        SELECT counted.dimension, counted.bucket, counted.count,
+            row_number() OVER (PARTITION BY counted.dimension ORDER BY counted.count DESC, counted.bucket) AS rank
+        FROM (
+            SELECT b.dimension, b.bucket, COUNT(*) AS count
+            FROM family_members fm
+            CROSS JOIN LATERAL family_member_stat_buckets(fm.generation, fm.custom_fields) b
+            WHERE fm.family_id = p_family_id AND fm.deleted_at IS NULL
+            GROUP BY b.dimension, b.bucket
+        ) counted
+    ) ranked
+    GROUP BY 2, 3;
+END;
+$$;
+
+-- Counters of one family, at most p_top buckets per dimension (largest first)
+CREATE OR REPLACE FUNCTION family_stats_summary(p_family_id UUID, p_top INTEGER DEFAULT 20)
+RETURNS TABLE (dimension TEXT, bucket TEXT, count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT ranked.dimension, ranked.bucket, ranked.count
+    FROM (
+        SELECT s.dimension, s.bucket, s.count,
+            row_number() OVER (PARTITION BY s.dimension ORDER BY s.count DESC, s.bucket) AS rank
+        FROM family_stats s
+        WHERE s.family_id = p_family_id
+    ) ranked
+    WHERE ranked.rank <= p_top;
+$$;
+
+-- Parent -> child edges derived from the relationships JSON
+-- Parent links (father, mother, parent, parent_1, parent_2) hold either a member id
+-- or a member name within the same family; soft-deleted members have no edges
+CREATE OR REPLACE VIEW family_member_parent_edges AS
+SELECT DISTINCT child.family_id, parent.id AS parent_id, child.id AS child_id
+FROM family_members child
+CROSS JOIN LATERAL jsonb_each_text(COALESCE(child.relationships, '{}'::jsonb)) AS rel(key, value)
+JOIN family_members parent
+    ON parent.family_id = child.family_id
+    AND (parent.id::text = rel.value OR lower(parent.name) = lower(trim(rel.value)))
+    AND parent.deleted_at IS NULL
+WHERE rel.key IN ('father', 'mother', 'parent', 'parent_1', 'parent_2')
+    AND parent.id <> child.id
+    AND child.deleted_at IS NULL;
+
+-- Recompute the lineage closure and generation numbers of one family
+-- Depth is capped so a cyclic relationship graph still terminates
+CREATE OR REPLACE FUNCTION rebuild_family_lineage(p_family_id UUID)
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- Serialize rebuilds of the same family: two concurrent DELETE+INSERT runs
+    -- would otherwise collide on the primary key or leave a stale closure behind
+    PERFORM pg_advisory_xact_lock(hashtext(p_family_id::text));
+    
+    DELETE FROM family_member_lineage WHERE family_id = p_family_id;
+    
+    INSERT INTO family_member_lineage (family_id, ancestor_id, descendant_id, depth)
+    WITH RECURSIVE edges AS (
+        SELECT parent_id, child_id FROM family_member_parent_edges WHERE family_id = p_family_id
+    ),
+    walk(ancestor_id, descendant_id, depth) AS (
+        SELECT id, id, 0 FROM family_members WHERE family_id = p_family_id AND deleted_at IS NULL
+        UNION
+        SELECT w.ancestor_id, e.child_id, w.depth + 1
+        FROM walk w
+        JOIN edges e ON e.parent_id = w.descendant_id
+        WHERE w.depth < 100
+    )
+    SELECT p_family_id, ancestor_id, descendant_id, MIN(depth)
+    FROM walk
+    GROUP BY ancestor_id, descendant_id;
+    
+    -- Generation = length of the longest ancestor chain (0 for roots), the same
+    -- longest-path layering as core/tree_layout.py. The closure keeps shortest
+    -- distances, which differ when an ancestor is reachable along paths of
+    -- different lengths, so walk down from the roots keeping every
+    -- (member, depth) pair; depth is capped for cyclic graphs
+    UPDATE family_members fm
+    SET generation = COALESCE(g.generation, 0)
+    FROM family_members m
+    LEFT JOIN (
+        WITH RECURSIVE edges AS (
+            SELECT parent_id, child_id FROM family_member_parent_edges WHERE family_id = p_family_id
+        ),
+        walk(member_id, depth) AS (
+            SELECT id, 0 FROM family_members r
+            WHERE r.family_id = p_family_id AND r.deleted_at IS NULL
+                AND NOT EXISTS (SELECT 1 FROM edges e WHERE e.child_id = r.id)
+            UNION
+            SELECT e.child_id, w.depth + 1
+            FROM walk w
+            JOIN edges e ON e.parent_id = w.member_id
+            WHERE w.depth < 100
+        )
+        SELECT member_id, MAX(depth) AS generation
+        FROM walk
+        GROUP BY member_id
+    ) g ON g.member_id = m.id
+    WHERE m.family_id = p_family_id
+        AND m.deleted_at IS NULL
+        AND fm.id = m.id
+        AND fm.generation IS DISTINCT FROM COALESCE(g.generation, 0);
+    
+    UPDATE families SET lineage_stale_at = NULL
+    WHERE id = p_family_id AND lineage_stale_at IS NOT NULL;
+END;
+$$;
+
+-- All descendants of a member, nearest first
+CREATE OR REPLACE FUNCTION lineage_descendants(p_member_id UUID, p_max_depth INTEGER DEFAULT NULL)
+RETURNS TABLE (id UUID, name TEXT, photo_url TEXT, depth INTEGER)
+LANGUAGE sql STABLE AS $$
+    SELECT fm.id, fm.name, fm.photo_url, l.depth
+    FROM family_member_lineage l
+    JOIN family_members fm ON fm.id = l.descendant_id
+    WHERE l.ancestor_id = p_member_id
+        AND l.depth > 0
+        AND fm.deleted_at IS NULL
+        AND (p_max_depth IS NULL OR l.depth <= p_max_depth)
+    ORDER BY l.depth, fm.name;
+$$;
+
+-- Common ancestors of two members, closest (smallest combined distance) first
+CREATE OR REPLACE FUNCTION lineage_common_ancestors(p_member_a UUID, p_member_b UUID)
+RETURNS TABLE (id UUID, name TEXT, photo_url TEXT, depth_from_a INTEGER, depth_from_b INTEGER)
+LANGUAGE sql STABLE AS $$
+    SELECT fm.id, fm.name, fm.photo_url, a.depth, b.depth
+    FROM family_member_lineage a
+    JOIN family_member_lineage b ON b.ancestor_id = a.ancestor_id
+    JOIN family_members fm ON fm.id = a.ancestor_id
+    WHERE a.descendant_id = p_member_a
+        AND b.descendant_id = p_member_b
+        AND a.depth > 0
+        AND b.depth > 0
+        AND fm.deleted_at IS NULL
+    ORDER BY a.depth + b.depth, fm.name;
+$$;
+
+-- Branch of the tree rooted at one member, walked up (ancestors) or down (descendants)
+-- Works without the lineage closure: the family's edges are materialized once and
+-- walked breadth-first. The walk keeps only (member_id, depth) rows and UNION
+-- dedupes them, so shared ancestry (a member reachable along many paths) costs
+-- one row per member and depth instead of one per path, and cycles stop at the
+-- depth cap. Each member is returned at its shortest distance together with a
+-- member one step closer to the root that it was reached from.
+-- Returns no rows when the root is not a member of the family
+CREATE OR REPLACE FUNCTION family_member_subtree(
+    p_family_id UUID,
+    p_root_id UUID,
+    p_direction TEXT DEFAULT 'down',
+    p_max_depth INTEGER DEFAULT 10
+)
+RETURNS TABLE (id UUID, name TEXT, photo_url TEXT, relationships JSONB, depth INTEGER, linked_from UUID)
+LANGUAGE sql STABLE AS $$
+    WITH RECURSIVE edges AS MATERIALIZED (
+        SELECT
+            CASE WHEN p_direction = 'up' THEN e.child_id ELSE e.parent_id END AS from_id,
+            CASE WHEN p_direction = 'up' THEN e.parent_id ELSE e.child_id END AS to_id
+        FROM family_member_parent_edges e
+        WHERE e.family_id = p_family_id
+    ),
+    walk(member_id, depth) AS (
+        SELECT fm.id, 0
+        FROM family_members fm
+        WHERE fm.id = p_root_id AND fm.family_id = p_family_id AND fm.deleted_at IS NULL
+        UNION
+        SELECT e.to_id, w.depth + 1
+        FROM walk w
+        JOIN edges e ON e.from_id = w.member_id
+        WHERE w.depth < LEAST(COALESCE(p_max_depth, 100), 100)
+    ),
+    nearest AS MATERIALIZED (
+        SELECT member_id, MIN(depth) AS depth
+        FROM walk
+        GROUP BY member_id
+    ),
+    linked AS (
+        SELECT DISTINCT ON (n.member_id) n.member_id, n.depth, p.member_id AS linked_from
+        FROM nearest n
+        LEFT JOIN edges e ON e.to_id = n.member_id AND n.depth > 0
+        LEFT JOIN nearest p ON p.member_id = e.from_id AND p.depth = n.depth - 1
+        ORDER BY n.member_id, p.member_id NULLS LAST
+    )
+    SELECT fm.id, fm.name, fm.photo_url, fm.relationships, l.depth, l.linked_from
+    FROM linked l
+    JOIN family_members fm ON fm.id = l.member_id
+    ORDER BY l.depth, fm.name;
+$$;
+
+-- Hard-delete soft-deleted rows older than the undo window, at most p_batch_size
+-- rows per call so the purge worker spreads the work over many short transactions.
+-- Members of a deleted family go first; the family row is removed once it has no
+-- members left, so its cascade never has to walk a large family. SKIP LOCKED lets
+-- several workers purge concurrently. Returns the number of rows removed.
+-- Only the backend (service_role) may call it, see Function privileges below
+CREATE OR REPLACE FUNCTION purge_deleted_rows(p_retention_seconds INTEGER, p_batch_size INTEGER DEFAULT 500)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    cutoff TIMESTAMP WITH TIME ZONE := CURRENT_TIMESTAMP - make_interval(secs => p_retention_seconds);
+    purged INTEGER := 0;
+    removed INTEGER;
+BEGIN
+    DELETE FROM family_members
+    WHERE id IN (
+        SELECT fm.id FROM family_members fm
+        WHERE fm.deleted_at < cutoff
+        LIMIT p_batch_size
+        FOR UPDATE SKIP LOCKED
+    );
+    GET DIAGNOSTICS removed = ROW_COUNT;
+    purged := purged + removed;
+    
+    IF purged < p_batch_size THEN
+        DELETE FROM family_members
+        WHERE id IN (
+            SELECT fm.id FROM families f
+            JOIN family_members fm ON fm.family_id = f.id
+            WHERE f.deleted_at < cutoff
+            LIMIT p_batch_size - purged
+            FOR UPDATE OF fm SKIP LOCKED
+        );
+        GET DIAGNOSTICS removed = ROW_COUNT;
+        purged := purged + removed;
+    END IF;
+    
+    IF purged < p_batch_size THEN
+        DELETE FROM families
+        WHERE id IN (
+            SELECT f.id FROM families f
+            WHERE f.deleted_at < cutoff
+                AND NOT EXISTS (SELECT 1 FROM family_members fm WHERE fm.family_id = f.id)
+            LIMIT p_batch_size - purged
+            FOR UPDATE SKIP LOCKED
+        );
+        GET DIAGNOSTICS removed = ROW_COUNT;
+        purged := purged + removed;
+    END IF;
+    
+    RETURN purged;
+END;
+$$;
+
+-- Undo a delete while it is inside the retention window. The window is checked
+-- against the database clock, the same one purge_deleted_rows uses, so a skewed
+-- app server can neither restore a row the purge may already be removing nor
+-- refuse one that is still restorable. Return the restored row, or nothing.
+CREATE OR REPLACE FUNCTION restore_family(p_family_id UUID, p_retention_seconds INTEGER)
+RETURNS SETOF families
+LANGUAGE sql AS $$
+    UPDATE families SET deleted_at = NULL
+    WHERE id = p_family_id
+        AND deleted_at >= CURRENT_TIMESTAMP - make_interval(secs => p_retention_seconds)
+    RETURNING *;
+$$;
+
+CREATE OR REPLACE FUNCTION restore_family_member(p_family_id UUID, p_member_id UUID, p_retention_seconds INTEGER)
+RETURNS SETOF family_members
+LANGUAGE sql AS $$
+    UPDATE family_members SET deleted_at = NULL
+    WHERE id = p_member_id
+        AND family_id = p_family_id
+        AND deleted_at >= CURRENT_TIMESTAMP - make_interval(secs => p_retention_seconds)
+    RETURNING *;
+$$;
+
+-- One page of the SuperAdmin family report, newest first, continuing after
+-- (p_after_created, p_after_id) when given. Member counts come from the
+-- trigger-maintained family_stats counters, so a page costs p_limit index
+-- lookups however large the families are. p_search is matched literally:
+-- LIKE wildcards (%, _) and the escape character in it are escaped
+CREATE OR REPLACE FUNCTION family_report_page(
+    p_limit INTEGER DEFAULT 50,
+    p_after_created TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL,
+    p_search TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    family_name TEXT,
+    admin_user_id UUID,
+    admin_email TEXT,
+    admin_name TEXT,
+    member_count BIGINT,
+    created_at TIMESTAMP WITH TIME ZONE
+)
+LANGUAGE sql STABLE AS $$
+    SELECT f.id, f.family_name, f.admin_user_id, u.email, u.full_name, COALESCE(s.count, 0), f.created_at
+    FROM families f
+    LEFT JOIN users u ON u.id = f.admin_user_id
+    LEFT JOIN family_stats s ON s.family_id = f.id AND s.dimension = 'members' AND s.bucket = 'all'
+    WHERE f.deleted_at IS NULL
+        AND (p_after_created IS NULL OR (f.created_at, f.id) < (p_after_created, p_after_id))
+        AND (p_search IS NULL OR f.family_name ILIKE
+            '%' || replace(replace(replace(p_search, '\', '\\'), '%', '\%'), '_', '\_') || '%')
+    ORDER BY f.created_at DESC, f.id DESC
+    LIMIT LEAST(GREATEST(p_limit, 1), 200);
+$$;
+
+-- Platform-wide totals for the family report, aggregated in the database
+CREATE OR REPLACE FUNCTION family_report_totals()
+RETURNS TABLE (family_count BIGINT, member_count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT COUNT(*), COALESCE(SUM(s.count), 0)::BIGINT
+    FROM families f
+    LEFT JOIN family_stats s ON s.family_id = f.id AND s.dimension = 'members' AND s.bucket = 'all'
+    WHERE f.deleted_at IS NULL;
+$$;
+
+-- Apply a declared custom field type to a family's existing rows
+-- No DDL here: expression indexes on the shared family_members table are built
+-- out of band with CREATE INDEX CONCURRENTLY (sql/custom_field_indexes.sql);
+-- until then filters are served by idx_family_members_custom_fields
+CREATE OR REPLACE FUNCTION apply_custom_field(
+    p_family_id UUID,
+    p_field_key TEXT,
+    p_field_type TEXT
+)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public AS $$
+BEGIN
+    IF p_field_key !~ '^[a-z][a-z0-9_]{0,62}$' THEN
+        RAISE EXCEPTION 'Invalid custom field key %', p_field_key;
+    END IF;
+    
+    -- Convert stored strings so containment and JSONB comparisons see typed values
+    IF p_field_type = 'number' THEN
+        UPDATE family_members
+        SET custom_fields = jsonb_set(custom_fields, ARRAY[p_field_key], to_jsonb(trim(custom_fields->>p_field_key)::numeric))
+        WHERE family_id = p_family_id
+            AND jsonb_typeof(custom_fields->p_field_key) = 'string'
+            AND trim(custom_fields->>p_field_key) ~ '^-?[0-9]+(\.[0-9]+)?$';
+    ELSIF p_field_type = 'boolean' THEN
+        UPDATE family_members
+        SET custom_fields = jsonb_set(custom_fields, ARRAY[p_field_key],
+            to_jsonb(lower(trim(custom_fields->>p_field_key)) IN ('true', '1', 'yes', 'y')))
+        WHERE family_id = p_family_id
+            AND jsonb_typeof(custom_fields->p_field_key) = 'string'
+            AND lower(trim(custom_fields->>p_field_key)) IN ('true', '1', 'yes', 'y', 'false', '0', 'no', 'n');
+    ELSIF p_field_type = 'date' THEN
+        UPDATE family_members
+        SET custom_fields = jsonb_set(custom_fields, ARRAY[p_field_key], to_jsonb(left(trim(custom_fields->>p_field_key), 10)))
+        WHERE family_id = p_family_id
+            AND jsonb_typeof(custom_fields->p_field_key) = 'string'
+            AND trim(custom_fields->>p_field_key) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}.+';
+    END IF;
+END;
+$$;
+
+-- Onboarding uniqueness pre-check: every conflict in one indexed round-trip
+-- families.family_name, users.email and the uq_admin_requests_pending_* indexes enforce the same rules at insert time
+CREATE OR REPLACE FUNCTION check_onboarding_conflicts(p_family_name TEXT, p_email TEXT)
+RETURNS TABLE (family_name_taken BOOLEAN, pending_request_exists BOOLEAN, existing_user_id UUID)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        EXISTS (SELECT 1 FROM families WHERE family_name = p_family_name)
+            OR EXISTS (SELECT 1 FROM admin_onboarding_requests WHERE lower(family_name) = lower(p_family_name) AND status = 'pending'),
+        EXISTS (SELECT 1 FROM admin_onboarding_requests WHERE email = p_email AND status = 'pending'),
+        (SELECT id FROM users WHERE email = p_email);
+$$;
+
+-- Table privileges
+-- Tables only the backend reads and writes (service_role bypasses RLS). RLS
+-- without policies plus the REVOKE keeps the anon and authenticated keys out
+-- entirely, e.g. from inserting a refresh token row or deleting a revocation.
+ALTER TABLE refresh_tokens ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON TABLE refresh_tokens FROM anon, authenticated;
+ALTER TABLE revoked_access_tokens ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON TABLE revoked_access_tokens FROM anon, authenticated;
+ALTER TABLE family_member_lineage ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON TABLE family_member_lineage FROM anon, authenticated;
+ALTER TABLE family_member_tombstones ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON TABLE family_member_tombstones FROM anon, authenticated;
+ALTER TABLE family_stats ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON TABLE family_stats FROM anon, authenticated;
+ALTER TABLE family_custom_fields ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON TABLE family_custom_fields FROM anon, authenticated;
+-- Views run with their owner's privileges, so this one would bypass family_members RLS
+REVOKE ALL ON TABLE family_member_parent_edges FROM anon, authenticated;
+
+-- Function privileges
+-- Functions are executable by PUBLIC by default and PostgREST exposes them to the
+-- anon and authenticated keys. Functions that write data for an arbitrary family
+-- are only callable with the backend's service_role key.
+REVOKE EXECUTE ON FUNCTION apply_custom_field(UUID, TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_custom_field(UUID, TEXT, TEXT) TO service_role;
+-- purge_deleted_rows takes the retention from its caller; with it anyone could
+-- purge everything at once and defeat the undo window
+REVOKE EXECUTE ON FUNCTION purge_deleted_rows(INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION purge_deleted_rows(INTEGER, INTEGER) TO service_role;
+REVOKE EXECUTE ON FUNCTION restore_family(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION restore_family(UUID, INTEGER) TO service_role;
+REVOKE EXECUTE ON FUNCTION restore_family_member(UUID, UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION restore_family_member(UUID, UUID, INTEGER) TO service_role;
+-- Stats functions read any family's custom field values or rewrite its counters
+REVOKE EXECUTE ON FUNCTION apply_family_stats_delta(UUID, INTEGER, JSONB, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION rebuild_family_stats(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_family_stats(UUID) TO service_role;
+REVOKE EXECUTE ON FUNCTION family_stats_summary(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION family_stats_summary(UUID, INTEGER) TO service_role;
+-- Lineage functions read or rebuild any family's relationship graph
+REVOKE EXECUTE ON FUNCTION rebuild_family_lineage(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_family_lineage(UUID) TO service_role;
+REVOKE EXECUTE ON FUNCTION lineage_descendants(UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION lineage_descendants(UUID, INTEGER) TO service_role;
+REVOKE EXECUTE ON FUNCTION lineage_common_ancestors(UUID, UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION lineage_common_ancestors(UUID, UUID) TO service_role;
+REVOKE EXECUTE ON FUNCTION family_member_subtree(UUID, UUID, TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION family_member_subtree(UUID, UUID, TEXT, INTEGER) TO service_role;
+-- The family report lists every family with its admin's email and name
+REVOKE EXECUTE ON FUNCTION family_report_page(INTEGER, TIMESTAMP WITH TIME ZONE, UUID, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION family_report_page(INTEGER, TIMESTAMP WITH TIME ZONE, UUID, TEXT) TO service_role;
+REVOKE EXECUTE ON FUNCTION family_report_totals() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION family_report_totals() TO service_role;
+-- The onboarding pre-check answers whether any email has an account (user enumeration)
+REVOKE EXECUTE ON FUNCTION check_onboarding_conflicts(TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION check_onboarding_conflicts(TEXT, TEXT) TO service_role;
+
 -- Add comments to tables
 COMMENT ON TABLE families IS 'Stores family information with encrypted password for multi-tenant setup';
 COMMENT ON TABLE users IS 'Stores user information linked to Supabase auth.users with approval status for admins';
 COMMENT ON TABLE admin_onboarding_requests IS 'Stores pending admin onboarding requests waiting for SuperAdmin approval';
 COMMENT ON TABLE family_members IS 'Stores individual family member information';
+COMMENT ON TABLE family_member_lineage IS 'Optional ancestor/descendant closure of the relationship graph, maintained by FamilyMemberService';
+COMMENT ON TABLE family_custom_fields IS 'Typed custom field schema per family (at most 10 fields), used for coercion and filter pushdown';
+COMMENT ON TABLE family_stats IS 'Per-family member counters (total, per generation, per custom field value) maintained by trigger';
+COMMENT ON TABLE refresh_tokens IS 'Rotating refresh tokens, stored as SHA-256 hashes of the high-entropy token';
+COMMENT ON TABLE family_member_tombstones IS 'Deletion log of family members used by the delta sync endpoint';
 
 -- Add comments to columns
-COMMENT ON COLUMN families.family_password_encrypted IS 'Family password encrypted using admin password as key';
+COMMENT ON COLUMN families.family_password_encrypted IS 'Family password envelope ($env1$...) keyed by the admin password; legacy rows are base64 PBKDF2/AES-GCM and are re-wrapped on first retrieval';
+COMMENT ON COLUMN families.member_version IS 'Change counter bumped on every family_members write, used for ETags';
+COMMENT ON COLUMN families.lineage_stale_at IS 'Set when a lineage rebuild failed; lineage queries rebuild (or answer 409) until it is cleared';
 COMMENT ON COLUMN users.role IS 'User role: super_admin (platform owner), family_admin (family owner), family_co_admin (co-owner), family_user (read-only member)';
 COMMENT ON COLUMN users.approval_status IS 'Approval status for family_admin: approved (active), pending (awaiting superadmin review), rejected (denied access)';
 COMMENT ON COLUMN users.password_hash IS 'Hashed password for family_admin and family_user login (non-OAuth)';
 COMMENT ON COLUMN admin_onboarding_requests.family_password_encrypted IS 'Family password encrypted using admin password as key';
 COMMENT ON COLUMN family_members.relationships IS 'JSON object storing relationship links like parent_1, parent_2, spouse';
-COMMENT ON COLUMN family_members.custom_fields IS 'JSON object storing custom user-defined fields (up to 10 fields per family)';
+COMMENT ON COLUMN family_members.row_version IS 'Value of families.member_version when this row was last written (delta sync cursor)';
+COMMENT ON COLUMN family_members.photo_hash IS 'SHA-256 of an uploaded photo; thumbnails are served at /api/photos/<hash>/<size>.webp';
+COMMENT ON COLUMN family_members.generation IS 'Longest ancestor chain length (0 = root), maintained with family_member_lineage';
+COMMENT ON COLUMN family_members.custom_fields IS 'JSON object storing custom user-defined fields (up to 10 fields per family); keys declared in family_custom_fields hold typed values';
@@ -0,0 +1,82 @@
+import pytest
+
+from core.custom_fields import coerce_custom_fields, coerce_value, parse_filters
+
+
+class TestCoerceValue:
+    def test_number(self):
+        assert coerce_value("number", "42") == 42
+        assert coerce_value("number", " 1.5 ") == 1.5
+        assert coerce_value("number", 7) == 7
+
+    def test_number_rejects_text_and_booleans(self):
+        with pytest.raises(ValueError):
+            coerce_value("number", "abc")
+        with pytest.raises(ValueError):
+            coerce_value("number", True)
+
+    def test_date_is_normalized_to_iso_day(self):
+        assert coerce_value("date", "1950-03-07T10:00:00") == "1950-03-07"
+        with pytest.raises(ValueError):
+            coerce_value("date", "07/03/1950")
+
+    def test_boolean(self):
+        assert coerce_value("boolean", "Yes") is True
+        assert coerce_value("boolean", "0") is False
+        with pytest.raises(ValueError):
+            coerce_value("boolean", "maybe")
+
+    def test_empty_is_null(self):
+        assert coerce_value("number", "") is None
+        assert coerce_value("text", None) is None
+
+    def test_text_is_stringified(self):
+        assert coerce_value("text", 12) == "12"
+
+
+def test_coerce_custom_fields_keeps_undeclared_keys():
+    fields = {"birth_year": "1950", "nickname": "Bablu"}
+    assert coerce_custom_fields(fields, {"birth_year": "number"}) == {"birth_year": 1950, "nickname": "Bablu"}
+
+
+def test_coerce_custom_fields_names_the_bad_field():
+    with pytest.raises(ValueError, match="birth_year"):
+        coerce_custom_fields({"birth_year": "unknown"}, {"birth_year": "number"})
+
+
+class TestParseFilters:
+    TYPES = {"birth_year": "number", "born_on": "date", "alive": "boolean"}
+
+    def test_operators(self):
+        items = [
+            ("cf.birthplace", "Pune"),
+            ("cf.birth_year>", "1950"),   # cf.birth_year>=1950
+            ("cf.birth_year<", "1990"),   # cf.birth_year<=1990
+            ("cf.birthplace!", "Delhi"),  # cf.birthplace!=Delhi
+            ("cf.born_on>1960-01-01", ""),
+            ("cf.born_on<2000-01-01", ""),
+        ]
+        assert parse_filters(items, self.TYPES) == [
+            ("birthplace", "text", "eq", "Pune"),
+            ("birth_year", "number", "gte", 1950),
+            ("birth_year", "number", "lte", 1990),
+            ("birthplace", "text", "neq", "Delhi"),
+            ("born_on", "date", "gt", "1960-01-01"),
+            ("born_on", "date", "lt", "2000-01-01"),
+        ]
+
+    def test_ignores_other_parameters(self):
+        assert parse_filters([("limit", "10"), ("format", "json")], self.TYPES) == []
+
+    def test_value_is_coerced_to_the_declared_type(self):
+        assert parse_filters([("cf.alive", "yes")], self.TYPES) == [("alive", "boolean", "eq", True)]
+
+    @pytest.mark.parametrize("items", [
+        [("cf.birth_year", "old")],        # not a number
+        [("cf.alive>", "true")],           # booleans have no range
+        [("cf.birthplace", "")],           # no value
+        [("cf.Bad-Key", "x")],             # unsafe key
+    ])
+    def test_rejects_malformed_filters(self, items):
+        with pytest.raises(ValueError):
+            parse_filters(items, self.TYPES)
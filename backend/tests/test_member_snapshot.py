@@ -0,0 +1,129 @@
+import msgpack
+import orjson
+import pytest
+
+from core.member_snapshot import (
+    COLUMNAR_JSON_TYPE,
+    COLUMNAR_MSGPACK_TYPE,
+    FORMAT_COLUMNAR,
+    FORMAT_JSON,
+    FORMAT_MSGPACK,
+    build_member_snapshot,
+    encode_member_snapshot,
+    negotiate_member_format,
+)
+
+FAMILY_ID = "6f1c1a52-8d0e-4a63-9a4b-1f0f8a1d2c3e"
+GRANDPA = "0a7e6c2e-1b5f-4c1d-9d0a-3b2f1e4d5c6a"
+FATHER = "1b8f7d3f-2c6a-4d2e-8e1b-4c3a2f5e6d7b"
+CHILD = "2c9a8e4a-3d7b-4e3f-9f2c-5d4b3a6f7e8c"
+ORPHAN = "3d0b9f5b-4e8c-4f4a-8a3d-6e5c4b7a8f9d"
+
+
+def _member(member_id, name, relationships, custom_fields, photo_url=None):
+    return {
+        "id": member_id,
+        "family_id": FAMILY_ID,
+        "name": name,
+        "photo_url": photo_url,
+        "photo_hash": None,
+        "relationships": relationships,
+        "custom_fields": custom_fields,
+        "created_at": "2026-01-01T00:00:00+00:00",
+        "updated_at": "2026-01-02T00:00:00+00:00",
+    }
+
+
+MEMBERS = [
+    _member(GRANDPA, "Ramesh", {"email": "ramesh@example.com"}, {"birth_year": 1940, "alive": False}),
+    _member(FATHER, "Suresh", {"father": GRANDPA, "note": "eldest"}, {"birthplace": "Pune"}),
+    # A parent link by name is kept as written; the edge carries the resolved index
+    _member(CHILD, "Anil", {"father": "Suresh"}, {"birthplace": "Pune", "tags": ["a", "b"]},
+            photo_url="https://cdn.example.com/anil.jpg"),
+    _member(ORPHAN, "Anil", None, None),
+]
+
+
+def decode_member_snapshot(snapshot):
+    """Python port of the frontend's decodeMemberSnapshot"""
+    def string(index):
+        return None if index < 0 else snapshot["strings"][index]
+
+    members = [
+        {
+            "id": member_id,
+            "family_id": snapshot["family_id"],
+            "name": string(snapshot["name"][i]),
+            "photo_url": string(snapshot["photo_url"][i]),
+            "photo_hash": string(snapshot["photo_hash"][i]),
+            "relationships": {},
+            "custom_fields": {},
+            "created_at": string(snapshot["created_at"][i]),
+            "updated_at": string(snapshot["updated_at"][i]),
+        }
+        for i, member_id in enumerate(snapshot["id"])
+    ]
+    for field in ("relationships", "custom_fields"):
+        other = snapshot[f"{field}_other"]
+        for row, value in zip(other["rows"], other["values"]):
+            members[row][field] = value
+        for key, column in snapshot[field].items():
+            for row, value in zip(column["rows"], column["values"]):
+                members[row][field][key] = value if column.get("raw") else string(value)
+        if field == "relationships":
+            edges = snapshot["edges"]
+            for e in range(0, len(edges), 3):
+                parent, child, key = edges[e:e + 3]
+                members[child]["relationships"].setdefault(string(key), snapshot["id"][parent])
+    return members
+
+
+class TestNegotiateMemberFormat:
+    @pytest.mark.parametrize("accept", [None, "", "*/*", "application/json", "text/html, */*;q=0.8"])
+    def test_plain_json_by_default(self, accept):
+        assert negotiate_member_format(accept) == FORMAT_JSON
+
+    def test_compact_formats_by_name(self):
+        assert negotiate_member_format(COLUMNAR_JSON_TYPE) == FORMAT_COLUMNAR
+        assert negotiate_member_format(COLUMNAR_MSGPACK_TYPE) == FORMAT_MSGPACK
+        assert negotiate_member_format("application/x-msgpack") == FORMAT_MSGPACK
+
+    def test_quality_values_decide(self):
+        assert negotiate_member_format(f"{COLUMNAR_JSON_TYPE};q=0.4, application/json") == FORMAT_JSON
+        assert negotiate_member_format(f"{COLUMNAR_JSON_TYPE}, application/json;q=0.5") == FORMAT_COLUMNAR
+
+    def test_smaller_format_wins_a_tie(self):
+        accept = f"application/json, {COLUMNAR_JSON_TYPE}, {COLUMNAR_MSGPACK_TYPE}"
+        assert negotiate_member_format(accept) == FORMAT_MSGPACK
+
+    def test_refused_formats_fall_back_to_json(self):
+        assert negotiate_member_format(f"{COLUMNAR_MSGPACK_TYPE};q=0") == FORMAT_JSON
+
+
+class TestMemberSnapshot:
+    def test_round_trip_restores_the_member_list(self):
+        snapshot = build_member_snapshot(FAMILY_ID, MEMBERS)
+        assert decode_member_snapshot(snapshot) == MEMBERS
+
+    def test_round_trip_through_columnar_json(self):
+        body = encode_member_snapshot(FAMILY_ID, MEMBERS, FORMAT_COLUMNAR)
+        assert decode_member_snapshot(orjson.loads(body)) == MEMBERS
+
+    def test_msgpack_packs_ids_as_bytes(self):
+        snapshot = msgpack.unpackb(encode_member_snapshot(FAMILY_ID, MEMBERS, FORMAT_MSGPACK), raw=False)
+        id_bin = snapshot.pop("id_bin")
+        assert len(id_bin) == 16 * len(MEMBERS)
+        snapshot["id"] = [m["id"] for m in MEMBERS]
+        assert decode_member_snapshot(snapshot) == MEMBERS
+
+    def test_links_by_id_travel_only_as_edges(self):
+        snapshot = build_member_snapshot(FAMILY_ID, MEMBERS)
+        father_key = snapshot["strings"].index("father")
+        assert snapshot["edges"] == [0, 1, father_key, 1, 2, father_key]
+        # The id link is dropped from the sparse column, the name link is kept
+        assert snapshot["relationships"]["father"]["rows"] == [2]
+
+    def test_repeated_strings_are_stored_once(self):
+        snapshot = build_member_snapshot(FAMILY_ID, MEMBERS)
+        assert snapshot["strings"].count("Pune") == 1
+        assert snapshot["strings"].count("Anil") == 1
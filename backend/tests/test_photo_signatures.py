@@ -0,0 +1,37 @@
+import time
+
+from core.photo_storage import LocalPhotoStorage, local_signature, verify_local_signature
+
+KEY = "a" * 64 + "/256.webp"
+
+
+def test_valid_signature():
+    expires = int(time.time()) + 60
+    assert verify_local_signature(KEY, expires, local_signature(KEY, expires))
+
+
+def test_expired_signature():
+    expires = int(time.time()) - 1
+    assert not verify_local_signature(KEY, expires, local_signature(KEY, expires))
+
+
+def test_signature_is_bound_to_key_and_expiry():
+    expires = int(time.time()) + 60
+    signature = local_signature(KEY, expires)
+    assert not verify_local_signature("b" * 64 + "/256.webp", expires, signature)
+    assert not verify_local_signature(KEY, expires + 3600, signature)
+
+
+def test_missing_parts():
+    expires = int(time.time()) + 60
+    assert not verify_local_signature(KEY, None, local_signature(KEY, expires))
+    assert not verify_local_signature(KEY, expires, None)
+    assert not verify_local_signature(KEY, expires, "")
+
+
+def test_local_storage_signs_router_urls(tmp_path):
+    urls = LocalPhotoStorage(str(tmp_path)).sign_urls([KEY], expires_in=60)
+    path, _, query = urls[KEY].partition("?")
+    params = dict(part.split("=", 1) for part in query.split("&"))
+    assert path == f"/api/photos/{KEY}"
+    assert verify_local_signature(KEY, int(params["expires"]), params["signature"])
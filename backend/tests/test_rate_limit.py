@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from core import rate_limit
+from core.rate_limit import InMemoryBucketBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", fake)
+    return fake
+
+
+def take(backend, key="login:ip:1.2.3.4", capacity=3, per_second=1.0):
+    return asyncio.run(backend.take(key, capacity, per_second))
+
+
+def test_burst_up_to_capacity_then_wait(clock):
+    backend = InMemoryBucketBackend()
+    assert [take(backend) for _ in range(3)] == [0, 0, 0]
+    assert take(backend) == pytest.approx(1.0)
+
+
+def test_refills_at_the_given_rate(clock):
+    backend = InMemoryBucketBackend()
+    for _ in range(3):
+        take(backend)
+    clock.now += 0.5
+    # Half a token is back; the next one is half a second away
+    assert take(backend) == pytest.approx(0.5)
+    clock.now += 1.0
+    assert take(backend) == 0
+
+
+def test_refill_is_capped_at_capacity(clock):
+    backend = InMemoryBucketBackend()
+    take(backend)
+    clock.now += 3600
+    assert [take(backend) for _ in range(3)] == [0, 0, 0]
+    assert take(backend) > 0
+
+
+def test_keys_are_independent(clock):
+    backend = InMemoryBucketBackend()
+    for _ in range(3):
+        take(backend, key="a")
+    assert take(backend, key="a") > 0
+    assert take(backend, key="b") == 0
+
+
+def test_least_recently_used_buckets_are_evicted(clock):
+    backend = InMemoryBucketBackend(max_keys=2)
+    for _ in range(3):
+        take(backend, key="a")
+    take(backend, key="b")
+    take(backend, key="c")
+    # "a" was evicted and starts again with a full bucket
+    assert take(backend, key="a") == 0
@@ -0,0 +1,151 @@
+import itertools
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.config import SUPERADMIN_EMAIL
+from services.refresh_token_service import RefreshTokenService
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """The slice of the PostgREST query builder RefreshTokenService uses"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.rows = db.tables.setdefault(table, [])
+        self.action = None
+        self.payload = None
+        self.filters = []
+
+    def select(self, columns="*"):
+        self.action = "select"
+        return self
+
+    def insert(self, row):
+        self.action, self.payload = "insert", row
+        return self
+
+    def update(self, values):
+        self.action, self.payload = "update", values
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def is_(self, column, value):
+        assert value == "null"
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+
+    def execute(self):
+        if self.action == "insert":
+            row = {"id": str(next(self.db.ids)), "revoked_at": None, "replaced_by": None, **self.payload}
+            self.rows.append(row)
+            return FakeResponse([dict(row)])
+        matched = [row for row in self.rows if all(f(row) for f in self.filters)]
+        if self.action == "update":
+            for row in matched:
+                row.update(self.payload)
+        return FakeResponse([dict(row) for row in matched])
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.ids = itertools.count(1)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def db():
+    return FakeSupabase()
+
+
+@pytest.fixture
+def service(db):
+    return RefreshTokenService(db)
+
+
+def issue_superadmin(service):
+    return service.issue(subject_id="superadmin", email=SUPERADMIN_EMAIL, role="super_admin")
+
+
+def test_rotation_returns_claims_and_a_new_token(service, db):
+    token = issue_superadmin(service)
+    claims, new_token = service.rotate(token)
+
+    assert claims == {"user_id": "superadmin", "email": SUPERADMIN_EMAIL, "role": "super_admin", "family_id": None}
+    assert new_token != token
+    old, new = db.tables["refresh_tokens"]
+    assert old["revoked_at"] is not None and old["replaced_by"] == new["id"]
+    assert new["revoked_at"] is None
+    # Only hashes are stored
+    assert token not in (old["token_hash"], new["token_hash"])
+
+
+def test_rotation_keeps_the_session_deadline(service, db):
+    _, new_token = service.rotate(issue_superadmin(service))
+    old, new = db.tables["refresh_tokens"]
+    assert new["session_expires_at"] == old["session_expires_at"]
+
+
+def test_reuse_revokes_every_session_of_the_subject(service, db):
+    stolen = issue_superadmin(service)
+    other_device = issue_superadmin(service)
+    _, rotated = service.rotate(stolen)
+
+    with pytest.raises(ValueError, match="Invalid refresh token"):
+        service.rotate(stolen)
+
+    assert all(row["revoked_at"] is not None for row in db.tables["refresh_tokens"])
+    for token in (rotated, other_device):
+        with pytest.raises(ValueError):
+            service.rotate(token)
+
+
+def test_unknown_token_revokes_nothing(service, db):
+    issue_superadmin(service)
+    with pytest.raises(ValueError, match="Invalid refresh token"):
+        service.rotate("not-a-token")
+    assert db.tables["refresh_tokens"][0]["revoked_at"] is None
+
+
+def test_expired_token(service, db):
+    token = issue_superadmin(service)
+    db.tables["refresh_tokens"][0]["expires_at"] = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    with pytest.raises(ValueError, match="expired"):
+        service.rotate(token)
+
+
+def test_tampered_claims_are_rejected(service, db):
+    token = service.issue(subject_id="user-1", email="admin@example.com", role="family_user", family_id="family-1")
+    # Escalating the stored role breaks the session MAC
+    db.tables["refresh_tokens"][0]["role"] = "family_admin"
+    with pytest.raises(ValueError, match="Invalid refresh token"):
+        service.rotate(token)
+
+
+def test_rows_not_written_by_a_login_are_rejected(service, db):
+    token = issue_superadmin(service)
+    db.tables["refresh_tokens"][0]["session_mac"] = None
+    with pytest.raises(ValueError, match="Invalid refresh token"):
+        service.rotate(token)
+
+
+def test_account_changes_end_the_session(service, db):
+    db.tables["users"] = [{"id": "user-1", "role": "family_admin", "family_id": "family-1", "approval_status": "approved"}]
+    db.tables["families"] = [{"id": "family-1", "deleted_at": None}]
+    token = service.issue(subject_id="user-1", email="admin@example.com", role="family_admin", family_id="family-1")
+    _, token = service.rotate(token)
+
+    db.tables["families"][0]["deleted_at"] = datetime.now(timezone.utc).isoformat()
+    with pytest.raises(ValueError, match="Family no longer exists"):
+        service.rotate(token)
@@ -0,0 +1,36 @@
+import base64
+
+import orjson
+import pytest
+
+from services.family_service import decode_report_cursor, encode_report_cursor
+
+ROW = {"created_at": "2026-03-01T12:30:00.123456+00:00", "id": "4a1d3c2b-5e6f-4a7b-8c9d-0e1f2a3b4c5d"}
+
+
+def _cursor(value) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(value)).decode().rstrip("=")
+
+
+def test_round_trip():
+    assert decode_report_cursor(encode_report_cursor(ROW)) == (ROW["created_at"], ROW["id"])
+
+
+def test_cursor_is_url_safe():
+    assert "=" not in encode_report_cursor(ROW)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not base64 !",
+    _cursor(None),
+    _cursor([]),
+    _cursor([None, None]),
+    _cursor(["yesterday", ROW["id"]]),
+    _cursor([ROW["created_at"], "42"]),
+    _cursor([ROW["created_at"], ROW["id"], "extra"]),
+    _cursor({"created_at": ROW["created_at"], "id": ROW["id"]}),
+])
+def test_rejects_garbage(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_report_cursor(cursor)
@@ -3,7 +3,7 @@
 import React, { useEffect, useState } from 'react';
 import { useAuth } from '@/lib/auth-context-new';
 import { ProtectedRoute } from '@/lib/protected-route';
-import { getFamilyMember } from '@/lib/family-service';
+import { getFamilyMember, getSignedPhotoUrls, needsSignedPhoto } from '@/lib/family-service';
 import { FamilyMember } from '@/lib/types';
 import { useParams } from 'next/navigation';
 import Link from 'next/link';
@@ -15,6 +15,7 @@ export default function MemberDetailPage() {
   const { user } = useAuth();
 
   const [member, setMember] = useState<FamilyMember | null>(null);
+  const [photoUrls, setPhotoUrls] = useState<Record<string, string>>({});
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState('');
 
@@ -27,6 +28,9 @@ export default function MemberDetailPage() {
       setIsLoading(true);
       const data = await getFamilyMember(familyId, memberId);
       setMember(data);
+      if (needsSignedPhoto(data)) {
+        setPhotoUrls(await getSignedPhotoUrls(familyId, 512, [data.id]));
+      }
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load member');
     } finally {
@@ -78,9 +82,9 @@ export default function MemberDetailPage() {
 
           <div className="bg-white/10 backdrop-blur-md border border-white/20 rounded-xl shadow-xl shadow-white/5 overflow-hidden">
             {/* Photo */}
-            {member.photo_url && (
+            {(member.photo_url || photoUrls[member.id]) && (
               <div className="w-full h-80 bg-white/5 relative">
-                <img src={member.photo_url} alt={member.name} className="w-full h-full object-cover" />
+                <img src={member.photo_url || photoUrls[member.id]} alt={member.name} className="w-full h-full object-cover" />
               </div>
             )}
 
@@ -3,7 +3,7 @@
 import React, { useEffect, useState } from 'react';
 import { useAuth } from '@/lib/auth-context-new';
 import { ProtectedRoute } from '@/lib/protected-route';
-import { getFamilyMembers, deleteFamilyMember } from '@/lib/family-service';
+import { getFamilyMembers, deleteFamilyMember, getSignedPhotoUrls, needsSignedPhoto } from '@/lib/family-service';
 import { FamilyMember } from '@/lib/types';
 import { useParams } from 'next/navigation';
 import Link from 'next/link';
@@ -14,6 +14,7 @@ export default function FamilyMembersPage() {
   const { user } = useAuth();
 
   const [members, setMembers] = useState<FamilyMember[]>([]);
+  const [photoUrls, setPhotoUrls] = useState<Record<string, string>>({});
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState('');
 
@@ -26,6 +27,10 @@ export default function FamilyMembersPage() {
       setIsLoading(true);
       const data = await getFamilyMembers(familyId);
       setMembers(data);
+      const unsigned = data.filter(needsSignedPhoto).map((m) => m.id);
+      if (unsigned.length > 0) {
+        setPhotoUrls(await getSignedPhotoUrls(familyId, 512, unsigned));
+      }
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load members');
     } finally {
@@ -89,9 +94,9 @@ export default function FamilyMembersPage() {
             <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
               {members.map((member) => (
                 <div key={member.id} className="group bg-white/10 backdrop-blur-md border border-white/20 rounded-xl overflow-hidden hover:border-white/40 hover:shadow-xl hover:shadow-white/10 transition-all duration-300 hover:scale-105">
-                  {member.photo_url && (
+                  {(member.photo_url || photoUrls[member.id]) && (
                     <img
-                      src={member.photo_url}
+                      src={member.photo_url || photoUrls[member.id]}
                       alt={member.name}
                       className="w-full h-40 object-cover"
                     />
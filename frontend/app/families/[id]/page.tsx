@@ -3,7 +3,7 @@
 import React, { useEffect, useState } from 'react';
 import { useAuth } from '@/lib/auth-context-new';
 import { ProtectedRoute } from '@/lib/protected-route';
-import { getFamily, getFamilyMembers } from '@/lib/family-service';
+import { getFamily, getFamilyMembers, getMemberPhotoUrl, getSignedPhotoUrls, needsSignedPhoto } from '@/lib/family-service';
 import { Family, FamilyMember } from '@/lib/types';
 import { useParams } from 'next/navigation';
 import Link from 'next/link';
@@ -15,6 +15,7 @@ export default function FamilyDetailPage() {
 
   const [family, setFamily] = useState<Family | null>(null);
   const [members, setMembers] = useState<FamilyMember[]>([]);
+  const [photoUrls, setPhotoUrls] = useState<Record<string, string>>({});
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState('');
 
@@ -31,6 +32,10 @@ export default function FamilyDetailPage() {
       ]);
       setFamily(familyData);
       setMembers(membersData);
+      const unsigned = membersData.filter(needsSignedPhoto).map((m) => m.id);
+      if (unsigned.length > 0) {
+        setPhotoUrls(await getSignedPhotoUrls(familyId, 512, unsigned));
+      }
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load family');
     } finally {
@@ -149,10 +154,11 @@ export default function FamilyDetailPage() {
                           href={`/families/${familyId}/members/${member.id}`}
                           className="group bg-white/5 border border-border rounded-2xl p-6 hover:border-border/80 hover:bg-white/10 transition-all duration-300 hover:shadow-xl"
                         >
-                          {member.photo_url && (
+                          {getMemberPhotoUrl(member, 512, photoUrls) && (
                             <img
-                              src={member.photo_url}
+                              src={getMemberPhotoUrl(member, 512, photoUrls) || undefined}
                               alt={member.name}
+                              loading="lazy"
                               className="w-full h-40 object-cover rounded-xl mb-4"
                             />
                           )}
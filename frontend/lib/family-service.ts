@@ -14,6 +14,133 @@ function getAuthHeaders(): HeadersInit {
   return headers;
 }
 
+export type PhotoSize = 64 | 256 | 512;
+
+// Thumbnail URL for an uploaded member photo (falls back to the stored photo URL)
+// Private storage leaves photo_url empty, so those photos only show with a URL from getSignedPhotoUrls
+export function getMemberPhotoUrl(
+  member: FamilyMember,
+  size: PhotoSize = 256,
+  signedUrls?: Record<string, string>
+): string | null {
+  if (member.photo_hash) {
+    if (signedUrls?.[member.id]) {
+      return signedUrls[member.id];
+    }
+    return member.photo_url ? `${API_BASE_URL}/api/photos/${member.photo_hash}/${size}.webp` : null;
+  }
+  return member.photo_url;
+}
+
+// Members whose photo can only be shown through a signed URL
+export function needsSignedPhoto(member: FamilyMember): boolean {
+  return !!member.photo_hash && !member.photo_url;
+}
+
+// Signed thumbnail URLs keyed by member id, for all members in one request
+export async function getSignedPhotoUrls(
+  familyId: string,
+  size: PhotoSize = 256,
+  memberIds?: string[]
+): Promise<Record<string, string>> {
+  try {
+    const params = new URLSearchParams({ size: String(size) });
+    if (memberIds) {
+      params.set('member_ids', memberIds.join(','));
+    }
+    const response = await fetch(`${API_BASE_URL}/api/families/${familyId}/photos/signed?${params}`, {
+      method: 'GET',
+      headers: getAuthHeaders(),
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to sign member photos');
+    }
+
+    const data = await response.json();
+    // Signed URLs from the photo router are relative to the API
+    const urls: Record<string, string> = {};
+    for (const [memberId, url] of Object.entries(data.urls as Record<string, string>)) {
+      urls[memberId] = url.startsWith('/') ? `${API_BASE_URL}${url}` : url;
+    }
+    return urls;
+  } catch (error) {
+    throw error;
+  }
+}
+
+// Columnar member snapshot (Accept: application/vnd.apnaparivar.members+json)
+const MEMBER_SNAPSHOT_TYPE = 'application/vnd.apnaparivar.members+json';
+
+interface SparseColumn {
+  rows: number[];
+  values: any[];
+  raw?: boolean;
+}
+
+interface MemberSnapshot {
+  format: number;
+  family_id: string;
+  count: number;
+  id: string[];
+  name: number[];
+  photo_url: number[];
+  photo_hash: number[];
+  created_at: number[];
+  updated_at: number[];
+  edges: number[];
+  relationships: Record<string, SparseColumn>;
+  relationships_other: SparseColumn;
+  custom_fields: Record<string, SparseColumn>;
+  custom_fields_other: SparseColumn;
+  strings: string[];
+}
+
+// Rebuild member objects from the columnar snapshot (exactly as the plain JSON list would have them)
+function decodeMemberSnapshot(snapshot: MemberSnapshot): FamilyMember[] {
+  const str = (index: number) => (index < 0 ? null : snapshot.strings[index]);
+
+  const members = snapshot.id.map((id, i) => ({
+    id,
+    family_id: snapshot.family_id,
+    name: str(snapshot.name[i]) ?? '',
+    photo_url: str(snapshot.photo_url[i]),
+    photo_hash: str(snapshot.photo_hash[i]),
+    relationships: {} as Record<string, any>,
+    custom_fields: {} as Record<string, any>,
+    created_at: str(snapshot.created_at[i]),
+    updated_at: str(snapshot.updated_at[i]),
+  })) as FamilyMember[];
+
+  // Members whose field is not an object (e.g. null) are sent as is
+  snapshot.relationships_other.rows.forEach((row, j) => {
+    (members[row] as any).relationships = snapshot.relationships_other.values[j];
+  });
+  snapshot.custom_fields_other.rows.forEach((row, j) => {
+    (members[row] as any).custom_fields = snapshot.custom_fields_other.values[j];
+  });
+
+  for (const [key, column] of Object.entries(snapshot.relationships)) {
+    column.rows.forEach((row, j) => {
+      members[row].relationships[key] = column.raw ? column.values[j] : str(column.values[j]);
+    });
+  }
+  // Links by id are only sent as edges
+  for (let e = 0; e < snapshot.edges.length; e += 3) {
+    const [parent, child, key] = snapshot.edges.slice(e, e + 3);
+    const relationshipKey = str(key) as string;
+    if (!(relationshipKey in members[child].relationships)) {
+      members[child].relationships[relationshipKey] = snapshot.id[parent];
+    }
+  }
+  for (const [key, column] of Object.entries(snapshot.custom_fields)) {
+    column.rows.forEach((row, j) => {
+      members[row].custom_fields[key] = column.raw ? column.values[j] : str(column.values[j]);
+    });
+  }
+  return members;
+}
+
 // Get all families (SuperAdmin only)
 export async function getAllFamilies(): Promise<Family[]> {
   try {
@@ -112,13 +239,16 @@ export async function getFamilyMembers(familyId: string): Promise<FamilyMember[]
   try {
     const response = await fetch(`${API_BASE_URL}/api/families/${familyId}/members`, {
       method: 'GET',
-      headers: getAuthHeaders(),
+      headers: { ...getAuthHeaders(), Accept: `${MEMBER_SNAPSHOT_TYPE}, application/json;q=0.5` },
     });
 
     if (!response.ok) {
       throw new Error('Failed to fetch family members');
     }
 
+    if (response.headers.get('Content-Type')?.startsWith(MEMBER_SNAPSHOT_TYPE)) {
+      return decodeMemberSnapshot(await response.json());
+    }
     return await response.json();
   } catch (error) {
     throw error;
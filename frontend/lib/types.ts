@@ -28,6 +28,7 @@ export interface FamilyMember {
   family_id: string;
   name: string;
   photo_url: string | null;
+  photo_hash?: string | null;
   relationships: Record<string, string>;
   custom_fields: Record<string, any>;
   created_at: string;